@@ -5,12 +5,22 @@
 // - Logs scores + behaviour metrics (unsafe moves, turns, longest streak)
 // - Times AI selection + engine.apply per move
 // - Writes two CSVs: pairing-level summary and per-game details
+// - Writes benchmark2_sketches.json: a t-digest of every move's time per
+//   pairing, role and kind (evaluation/sketches.py merges and queries them)
+// - Writes benchmark2_trace.bin (+ .games.csv): one binary record per move
+//   (evaluation/traces.py defines the layout and memory-maps it)
 //
 // Run with `dart run packages/game_engine/bin/benchmark_experiments.dart`.
+// With `--schedule plan.json` (from evaluation/planner.py) only the scheduled
+// extra games are played per pairing, game_idx continues after the games
+// already played, and the outputs get an `_extra` suffix so the earlier run
+// is kept (merge the two afterwards).
 // NOTE: Per-game CSV can get large; tune gamesPerPair if needed.
 
+import 'dart:convert';
 import 'dart:io';
 import 'dart:math';
+import 'dart:typed_data';
 import 'package:game_engine/game_engine.dart';
 
 typedef MoveFn = List<int> Function(Game g, Random rng);
@@ -21,13 +31,17 @@ class Ai {
   const Ai(this.name, this.fn);
 }
 
-void main() async {
+void main(List<String> args) async {
   // --------------------------------------------------
   // CONFIG
   // --------------------------------------------------
   const grids = [4, 5, 6];   // add more sizes if you wish
   const gamesPerPair = 300;  // per pairing & order
-  final rng = Random(42);    // seed for reproducibility
+
+  // Optional adaptive schedule (see header).
+  final schedule = await _loadSchedule(args);
+  final rng = Random(schedule?.seed ?? 42);    // seed for reproducibility
+  final suffix = schedule == null ? '' : '_extra';
 
   // Plug in the move selectors you want to test.
   // NOTE: randomMove/heuristic1Move/deep2Move are provided by game_engine.
@@ -37,6 +51,12 @@ void main() async {
     Ai('Deep2',       (g, r) => deep2Move(g)),
   ];
 
+  // Per-move timing sketches, one record per pairing × column.
+  final sketches = <Map<String, Object>>[];
+
+  // Per-move trace, streamed to disk as games finish.
+  final trace = TraceSink('benchmark2_trace$suffix');
+
   // CSV buffers (kept in memory for simplicity).
   // TO DO: if files get huge, stream to disk instead of buffering.
   final summary = StringBuffer()
@@ -75,6 +95,11 @@ void main() async {
         final p1 = ais[i];
         final p2 = ais[j];
 
+        final planned = schedule?.pairs['$grid|${p1.name}|${p2.name}'];
+        final firstIdx = planned?.played ?? 0;
+        final nGames = schedule == null ? gamesPerPair : (planned?.extra ?? 0);
+        if (nGames == 0) continue;
+
         // Aggregates for this pairing (over N games).
         int p1Wins = 0, p2Wins = 0, ties = 0;
         int sumP1 = 0, sumP2 = 0;
@@ -89,12 +114,15 @@ void main() async {
         final pairingP1ApplyUs = <int>[];
         final pairingP2ApplyUs = <int>[];
 
-        for (var gIdx = 0; gIdx < gamesPerPair; gIdx++) {
+        for (var gIdx = firstIdx; gIdx < firstIdx + nGames; gIdx++) {
+          final gameId = trace.startGame(grid, p1.name, p2.name, gIdx);
           final res = _playOneGame(
             grid: grid,
             p1: p1,
             p2: p2,
             rng: rng,
+            onMove: (ply, player, edge, aiUs, applyUs, boxes, unsafe) =>
+                trace.add(gameId, ply, player, edge, aiUs, applyUs, boxes, unsafe),
           );
 
           // Scores & wins.
@@ -151,17 +179,17 @@ void main() async {
         }
 
         // Pairing-level aggregates for summary CSV.
-        final p1Avg = sumP1 / gamesPerPair;
-        final p2Avg = sumP2 / gamesPerPair;
+        final p1Avg = sumP1 / nGames;
+        final p2Avg = sumP2 / nGames;
 
-        final p1UnsafeAvg = sumP1Unsafe / gamesPerPair;
-        final p2UnsafeAvg = sumP2Unsafe / gamesPerPair;
+        final p1UnsafeAvg = sumP1Unsafe / nGames;
+        final p2UnsafeAvg = sumP2Unsafe / nGames;
 
-        final p1TurnsAvg  = sumP1Turns  / gamesPerPair;
-        final p2TurnsAvg  = sumP2Turns  / gamesPerPair;
+        final p1TurnsAvg  = sumP1Turns  / nGames;
+        final p2TurnsAvg  = sumP2Turns  / nGames;
 
-        final p1StreakAvg = sumP1Streak / gamesPerPair;
-        final p2StreakAvg = sumP2Streak / gamesPerPair;
+        final p1StreakAvg = sumP1Streak / nGames;
+        final p2StreakAvg = sumP2Streak / nGames;
 
         // Aggregated timing (µs → ms) over all moves in the pairing.
         final p1AiMeanMs    = _usToMsStr(_meanUs(pairingP1AiUs));
@@ -181,7 +209,7 @@ void main() async {
         final p2ApplyP95Ms  = _usToMsStr(_percentileUs(pairingP2ApplyUs, 0.95));
 
         summary.writeln(
-            '$grid,$gamesPerPair,${p1.name},${p2.name},'
+            '$grid,$nGames,${p1.name},${p2.name},'
             '$p1Wins,$p2Wins,$ties,'
             '${p1Avg.toStringAsFixed(3)},${p2Avg.toStringAsFixed(3)},$totalBoxes,'
             '${p1UnsafeAvg.toStringAsFixed(3)},${p2UnsafeAvg.toStringAsFixed(3)},'
@@ -191,15 +219,135 @@ void main() async {
             '$p2AiMeanMs,$p2AiP50Ms,$p2AiP95Ms,'
             '$p1ApplyMeanMs,$p1ApplyP50Ms,$p1ApplyP95Ms,'
             '$p2ApplyMeanMs,$p2ApplyP50Ms,$p2ApplyP95Ms');
+
+        // Sketch the pooled per-move timings (same layout as SketchSet records).
+        final pools = {
+          'p1_ai_ms': pairingP1AiUs,
+          'p2_ai_ms': pairingP2AiUs,
+          'p1_apply_ms': pairingP1ApplyUs,
+          'p2_apply_ms': pairingP2ApplyUs,
+        };
+        pools.forEach((column, us) {
+          if (us.isEmpty) return;
+          sketches.add({
+            'grid': grid,
+            'p1_ai': p1.name,
+            'p2_ai': p2.name,
+            'column': column,
+            'digest': _tDigestMs(us),
+          });
+        });
       }
     }
   }
 
   // Write files.
   // TO DO: accept output dir via args; consider timestamped filenames.
-  await File('benchmark2_summary.csv').writeAsString(summary.toString());
-  await File('benchmark2_games.csv').writeAsString(perGame.toString());
-  print('Saved benchmark2_summary.csv & benchmark2_games.csv');
+  await File('benchmark2_summary$suffix.csv').writeAsString(summary.toString());
+  await File('benchmark2_games$suffix.csv').writeAsString(perGame.toString());
+  await File('benchmark2_sketches$suffix.json').writeAsString(jsonEncode(sketches));
+  await trace.close();
+  print('Saved benchmark2_summary$suffix.csv, benchmark2_games$suffix.csv, '
+      'benchmark2_sketches$suffix.json & benchmark2_trace$suffix.bin');
+}
+
+// --------------------------------------------------
+// ADAPTIVE SCHEDULE (evaluation/planner.py)
+// --------------------------------------------------
+
+class PlannedPair {
+  final int played, extra;
+  const PlannedPair(this.played, this.extra);
+}
+
+class Schedule {
+  final int seed;
+  final Map<String, PlannedPair> pairs; // 'grid|p1|p2' -> games
+  const Schedule(this.seed, this.pairs);
+}
+
+Future<Schedule?> _loadSchedule(List<String> args) async {
+  final i = args.indexOf('--schedule');
+  if (i < 0) return null;
+  if (i + 1 >= args.length) {
+    stderr.writeln('ERROR: --schedule needs a path to plan.json');
+    exit(1);
+  }
+  final plan = jsonDecode(await File(args[i + 1]).readAsString()) as Map<String, dynamic>;
+  final pairs = <String, PlannedPair>{};
+  for (final row in plan['schedule'] as List<dynamic>) {
+    final r = row as Map<String, dynamic>;
+    pairs['${r['grid']}|${r['p1_ai']}|${r['p2_ai']}'] =
+        PlannedPair(r['played'] as int, r['extra'] as int);
+  }
+  return Schedule(plan['seed'] as int? ?? 42, pairs);
+}
+
+// --------------------------------------------------
+// MOVE TRACE (evaluation/traces.py)
+// --------------------------------------------------
+
+/// Writes `<stem>.bin` in the layout of TRACE_DTYPE in evaluation/traces.py:
+/// a 16-byte header (magic, version, record size), then one 20-byte
+/// little-endian record per move. Games go to `<stem>.games.csv`.
+class TraceSink {
+  static const version = 1;
+  static const recordSize = 20;
+  static const flushBytes = 1 << 20;
+
+  final IOSink _records;
+  final IOSink _games;
+  final _record = ByteData(recordSize);
+  final _pending = BytesBuilder();
+  int _nextGame = 0;
+
+  TraceSink(String stem)
+      : _records = File('$stem.bin').openWrite(),
+        _games = File('$stem.games.csv').openWrite() {
+    final header = ByteData(16);
+    const magic = 'DBXTRACE';
+    for (var i = 0; i < magic.length; i++) {
+      header.setUint8(i, magic.codeUnitAt(i));
+    }
+    header.setUint16(8, version, Endian.little);
+    header.setUint16(10, recordSize, Endian.little);
+    _records.add(header.buffer.asUint8List());
+    _games.writeln('game,grid,p1_ai,p2_ai,game_idx');
+  }
+
+  /// Register a game and return its id for [add].
+  int startGame(int grid, String p1, String p2, int gameIdx) {
+    _games.writeln('$_nextGame,$grid,$p1,$p2,$gameIdx');
+    return _nextGame++;
+  }
+
+  void add(int game, int ply, int player, int edge, int aiUs, int applyUs,
+      int boxes, bool unsafe) {
+    _record
+      ..setUint32(0, game, Endian.little)
+      ..setUint16(4, ply, Endian.little)
+      ..setUint16(6, edge, Endian.little)
+      ..setUint32(8, aiUs, Endian.little)
+      ..setUint32(12, applyUs, Endian.little)
+      ..setUint8(16, player)
+      ..setUint8(17, boxes)
+      ..setUint8(18, unsafe ? 1 : 0);
+    _pending.add(_record.buffer.asUint8List());   // copies
+    if (_pending.length >= flushBytes) _records.add(_pending.takeBytes());
+  }
+
+  Future<void> close() async {
+    _records.add(_pending.takeBytes());
+    await _records.close();
+    await _games.close();
+  }
+}
+
+/// Edge id in Game.availableEdges() order: horizontal edges row by row,
+/// then vertical edges row by row.
+int _edgeIndex(int n, List<int> m) {
+  final x = min(m[0], m[2]), y = min(m[1], m[3]);
+  return m[1] == m[3] ? y * n + x : n * (n + 1) + y * (n + 1) + x;
 }
 
 // --------------------------------------------------
@@ -246,11 +394,54 @@ int _percentileUs(List<int> xs, double q) {
 
 String _usToMsStr(num us) => (us / 1000.0).toStringAsFixed(3);
 
+// t-digest of a non-empty µs list, in ms. Same k1 scale and compression as
+// TDigest in evaluation/sketches.py (keep sketchDelta == DEFAULT_DELTA there):
+// sorted samples sit at q = (i + 0.5) / n, and all samples in one unit-wide
+// bucket of k(q) = δ/(2π)·asin(2q − 1) collapse into a single centroid.
+const sketchDelta = 300;
+
+Map<String, Object> _tDigestMs(List<int> xs) {
+  final v = [...xs]..sort();
+  final n = v.length;
+  final means = <double>[];
+  final weights = <int>[];
+  double k0 = 0;
+  int bucket = 0, w = 0, sum = 0;
+  for (var i = 0; i < n; i++) {
+    final k = sketchDelta / (2 * pi) * asin(2 * (i + 0.5) / n - 1);
+    if (i == 0) k0 = k;
+    final b = (k - k0).floor();
+    if (w > 0 && b != bucket) {
+      means.add(sum / w / 1000.0);
+      weights.add(w);
+      sum = 0;
+      w = 0;
+    }
+    bucket = b;
+    sum += v[i];
+    w++;
+  }
+  means.add(sum / w / 1000.0);
+  weights.add(w);
+  return {
+    'delta': sketchDelta,
+    'min': v.first / 1000.0,
+    'max': v.last / 1000.0,
+    'means': means,
+    'weights': weights,
+  };
+}
+
+/// Called after every move with its trace fields (see TraceSink).
+typedef MoveTraceFn = void Function(int ply, int player, int edge, int aiUs,
+    int applyUs, int boxes, bool unsafe);
+
 GameResult _playOneGame({
   required int grid,
   required Ai p1,
   required Ai p2,
   required Random rng,
+  MoveTraceFn? onMove,
 }) {
   final g = Game(grid, numPlayers: 2);
 
@@ -288,7 +479,8 @@ GameResult _playOneGame({
 
     // Unsafe = opponent can immediately score after this move (benchmark-only).
     // NOTE: givesBoxToOpponent(g, mv) comes from game_engine in this setup.
-    if (givesBoxToOpponent(g, mv)) {
+    final unsafe = givesBoxToOpponent(g, mv);
+    if (unsafe) {
       if (moverIndex == 0) p1Unsafe++;
       else p2Unsafe++;
     }
@@ -304,6 +496,9 @@ GameResult _playOneGame({
     final afterScore = g.scores[g.players[moverIndex]]!;
     final gained = afterScore - beforeScore;
 
+    onMove?.call(p1Turns + p2Turns, moverIndex, _edgeIndex(grid, mv),
+        swSel.elapsedMicroseconds, swApply.elapsedMicroseconds, gained, unsafe);
+
     // Count turns for each side; extra turns are separate increments.
     if (moverIndex == 0) p1Turns++; else p2Turns++;
 
@@ -9,6 +9,11 @@ Usage:
       --csv /path/to/benchmark_games.csv \
       --out /path/to/order_summary.tex \
       --tie exclude   # or: half
+      --engine grouped  # or: loop (per-pair filtering, slow reference)
+      --chunksize 500000  # optional: stream the CSV with bounded memory
+      --cache             # optional: read via the columnar cache (pyarrow)
+      --bootstrap 10000   # optional: bootstrap CIs for s(A,B), Δ(A,B) (and tie-half rates)
+      --seed 0 --jobs 4   #   ...seeded; slices of matchups on a process pool
 
 Assumptions (case-insensitive column matching):
   - grid size: one of ["grid","board","grid_size"]  (values like 4, "4x4", etc.)
@@ -17,12 +22,25 @@ Assumptions (case-insensitive column matching):
 
 Ties handling:
   - exclude : ignore ties for win-rate denominator (binomial-friendly; Wilson CI shown)
-  - half    : count tie as 0.5 win (no CI shown to avoid false precision)
+  - half    : count tie as 0.5 win (no CI shown to avoid false precision,
+              unless --bootstrap: then the rates get percentile bootstrap CIs)
+
+Bootstrap (--bootstrap B): every ordered matchup's (wins, ties, losses) is
+resampled as one multinomial draw per replicate, many matchups per call, in
+slices sized to keep memory bounded for any B (bootstrap.column_cis). The
+reverse matchup shares the replicate, so s and Δ see consistent resamples.
+Adds s_CI / Delta_CI to the metrics CSV and CI columns to the LaTeX tables.
 """
 
-import argparse
+from functools import partial
+
 import pandas as pd
 import numpy as np
+from bootstrap import DEFAULT_SEED, column_cis, multinomial_replicates
+from intervals import wilson_ci, wilson_ci_arrays
+from streaming import iter_games
+from columnar_cache import read_games
+from evaluation import order_summary_parser
 
 def _find_col(df, candidates):
     cols = {c.lower(): c for c in df.columns}
@@ -31,78 +49,62 @@ def _find_col(df, candidates):
             return cols[cand.lower()]
     raise KeyError(f"Required column not found. Tried {candidates} in {list(df.columns)}")
 
-def wilson_ci(k, n, z=1.96):
-    """Wilson 95% CI (default z≈1.96). Returns (lo, hi)."""
-    if n == 0:
-        return (np.nan, np.nan)
-    phat = k / n
-    denom = 1 + (z*z)/n
-    center = (phat + (z*z)/(2*n)) / denom
-    half = z * np.sqrt((phat*(1-phat) + (z*z)/(4*n)) / n) / denom
-    return (max(0.0, center - half), min(1.0, center + half))
-
-def format_pct(p):
-    if pd.isna(p):
-        return "--"
-    return f"{100*p:.1f}\\%"
-
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--csv", required=True, help="per-game CSV path")
-    ap.add_argument("--out", default="order_summary.tex", help="LaTeX output path")
-    ap.add_argument("--tie", choices=["exclude","half"], default="exclude",
-                    help="tie handling in P1 win rate")
-    args = ap.parse_args()
+# Normalise grid to strings like "4x4"
+def norm_grid(v):
+    try:
+        if isinstance(v, str) and "x" in v.lower():
+            return v
+        n = int(v)
+        return f"{n}x{n}"
+    except Exception:
+        return str(v)
 
-    df = pd.read_csv(args.csv)
-
-    grid_col = _find_col(df, ["grid","board","grid_size"])
-    p1a_col  = _find_col(df, ["p1_agent","agent_p1","p1","p1_ai"])
-    p2a_col  = _find_col(df, ["p2_agent","agent_p2","p2","p2_ai"])
-    s1_col   = _find_col(df, ["p1_score","score_p1"])
-    s2_col   = _find_col(df, ["p2_score","score_p2"])
+def _resolve_cols(df):
+    """Return (grid, p1 agent, p2 agent, p1 score, p2 score) column names."""
+    return (_find_col(df, ["grid","board","grid_size"]),
+            _find_col(df, ["p1_agent","agent_p1","p1","p1_ai"]),
+            _find_col(df, ["p2_agent","agent_p2","p2","p2_ai"]),
+            _find_col(df, ["p1_score","score_p1"]),
+            _find_col(df, ["p2_score","score_p2"]))
 
+def normalize_games(df, grid_col, p1a_col, p2a_col, s1_col, s2_col):
+    """Add the canonical GRID/P1A/P2A/P1S/P2S columns used by both engines."""
     df = df.copy()
-
-    # Normalise grid to strings like "4x4"
-    def norm_grid(v):
-        try:
-            if isinstance(v, str) and "x" in v.lower():
-                return v
-            n = int(v)
-            return f"{n}x{n}"
-        except Exception:
-            return str(v)
-
     df["GRID"] = df[grid_col].apply(norm_grid)
     df["P1A"]  = df[p1a_col].astype(str)
     df["P2A"]  = df[p2a_col].astype(str)
     df["P1S"]  = df[s1_col].astype(int)
     df["P2S"]  = df[s2_col].astype(int)
+    return df
 
-    agents = sorted(set(df["P1A"]).union(set(df["P2A"])))
-    grids  = sorted(df["GRID"].unique())
-
-    def p1_winrate(sub):
-        """Return (p, (lo,hi), n_used)."""
-        if len(sub) == 0:
-            return (np.nan, (np.nan, np.nan), 0)
-        p1_wins = (sub["P1S"] > sub["P2S"]).sum()
-        ties    = (sub["P1S"] == sub["P2S"]).sum()
-        losses  = (sub["P1S"] < sub["P2S"]).sum()
-        if args.tie == "exclude":
-            n = p1_wins + losses
-            if n == 0:
-                return (np.nan, (np.nan, np.nan), len(sub))
-            p = p1_wins / n
-            lo, hi = wilson_ci(p1_wins, n)
-            return (p, (lo, hi), len(sub))
-        else:
-            # ties counted as 0.5; no CI to avoid false precision
-            n = len(sub)
-            p = (p1_wins + 0.5*ties) / n
-            return (p, (np.nan, np.nan), len(sub))
+def format_pct(p):
+    if pd.isna(p):
+        return "--"
+    return f"{100*p:.1f}\\%"
 
+def p1_winrate(sub, tie="exclude"):
+    """Return (p, (lo,hi), n_used) for the P1 seat of one ordered matchup."""
+    if len(sub) == 0:
+        return (np.nan, (np.nan, np.nan), 0)
+    p1_wins = (sub["P1S"] > sub["P2S"]).sum()
+    ties    = (sub["P1S"] == sub["P2S"]).sum()
+    losses  = (sub["P1S"] < sub["P2S"]).sum()
+    if tie == "exclude":
+        n = p1_wins + losses
+        if n == 0:
+            return (np.nan, (np.nan, np.nan), len(sub))
+        p = p1_wins / n
+        lo, hi = wilson_ci(p1_wins, n)
+        return (p, (lo, hi), len(sub))
+    else:
+        # ties counted as 0.5; no CI to avoid false precision
+        n = len(sub)
+        p = (p1_wins + 0.5*ties) / n
+        return (p, (np.nan, np.nan), len(sub))
+
+def order_summary_loop(df, grids, agents, tie="exclude"):
+    """Reference engine: filter the games frame once per ordered (grid, A, B).
+    O(grids * agents^2 * rows); kept to cross-check the grouped engine."""
     rows = []
     for g in grids:
         dfg = df[df["GRID"] == g]
@@ -112,10 +114,10 @@ def main():
                     continue
                 # A as P1 vs B
                 sub1 = dfg[(dfg["P1A"] == A) & (dfg["P2A"] == B)]
-                p_AB, ci_AB, n1 = p1_winrate(sub1)
+                p_AB, ci_AB, n1 = p1_winrate(sub1, tie)
                 # B as P1 vs A
                 sub2 = dfg[(dfg["P1A"] == B) & (dfg["P2A"] == A)]
-                p_BA, ci_BA, n2 = p1_winrate(sub2)
+                p_BA, ci_BA, n2 = p1_winrate(sub2, tie)
 
                 if np.isnan(p_AB) or np.isnan(p_BA):
                     s = np.nan
@@ -136,15 +138,130 @@ def main():
                     "s(A,B)": s,
                     "Delta": delta
                 })
+    return pd.DataFrame(rows)
+
+def matchup_counts(df):
+    """P1 wins / ties / losses per ordered (GRID, P1A, P2A), in one grouped pass."""
+    diff = df["P1S"].to_numpy() - df["P2S"].to_numpy()
+    flags = pd.DataFrame({
+        "GRID": df["GRID"].to_numpy(),
+        "P1A": df["P1A"].to_numpy(),
+        "P2A": df["P2A"].to_numpy(),
+        "p1_wins": (diff > 0).astype(np.int64),
+        "ties":    (diff == 0).astype(np.int64),
+        "losses":  (diff < 0).astype(np.int64),
+    })
+    return flags.groupby(["GRID", "P1A", "P2A"], sort=False)[["p1_wins", "ties", "losses"]].sum()
 
-    out_df = pd.DataFrame(rows)
+def _p1_rates(counts, tie):
+    """Vectorised p1_winrate over aligned count columns. Returns (p, lo, hi, n_rows)."""
+    wins   = counts["p1_wins"].to_numpy()
+    ties   = counts["ties"].to_numpy()
+    losses = counts["losses"].to_numpy()
+    n_rows = wins + ties + losses
+    if tie == "exclude":
+        n = wins + losses
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p = np.where(n > 0, wins / n, np.nan)
+        lo, hi = wilson_ci_arrays(wins, n)
+    else:
+        # ties counted as 0.5; no CI to avoid false precision
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p = np.where(n_rows > 0, (wins + 0.5*ties) / n_rows, np.nan)
+        lo = hi = np.full(len(p), np.nan)
+    return p, lo, hi, n_rows
 
-    def fmt_ci(ci):
-        lo, hi = ci
-        if np.isnan(lo) or np.isnan(hi):
-            return "--"
-        return f"[{100*lo:.1f}\\%, {100*hi:.1f}\\%]"
+def _ci_tuples(lo, hi):
+    # Same clamping (and scalar types) as wilson_ci so the CSV is byte-identical.
+    return [(np.nan, np.nan) if np.isnan(l) else (max(0.0, l), min(1.0, h))
+            for l, h in zip(lo, hi)]
 
+def _float_ci_tuples(lo, hi):
+    # Percentile intervals are already inside [0, 1]; plain floats so the CSV reads "(0.4, 0.6)".
+    return [(np.nan, np.nan) if np.isnan(l) else (float(l), float(h)) for l, h in zip(lo, hi)]
+
+def _boot_rates(reps, tie):
+    wins, ties, losses = reps[..., 0], reps[..., 1], reps[..., 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if tie == "exclude":
+            return wins / (wins + losses)
+        return (wins + 0.5*ties) / (wins + ties + losses)
+
+def _boot_order_stats(rng, b, cols, counts, ab, ba, tie):
+    """b replicates of order-summary columns `cols` -> (b, 4, len(cols)): p_AB, p_BA, s, Delta.
+    Each column's two count rows come from the same replicate, so s and Delta are consistent."""
+    keys = np.unique(np.concatenate([ab[cols], ba[cols]]))
+    p = _boot_rates(multinomial_replicates(counts[keys], b, rng), tie)
+    p_AB, p_BA = p[:, np.searchsorted(keys, ab[cols])], p[:, np.searchsorted(keys, ba[cols])]
+    return np.stack([p_AB, p_BA, 0.5 * (p_AB + (1 - p_BA)), p_AB - (1 - p_BA)], axis=1)
+
+def bootstrap_order_cis(counts, idx_ab, idx_ba, tie="exclude", B=10_000, seed=DEFAULT_SEED,
+                        jobs=1, conf=0.95):
+    """Percentile CIs over all (grid, A, B) rows, a slice of rows at a time (bootstrap.column_cis).
+    Returns {name: (lo, hi)} for p_AB, p_BA, s and Delta, each an array aligned with idx_ab."""
+    keys = idx_ab.union(idx_ba)
+    mat = counts.reindex(keys, fill_value=0)[["p1_wins", "ties", "losses"]].to_numpy()
+    fn = partial(_boot_order_stats, counts=mat, ab=keys.get_indexer(idx_ab),
+                 ba=keys.get_indexer(idx_ba), tie=tie)
+    lo, hi = column_cis(fn, len(idx_ab), B, seed=seed, jobs=jobs, conf=conf)
+    return {name: (lo[i], hi[i]) for i, name in enumerate(["p_AB", "p_BA", "s", "Delta"])}
+
+def order_summary_from_counts(counts, grids, agents, tie="exclude", boot=0, seed=DEFAULT_SEED, jobs=1):
+    """Grouped engine: derive the order summary from matchup_counts() output.
+    Row order and values match order_summary_loop(). With boot > 0, adds
+    bootstrap CIs for s and Delta (and for the rates under tie='half')."""
+    combos = [(g, A, B) for g in grids for A in agents for B in agents if A != B]
+    if not combos:
+        return pd.DataFrame(columns=["Grid", "Matchup", "p_A_to_B", "p_A_to_B_CI", "n_AB",
+                                     "p_B_to_A", "p_B_to_A_CI", "n_BA", "s(A,B)", "Delta"])
+    g_col, a_col, b_col = (list(c) for c in zip(*combos))
+    idx_ab = pd.MultiIndex.from_arrays([g_col, a_col, b_col])
+    idx_ba = pd.MultiIndex.from_arrays([g_col, b_col, a_col])
+    ab = counts.reindex(idx_ab, fill_value=0)
+    ba = counts.reindex(idx_ba, fill_value=0)
+
+    p_AB, lo_AB, hi_AB, n1 = _p1_rates(ab, tie)
+    p_BA, lo_BA, hi_BA, n2 = _p1_rates(ba, tie)
+    both = ~(np.isnan(p_AB) | np.isnan(p_BA))
+    s     = np.where(both, 0.5 * (p_AB + (1 - p_BA)), np.nan)
+    delta = np.where(both, p_AB - (1 - p_BA), np.nan)
+
+    out = pd.DataFrame({
+        "Grid": g_col,
+        "Matchup": [f"{A} vs {B}" for A, B in zip(a_col, b_col)],
+        "p_A_to_B": p_AB,
+        "p_A_to_B_CI": _ci_tuples(lo_AB, hi_AB),
+        "n_AB": n1,
+        "p_B_to_A": p_BA,
+        "p_B_to_A_CI": _ci_tuples(lo_BA, hi_BA),
+        "n_BA": n2,
+        "s(A,B)": s,
+        "Delta": delta
+    })
+    if boot:
+        ci = bootstrap_order_cis(counts, idx_ab, idx_ba, tie, B=boot, seed=seed, jobs=jobs)
+        if tie == "half":
+            out["p_A_to_B_CI"] = _float_ci_tuples(*ci["p_AB"])
+            out["p_B_to_A_CI"] = _float_ci_tuples(*ci["p_BA"])
+        out["s_CI"] = _float_ci_tuples(*ci["s"])
+        out["Delta_CI"] = _float_ci_tuples(*ci["Delta"])
+    return out
+
+def fmt_ci(ci):
+    lo, hi = ci
+    if np.isnan(lo) or np.isnan(hi):
+        return "--"
+    return f"[{100*lo:.1f}\\%, {100*hi:.1f}\\%]"
+
+def fmt_signed_ci(ci):
+    lo, hi = ci
+    if np.isnan(lo) or np.isnan(hi):
+        return "--"
+    return f"[{100*lo:+.1f}\\%, {100*hi:+.1f}\\%]"
+
+def write_order_summary(out_df, grids, out_path):
+    """Write one LaTeX table per grid to out_path and the raw metrics next to it
+    (<stem>_metrics.csv). Returns the metrics CSV path."""
     tables = []
     for g in grids:
         sub = out_df[out_df["Grid"] == g].copy()
@@ -158,6 +275,10 @@ def main():
         sub["d_fmt"] = sub["Delta"].apply(lambda x: "--" if pd.isna(x) else f"{100*x:+.1f}\\%")
 
         cols = ["Matchup","p_AB","CI_AB","p_BA","CI_BA","s_fmt","d_fmt"]
+        if "s_CI" in sub.columns:
+            sub["CI_s"] = sub["s_CI"].apply(fmt_ci)
+            sub["CI_d"] = sub["Delta_CI"].apply(fmt_signed_ci)
+            cols = ["Matchup","p_AB","CI_AB","p_BA","CI_BA","s_fmt","CI_s","d_fmt","CI_d"]
         sub = sub[cols].rename(columns={
             "Matchup":"Matchup (A vs B)",
             "p_AB":"$p_{A\\to B}$",
@@ -165,22 +286,69 @@ def main():
             "p_BA":"$p_{B\\to A}$",
             "CI_BA":"95\\% CI",
             "s_fmt":"$s(A,B)$",
-            "d_fmt":"$\\Delta(A,B)$"
+            "d_fmt":"$\\Delta(A,B)$",
+            "CI_s":"95\\% CI",
+            "CI_d":"95\\% CI"
         })
 
         latex = sub.to_latex(
-            index=False, escape=False, column_format="lcccccc",
+            index=False, escape=False, column_format="l" + "c" * (len(cols) - 1),
             caption=f"Order-invariant strength $s(A,B)$ and first-move bias $\\Delta(A,B)$ on {g}.",
             label=f"tab:order_summary_{g.replace('x','x')}"
         )
         tables.append(latex)
 
     final_tex = "\n\n".join(tables) if tables else "% No data rows matched."
-    with open(args.out, "w") as f:
+    out_path = str(out_path)
+    with open(out_path, "w") as f:
         f.write(final_tex)
 
-    csv_out = args.out.replace(".tex", "_metrics.csv")
+    csv_out = out_path.replace(".tex", "_metrics.csv")
     out_df.to_csv(csv_out, index=False)
+    return csv_out
+
+def main():
+    ap = order_summary_parser()
+    args = ap.parse_args()
+    if args.bootstrap and args.engine == "loop":
+        ap.error("--bootstrap requires --engine grouped")
+
+    if args.chunksize:
+        if args.engine == "loop":
+            ap.error("--chunksize requires --engine grouped")
+        # bounded memory: stream only the five needed columns and sum per-chunk counts
+        cols = _resolve_cols(pd.read_csv(args.csv, nrows=0))
+        grid_col, p1a_col, p2a_col, s1_col, s2_col = cols
+        dtypes = {p1a_col: "category", p2a_col: "category", s1_col: "int16", s2_col: "int16"}
+        counts = None
+        for chunk in iter_games(args.csv, chunksize=args.chunksize, usecols=cols, dtype=dtypes):
+            c = matchup_counts(normalize_games(chunk, *cols))
+            counts = c if counts is None else pd.concat([counts, c]).groupby(level=[0, 1, 2], sort=False).sum()
+        keys = counts.index.to_frame(index=False)
+        df = None
+    elif args.cache:
+        cols = _resolve_cols(pd.read_csv(args.csv, nrows=0))
+        if cols[0] != "grid":
+            ap.error("--cache needs the benchmark schema (an integer 'grid' column)")
+        df = normalize_games(read_games(args.csv, columns=list(cols)), *cols)
+        keys = df
+    else:
+        df = pd.read_csv(args.csv)
+        df = normalize_games(df, *_resolve_cols(df))
+        keys = df
+
+    agents = sorted(set(keys["P1A"]).union(set(keys["P2A"])))
+    grids  = sorted(keys["GRID"].unique())
+
+    if args.engine == "loop":
+        out_df = order_summary_loop(df, grids, agents, args.tie)
+    else:
+        if df is not None:
+            counts = matchup_counts(df)
+        out_df = order_summary_from_counts(counts, grids, agents, args.tie,
+                                           boot=args.bootstrap, seed=args.seed, jobs=args.jobs)
+
+    csv_out = write_order_summary(out_df, grids, args.out)
     print("Wrote:", args.out)
     print("Also wrote:", csv_out)
 
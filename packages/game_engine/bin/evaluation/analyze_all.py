@@ -1,9 +1,17 @@
 # D:\Project\dots_and_boxes_ws\packages\game_engine\bin\evaluation\analyze_all.py
-from pathlib import Path
-import argparse
 import sys
 import pandas as pd
 import numpy as np
+from streaming import STAT_QUANTILES, TIMING_METRICS, GamesAccumulator, encode_pairs, flip_roles
+from columnar_cache import read_games, read_summary
+from profiling import Profiler
+from evaluation import summarize_parser
+
+# per-game columns the analyses below read (unsafe listed under both historical names)
+GAMES_COLUMNS = ['grid','p1_ai','p2_ai','p1_score','p2_score',
+                 'p1_unsafe_moves','p2_unsafe_moves','p1_unsafe','p2_unsafe',
+                 'p1_turns','p2_turns','p1_longest_streak','p2_longest_streak'] \
+              + [f'{r}_{t}_ms' for t in TIMING_METRICS for r in ('p1','p2')]
 
 def detect_unsafe_cols(games_df: pd.DataFrame):
     """
@@ -25,42 +33,108 @@ def wins_unordered(summary: pd.DataFrame) -> pd.DataFrame:
     For self-play (A vs A), this reduces to the single row.
     Outputs total wins, ties, and win rates for each agent by grid.
     """
-    def key(a, b): return tuple(sorted([a, b]))
-    rows = []
-    for (grid, pair), sdf in summary.assign(pair=lambda r: r.apply(lambda x: key(x['p1_ai'], x['p2_ai']), axis=1)).groupby(['grid','pair']):
-        A, B = pair
-        # Aggregate both orders
-        A_wins = B_wins = ties = games = 0
-        for _, r in sdf.iterrows():
-            if (r['p1_ai'], r['p2_ai']) == (A, B):
-                A_wins += int(r['p1_wins']); B_wins += int(r['p2_wins'])
-                ties   += int(r['ties']);    games  += int(r['games'])
-            else:  # reversed
-                A_wins += int(r['p2_wins']); B_wins += int(r['p1_wins'])
-                ties   += int(r['ties']);    games  += int(r['games'])
-        rows.append({
-            'grid': grid, 'agent_A': A, 'agent_B': B,
-            'A_wins': A_wins, 'B_wins': B_wins, 'ties': ties, 'games': games,
-            'A_win_rate': A_wins / games if games else np.nan,
-            'B_win_rate': B_wins / games if games else np.nan,
-            'tie_rate':   ties   / games if games else np.nan,
-        })
-    out = pd.DataFrame(rows).sort_values(['grid','agent_A','agent_B']).reset_index(drop=True)
+    agents, a, b, swapped = encode_pairs(summary['p1_ai'], summary['p2_ai'])
+    A_wins, B_wins = flip_roles(swapped, summary['p1_wins'].to_numpy(), summary['p2_wins'].to_numpy())
+    out = (pd.DataFrame({'grid': summary['grid'].to_numpy(), 'a': a, 'b': b,
+                         'A_wins': A_wins, 'B_wins': B_wins,
+                         'ties': summary['ties'].to_numpy(), 'games': summary['games'].to_numpy()})
+             .groupby(['grid','a','b'], as_index=False, sort=True).sum())
+    games = out['games'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = {c: np.where(games > 0, out[c].to_numpy() / games, np.nan) for c in ['A_wins','B_wins','ties']}
+    out = pd.DataFrame({
+        'grid': out['grid'], 'agent_A': agents[out['a']], 'agent_B': agents[out['b']],
+        'A_wins': out['A_wins'], 'B_wins': out['B_wins'], 'ties': out['ties'], 'games': out['games'],
+        'A_win_rate': rate['A_wins'], 'B_win_rate': rate['B_wins'], 'tie_rate': rate['ties'],
+    })
     return out
 
+def stack_roles(df: pd.DataFrame, p1_col: str, p2_col: str, keys=('grid',)) -> pd.DataFrame:
+    """
+    Role-combining reshape: stack a p1/p2 column pair into long form with columns
+    keys..., agent, value. Two rows per input row (all p1 rows first, then all p2
+    rows), built from contiguous arrays with no per-row Python.
+    """
+    out = {k: np.tile(df[k].to_numpy(), 2) for k in keys}
+    out['agent'] = np.concatenate([df['p1_ai'].to_numpy(dtype=object), df['p2_ai'].to_numpy(dtype=object)])
+    out['value'] = np.concatenate([df[p1_col].to_numpy(), df[p2_col].to_numpy()])
+    return pd.DataFrame(out)
+
+def role_stats(df: pd.DataFrame, p1_col: str, p2_col: str, quantiles=STAT_QUANTILES) -> pd.DataFrame:
+    """
+    Per (grid, agent) count / mean / std (ddof=1) / min / quantiles / max of a
+    per-role metric, combining both seats. One sort of the stacked values gives
+    group boundaries and within-group order; everything else is array arithmetic.
+    Quantiles interpolate linearly, like pandas/NumPy defaults.
+    """
+    long = stack_roles(df, p1_col, p2_col)
+    v = long['value'].to_numpy(dtype=float)
+    keep = ~np.isnan(v)
+    v = v[keep]
+    grid_vals, g = np.unique(long['grid'].to_numpy()[keep], return_inverse=True)
+    agent_vals, a = np.unique(long['agent'].to_numpy()[keep].astype(str), return_inverse=True)
+    qcols = [f"q{int(round(q*100)):02d}" for q in quantiles]
+    if v.size == 0:
+        return pd.DataFrame(columns=['grid','agent','count','mean','std','min',*qcols,'max'])
+
+    # sums in input order (stable sort on the keys only) so means match a plain groupby
+    by_key = np.lexsort((a, g))
+    start = np.flatnonzero(np.r_[True, (np.diff(g[by_key]) != 0) | (np.diff(a[by_key]) != 0)])
+    count = np.diff(np.r_[start, v.size])
+    mean = np.add.reduceat(v[by_key], start) / count
+    dev = v[by_key] - np.repeat(mean, count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(np.add.reduceat(dev*dev, start) / (count - 1))
+    std[count < 2] = np.nan
+
+    # quantiles from the values sorted within each group (same group boundaries)
+    sv = v[np.lexsort((v, a, g))]
+    cols = {
+        'grid': grid_vals[g[by_key][start]],
+        'agent': agent_vals[a[by_key][start]],
+        'count': count, 'mean': mean, 'std': std,
+        'min': sv[start],
+    }
+    for name, q in zip(qcols, quantiles):
+        pos = start + q * (count - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, start + count - 1)
+        cols[name] = sv[lo] + (pos - lo) * (sv[hi] - sv[lo])
+    cols['max'] = sv[start + count - 1]
+    return pd.DataFrame(cols)
+
+def role_metric_columns(games: pd.DataFrame) -> dict:
+    """metric name -> (p1 column, p2 column) for every per-role metric present."""
+    cols = {}
+    try:
+        cols['unsafe'] = detect_unsafe_cols(games)
+    except KeyError:
+        pass
+    for metric, suffix in [('streak', 'longest_streak'), ('score', 'score'), ('turns', 'turns')]:
+        cols[metric] = (f'p1_{suffix}', f'p2_{suffix}')
+    for kind in ['ai', 'apply']:
+        for stat in ['mean', 'p50', 'p95']:
+            cols[f'{kind}_{stat}_ms'] = (f'p1_{kind}_{stat}_ms', f'p2_{kind}_{stat}_ms')
+    return {m: c for m, c in cols.items() if set(c).issubset(games.columns)}
+
+def agent_metrics(games: pd.DataFrame) -> pd.DataFrame:
+    """
+    Long table of role_stats for every per-role metric (unsafe, streak, score,
+    turns, timing) per agent & grid: grid, agent, metric, count, mean, std, ...
+    """
+    parts = [role_stats(games, c1, c2).assign(metric=m) for m, (c1, c2) in role_metric_columns(games).items()]
+    out = pd.concat(parts, ignore_index=True)
+    first = ['grid', 'agent', 'metric']
+    return (out[first + [c for c in out.columns if c not in first]]
+              .sort_values(first, kind='stable').reset_index(drop=True))
+
 def unsafe_by_agent_games(games: pd.DataFrame) -> pd.DataFrame:
     """
     From per-game CSV, compute unsafe-move averages per agent & grid (combining roles).
     """
     p1u, p2u = detect_unsafe_cols(games)
-    # melt-like accumulation
-    rec = []
-    for _, r in games.iterrows():
-        rec.append({'grid': r['grid'], 'agent': r['p1_ai'], 'unsafe': r[p1u]})
-        rec.append({'grid': r['grid'], 'agent': r['p2_ai'], 'unsafe': r[p2u]})
-    df = pd.DataFrame(rec)
-    out = df.groupby(['grid','agent'], as_index=False)['unsafe'].mean().rename(columns={'unsafe':'unsafe_mean_games'})
-    return out
+    st = role_stats(games, p1u, p2u)
+    return st[['grid','agent']].assign(unsafe_mean_games=st['mean'])
 
 def unsafe_by_agent_summary(summary: pd.DataFrame) -> pd.DataFrame:
     """
@@ -92,47 +166,36 @@ def game_length_by_grid(games: pd.DataFrame) -> pd.DataFrame:
     """
     Average game length in turns (p1_turns + p2_turns), grouped by grid and pairing (unordered).
     """
-    def key(a, b): return tuple(sorted([a, b]))
-    games = games.copy()
-    games['pair'] = games.apply(lambda r: key(r['p1_ai'], r['p2_ai']), axis=1)
-    games['turns_total'] = games['p1_turns'] + games['p2_turns']
-    agg = (games.groupby(['grid','pair'], as_index=False)
-                .agg(turns_mean=('turns_total','mean'),
-                     turns_std=('turns_total','std'),
-                     n=('turns_total','size')))
-    # split pair back to two columns for readability
-    agg[['agent_A','agent_B']] = pd.DataFrame(agg['pair'].tolist(), index=agg.index)
-    return agg.drop(columns=['pair']).sort_values(['grid','agent_A','agent_B']).reset_index(drop=True)
+    agents, a, b, _ = encode_pairs(games['p1_ai'], games['p2_ai'])
+    # reuse turns_total when dataset.prepare_games has already added it
+    turns = games['turns_total'] if 'turns_total' in games.columns else games['p1_turns'] + games['p2_turns']
+    agg = (pd.DataFrame({'grid': games['grid'].to_numpy(), 'a': a, 'b': b, 'turns_total': turns.to_numpy()})
+             .groupby(['grid','a','b'], as_index=False, sort=True)
+             .agg(turns_mean=('turns_total','mean'),
+                  turns_std=('turns_total','std'),
+                  n=('turns_total','size')))
+    # codes are ranked by name, so (grid, a, b) order is (grid, agent_A, agent_B) order
+    agg['agent_A'] = agents[agg.pop('a')]
+    agg['agent_B'] = agents[agg.pop('b')]
+    return agg
 
 def streaks_by_agent(games: pd.DataFrame) -> pd.DataFrame:
     """
     Average longest-scoring streak per agent & grid (combining roles).
     """
-    rec = []
-    for _, r in games.iterrows():
-        rec.append({'grid': r['grid'], 'agent': r['p1_ai'], 'streak': r['p1_longest_streak']})
-        rec.append({'grid': r['grid'], 'agent': r['p2_ai'], 'streak': r['p2_longest_streak']})
-    df = pd.DataFrame(rec)
-    out = df.groupby(['grid','agent'], as_index=False)['streak'].mean().rename(columns={'streak':'longest_streak_mean'})
-    return out.sort_values(['grid','agent']).reset_index(drop=True)
+    st = role_stats(games, 'p1_longest_streak', 'p2_longest_streak')
+    return st[['grid','agent']].assign(longest_streak_mean=st['mean'])
 
 def build_winner_col(games: pd.DataFrame) -> pd.DataFrame:
+    if 'winner' in games.columns:  # already added by dataset.prepare_games
+        return games
     g = games.copy()
     g['winner'] = np.where(g['p1_score'] > g['p2_score'], 'p1',
                    np.where(g['p2_score'] > g['p1_score'], 'p2', 'tie'))
     return g
 
 def main():
-    from pathlib import Path
-    default_summary = Path(r"D:\Project\dots_and_boxes_ws\packages\game_engine\bin\benchmark2_summary.csv")
-    default_games   = Path(r"D:\Project\dots_and_boxes_ws\packages\game_engine\bin\benchmark2_games.csv")
-    default_out     = Path(r"D:\Project\dots_and_boxes_ws\packages\game_engine\bin\evaluation\out")
-
-
-    ap = argparse.ArgumentParser(description="Analyze Dots & Boxes benchmarks (summary + per-game).")
-    ap.add_argument("--summary", type=Path, default=default_summary, help="Path to benchmark2_summary.csv")
-    ap.add_argument("--games",   type=Path, default=default_games,   help="Path to benchmark2_games.csv")
-    ap.add_argument("--out",     type=Path, default=default_out,     help="Output directory for derived CSVs")
+    ap = summarize_parser()
     args = ap.parse_args()
 
     if not args.summary.exists():
@@ -140,43 +203,66 @@ def main():
     if not args.games.exists():
         print(f"ERROR: games CSV not found at: {args.games}"); sys.exit(1)
     args.out.mkdir(parents=True, exist_ok=True)
+    prof = Profiler.from_args(args, args.out, "analyze_all")
 
-    summary = pd.read_csv(args.summary)
-    games   = pd.read_csv(args.games)
+    with prof.stage("load_summary"):
+        summary = read_summary(args.summary) if args.cache else pd.read_csv(args.summary)
 
     # types & sanity
-    for col in ['grid','games','p1_wins','p2_wins','ties']:
-        if col in summary.columns:
-            summary[col] = summary[col].astype(int)
-    for col in ['grid','p1_score','p2_score','p1_turns','p2_turns','p1_longest_streak','p2_longest_streak']:
-        if col in games.columns:
-            games[col] = games[col].astype(int)
+    with prof.stage("normalize_summary"):
+        for col in ['grid','games','p1_wins','p2_wins','ties']:
+            if col in summary.columns:
+                summary[col] = summary[col].astype(int)
+
+    if args.chunksize:
+        # constant-memory path: fold the games CSV into per-matchup accumulators
+        with prof.stage("load_games"):
+            acc = GamesAccumulator.from_csv(args.games, chunksize=args.chunksize, sketches=True)
+        unsafe_g = prof.call("unsafe_by_agent_games", acc.unsafe_by_agent_games)
+        turns    = prof.call("game_length_by_grid", acc.game_length_by_grid)
+        streaks  = prof.call("streaks_by_agent", acc.streaks_by_agent)
+        # exact for the integer metrics; timing min/quantiles/max from t-digests
+        metrics  = prof.call("agent_metrics", acc.agent_metrics, STAT_QUANTILES)
+    else:
+        with prof.stage("load_games"):
+            games = read_games(args.games, columns=GAMES_COLUMNS) if args.cache else pd.read_csv(args.games)
+        with prof.stage("normalize_games"):
+            for col in ['grid','p1_score','p2_score','p1_turns','p2_turns','p1_longest_streak','p2_longest_streak']:
+                if col in games.columns:
+                    games[col] = games[col].astype(int)
+
+            # add winner column to games
+            games = build_winner_col(games)
 
-    # add winner column to games
-    games = build_winner_col(games)
+        unsafe_g = prof.call("unsafe_by_agent_games", unsafe_by_agent_games, games)
+        turns    = prof.call("game_length_by_grid", game_length_by_grid, games)
+        streaks  = prof.call("streaks_by_agent", streaks_by_agent, games)
+        metrics  = prof.call("agent_metrics", agent_metrics, games)
 
     # ---------- analyses ----------
-    wins_unord = wins_unordered(summary)
-    unsafe_g   = unsafe_by_agent_games(games)
-    unsafe_s   = unsafe_by_agent_summary(summary)
-    turns      = game_length_by_grid(games)
-    streaks    = streaks_by_agent(games)
+    wins_unord = prof.call("wins_unordered", wins_unordered, summary)
+    unsafe_s   = prof.call("unsafe_by_agent_summary", unsafe_by_agent_summary, summary)
 
     # merge unsafe summary vs games for quick side-by-side
-    unsafe_both = (pd.merge(unsafe_s, unsafe_g, on=['grid','agent'], how='outer')
-                     .sort_values(['grid','agent'])
-                     .reset_index(drop=True))
+    with prof.stage("merge_unsafe"):
+        unsafe_both = (pd.merge(unsafe_s, unsafe_g, on=['grid','agent'], how='outer')
+                         .sort_values(['grid','agent'])
+                         .reset_index(drop=True))
 
     # ---------- write outputs ----------
-    wins_unord.to_csv(args.out / "wins_unordered.csv", index=False)
-    unsafe_both.to_csv(args.out / "unsafe_by_agent_summary_vs_games.csv", index=False)
-    turns.to_csv(args.out / "game_length_by_grid.csv", index=False)
-    streaks.to_csv(args.out / "longest_streak_by_agent.csv", index=False)
+    with prof.stage("write"):
+        wins_unord.to_csv(args.out / "wins_unordered.csv", index=False)
+        unsafe_both.to_csv(args.out / "unsafe_by_agent_summary_vs_games.csv", index=False)
+        turns.to_csv(args.out / "game_length_by_grid.csv", index=False)
+        streaks.to_csv(args.out / "longest_streak_by_agent.csv", index=False)
+        metrics.to_csv(args.out / "agent_metrics.csv", index=False)
 
     print(f"Wrote:\n - {args.out / 'wins_unordered.csv'}"
           f"\n - {args.out / 'unsafe_by_agent_summary_vs_games.csv'}"
           f"\n - {args.out / 'game_length_by_grid.csv'}"
-          f"\n - {args.out / 'longest_streak_by_agent.csv'}")
+          f"\n - {args.out / 'longest_streak_by_agent.csv'}"
+          f"\n - {args.out / 'agent_metrics.csv'}")
+    prof.write()
 
 if __name__ == "__main__":
     main()
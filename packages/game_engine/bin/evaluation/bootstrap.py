@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Batched bootstrap over many groups at once.
+
+Rows are sorted by group once. A replicate block then draws a (b × n) uniform
+matrix, turns it into within-group indices (group start + ⌊u · group size⌋)
+and reduces every group of every replicate with one np.add.reduceat. Thousands
+of matchups are resampled together instead of in a Python loop per matchup.
+Blocks keep b × n under BLOCK_CELLS so memory does not grow with B.
+
+Count data (wins / ties / losses per matchup) needs no row indices: a
+replicate of a matchup is one multinomial draw with the observed proportions,
+so multinomial_replicates resamples many matchups in one call. column_cis
+splits the matchups into column slices sized so that B × slice stays under
+CI_CELLS, resamples each slice on its own child of SeedSequence(seed) and
+keeps only the slice's percentiles, so very large B never holds every
+replicate of every matchup. Slices can fan out over a process pool; the
+intervals depend only on the seed, B and the matchups, not on the workers.
+"""
+
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DEFAULT_B = 2000
+DEFAULT_SEED = 0
+BLOCK_CELLS = 1 << 22   # resampled cells per block (b replicates × n rows)
+CI_CELLS = 1 << 20   # replicates × columns held at once by column_cis
+
+
+def grouped_ratio_bootstrap(num, den, groups, n_groups=None, B=DEFAULT_B, rng=None,
+                            block_cells=BLOCK_CELLS):
+    """
+    Bootstrap sum(num) / sum(den) within each group, resampling rows with
+    replacement inside their group. With den = 1 this is the group mean; with
+    num = mean·turns and den = turns it is the per-move (turn-weighted) mean.
+    `groups` are integer codes in [0, n_groups). Returns a (B, n_groups) array;
+    groups without rows are NaN.
+    """
+    num = np.asarray(num, dtype=np.float64)
+    den = np.broadcast_to(np.asarray(den, dtype=np.float64), num.shape)
+    groups = np.asarray(groups, dtype=np.int64)
+    n_groups = int(groups.max()) + 1 if n_groups is None else n_groups
+    rng = np.random.default_rng(DEFAULT_SEED) if rng is None else rng
+    out = np.full((B, n_groups), np.nan)
+    if num.size == 0:
+        return out
+
+    order = np.argsort(groups, kind="stable")
+    num, den, groups = num[order], den[order], groups[order]
+    sizes = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(sizes) - sizes
+    present = np.flatnonzero(sizes)
+    cuts = starts[present]
+    # start + ⌊u·size⌋ == ⌊start + u·size⌋ for integer starts, so build it in place
+    row_start = starts[groups].astype(np.float64)
+    row_size = sizes[groups].astype(np.float64)
+    unit = bool(np.all(den == 1))   # plain means: the denominator is the group size
+
+    step = max(1, block_cells // num.size)
+    u = np.empty((min(step, B), num.size))
+    for b0 in range(0, B, step):
+        b = min(step, B - b0)
+        ub = u[:b]
+        rng.random(out=ub)
+        ub *= row_size
+        ub += row_start
+        idx = ub.astype(np.intp)
+        s_num = np.add.reduceat(num[idx], cuts, axis=1)
+        s_den = sizes[present] if unit else np.add.reduceat(den[idx], cuts, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[b0:b0 + b, present] = s_num / s_den
+    return out
+
+
+def multinomial_replicates(counts, b, rng):
+    """(b, G, k) multinomial resamples of the (G, k) count rows; empty rows stay zero."""
+    counts = np.asarray(counts, dtype=np.int64)
+    n = counts.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(n[:, None] > 0, counts / n[:, None], 0.0)
+    p[n == 0, 0] = 1.0
+    return rng.multinomial(n, p, size=(b, len(counts)))
+
+
+def _column_slice(fn, seq, cols, B, conf, cells):
+    """Replicates of one column slice, drawn in blocks into one (B, k, w) buffer -> its (lo, hi)."""
+    rng = np.random.default_rng(seq)
+    step = max(1, cells // (8 * len(cols)))   # keeps fn's own (b, ·, w) temporaries small
+    buf = None
+    for b0 in range(0, B, step):
+        part = fn(rng, min(step, B - b0), cols)
+        if buf is None:
+            buf = np.empty((B,) + part.shape[1:])
+        buf[b0:b0 + len(part)] = part
+    lo, hi = percentile_ci(buf.reshape(B, -1), conf)
+    return lo.reshape(buf.shape[1:]), hi.reshape(buf.shape[1:])
+
+
+def column_cis(fn, n_cols, B=DEFAULT_B, seed=DEFAULT_SEED, jobs=1, conf=0.95, cells=CI_CELLS):
+    """
+    Percentile CIs of k statistics over n_cols independent columns (matchups).
+    fn(rng, b, cols) returns a (b, k, len(cols)) array: b replicates of the
+    statistics of columns `cols`. Columns are processed in slices of
+    cells // B, each seeded from its own child of SeedSequence(seed), and a
+    slice returns only its percentiles. Memory stays near `cells` replicate
+    values per worker whatever B and n_cols are, and the result does not
+    depend on `jobs`. With jobs > 1 the slices run on a process pool (fn must
+    be picklable: a module-level function or functools.partial).
+    Returns (lo, hi), each of shape (k, n_cols).
+    """
+    width = max(1, cells // B)
+    slices = [np.arange(i, min(i + width, n_cols)) for i in range(0, n_cols, width)]
+    seqs = np.random.SeedSequence(seed).spawn(len(slices))
+    args = ([fn] * len(slices), seqs, slices, [B] * len(slices), [conf] * len(slices), [cells] * len(slices))
+    if jobs > 1 and len(slices) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            parts = list(ex.map(_column_slice, *args))
+    else:
+        parts = list(map(_column_slice, *args))
+    return (np.concatenate([lo for lo, _ in parts], axis=1), np.concatenate([hi for _, hi in parts], axis=1))
+
+
+def percentile_ci(reps, conf=0.95):
+    """Percentile interval per column of a (B, G) replicate array. Returns (lo, hi)."""
+    a = (1 - conf) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # all-NaN columns (empty groups)
+        lo, hi = np.nanquantile(reps, [a, 1 - a], axis=0)
+    return lo, hi
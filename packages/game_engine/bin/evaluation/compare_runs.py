@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark runs (e.g. before / after a change in ai.dart).
+
+Each run directory holds the runner's benchmark2_games.csv. If a directory only
+has benchmark2_summary.csv, the win-rate check uses it and the latency check is
+skipped. Per ordered matchup (grid, p1_ai, p2_ai):
+
+  win rates - each seat's win rate (ties count as non-wins), candidate − base,
+              with a pooled two-proportion z-test. p-values are Holm-adjusted
+              over all tested rows. A row is a regression when the seat belongs
+              to an --agent under test, p_adj < --alpha and the win rate fell by
+              more than --win-threshold. Without --agent the deltas are reported
+              only: one agent's gain is its opponent's loss.
+  latency   - each seat's per-game timing metrics (default ai_mean, turn-weighted
+              per move, and ai_p95, mean of per-game p95), candidate − base, with
+              percentile bootstrap CIs (bootstrap.py resamples all matchups at
+              once). A row is a regression when the CI lies above 0, the
+              candidate is more than --latency-threshold slower (relative) and
+              the gap exceeds --latency-floor ms (the CSV resolution is 0.001 ms).
+
+Writes <out>/compare_winrates.csv and <out>/compare_latency.csv, prints the
+regressions and exits with status 1 if there are any.
+
+Usage:
+  python compare_runs.py runs/before runs/after --agent Deep2
+  python compare_runs.py runs/before runs/after --metrics ai_mean ai_p95 apply_mean --boot 5000 --seed 7
+"""
+
+import argparse
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bootstrap import DEFAULT_B, DEFAULT_SEED, grouped_ratio_bootstrap, percentile_ci
+from dataset import DEFAULT_GAMES, DEFAULT_OUT, DEFAULT_SUMMARY
+from streaming import KEY, ROLES, GamesAccumulator
+
+WIN_THRESHOLD = 0.05       # absolute win-rate drop
+ALPHA = 0.05
+LATENCY_THRESHOLD = 0.10   # relative slow-down
+LATENCY_FLOOR_MS = 0.01
+DEFAULT_METRICS = ("ai_mean", "ai_p95")
+
+
+# ---------- loading ----------
+
+def load_counts(run_dir):
+    """Per ordered matchup: n, p1_wins, p2_wins, ties (from the games CSV, else the summary)."""
+    games, summary = run_dir / DEFAULT_GAMES.name, run_dir / DEFAULT_SUMMARY.name
+    if games.exists():
+        o = GamesAccumulator.from_csv(games).ordered()
+        return o[KEY + ["n", "p1_wins", "p2_wins", "ties"]]
+    if summary.exists():
+        s = pd.read_csv(summary).rename(columns={"games": "n"})
+        s["grid"] = s["grid"].astype(int)
+        return s[KEY + ["n", "p1_wins", "p2_wins", "ties"]]
+    return None
+
+
+def load_timings(run_dir, metrics):
+    """Per-game timing columns of `metrics` for both seats (None without a games CSV)."""
+    path = run_dir / DEFAULT_GAMES.name
+    if not path.exists():
+        return None
+    header = pd.read_csv(path, nrows=0).columns
+    cols = [f"{r}_{m}_ms" for r in ROLES for m in metrics if f"{r}_{m}_ms" in header]
+    cols += [f"{r}_turns" for r in ROLES if f"{r}_turns" in header]
+    g = pd.read_csv(path, usecols=KEY + cols)
+    g["grid"] = g["grid"].astype(int)
+    return g
+
+
+# ---------- win rates ----------
+
+def two_proportion_z(k1, n1, k2, n2):
+    """Pooled two-proportion z statistic and two-sided p-value for k2/n2 − k1/n1."""
+    k1, n1, k2, n2 = (np.asarray(x, dtype=np.float64) for x in (k1, n1, k2, n2))
+    pool = (k1 + k2) / (n1 + n2)
+    se = np.sqrt(pool * (1 - pool) * (1 / n1 + 1 / n2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(se > 0, (k2 / n2 - k1 / n1) / se, 0.0)
+    p = np.vectorize(math.erfc, otypes=[float])(np.abs(z) / math.sqrt(2))
+    return z, p
+
+
+def holm(p):
+    """Holm step-down adjusted p-values."""
+    p = np.asarray(p, dtype=np.float64)
+    m = p.size
+    if m == 0:
+        return p
+    order = np.argsort(p)
+    adj = np.minimum(1.0, np.maximum.accumulate((m - np.arange(m)) * p[order]))
+    out = np.empty(m)
+    out[order] = adj
+    return out
+
+
+def compare_winrates(base, cand, agents=None, alpha=ALPHA, threshold=WIN_THRESHOLD):
+    m = base.merge(cand, on=KEY, suffixes=("_base", "_cand"))
+    parts = []
+    for r in ROLES:
+        parts.append(pd.DataFrame({
+            "grid": m["grid"], "p1_ai": m["p1_ai"], "p2_ai": m["p2_ai"], "seat": r,
+            "agent": m[f"{r}_ai"], "n_base": m["n_base"], "n_cand": m["n_cand"],
+            "wins_base": m[f"{r}_wins_base"], "wins_cand": m[f"{r}_wins_cand"],
+        }))
+    w = pd.concat(parts, ignore_index=True)
+    w["rate_base"] = w["wins_base"] / w["n_base"]
+    w["rate_cand"] = w["wins_cand"] / w["n_cand"]
+    w["delta"] = w["rate_cand"] - w["rate_base"]
+    w["z"], w["p"] = two_proportion_z(w["wins_base"], w["n_base"], w["wins_cand"], w["n_cand"])
+    w["p_adj"] = holm(w["p"].to_numpy())
+    watched = w["agent"].isin(agents) if agents else False
+    w["regression"] = watched & (w["p_adj"] < alpha) & (w["delta"] < -threshold)
+    return w.sort_values(KEY + ["seat"]).reset_index(drop=True)
+
+
+# ---------- latency ----------
+
+def _timing_long(games, metrics):
+    """One row per (game, seat, metric): key, seat, agent, metric, num, den."""
+    parts = []
+    for r in ROLES:
+        for mt in metrics:
+            c = f"{r}_{mt}_ms"
+            if c not in games.columns:
+                continue
+            v = games[c].to_numpy(dtype=np.float64)
+            # per-move mean over a matchup = Σ mean·turns / Σ turns
+            w = (games[f"{r}_turns"].to_numpy(dtype=np.float64)
+                 if mt.endswith("_mean") and f"{r}_turns" in games.columns else np.ones(len(games)))
+            parts.append(pd.DataFrame({"grid": games["grid"].to_numpy(),
+                                       "p1_ai": games["p1_ai"].astype(str).to_numpy(),
+                                       "p2_ai": games["p2_ai"].astype(str).to_numpy(),
+                                       "seat": r, "agent": games[f"{r}_ai"].astype(str).to_numpy(),
+                                       "metric": mt, "num": v * w, "den": w}))
+    return pd.concat(parts, ignore_index=True)
+
+
+def compare_latency(base, cand, metrics=DEFAULT_METRICS, B=DEFAULT_B, seed=DEFAULT_SEED, conf=0.95,
+                    threshold=LATENCY_THRESHOLD, floor_ms=LATENCY_FLOOR_MS):
+    keys = KEY + ["seat", "agent", "metric"]
+    lb, lc = _timing_long(base, metrics), _timing_long(cand, metrics)
+    # shared group codes: only groups present in both runs are compared
+    groups = (lb[keys].drop_duplicates().merge(lc[keys].drop_duplicates(), on=keys)
+                .sort_values(keys).reset_index(drop=True))
+    gid = pd.Series(np.arange(len(groups)), index=pd.MultiIndex.from_frame(groups))
+    rng = np.random.default_rng(seed)
+    est, reps = {}, {}
+    for name, long in (("base", lb), ("cand", lc)):
+        code = gid.reindex(pd.MultiIndex.from_frame(long[keys])).to_numpy()
+        keep = ~np.isnan(code)
+        long, code = long[keep], code[keep].astype(np.int64)
+        sums = pd.DataFrame({"num": long["num"].to_numpy(), "den": long["den"].to_numpy(), "g": code}).groupby("g").sum()
+        est[name] = (sums["num"] / sums["den"]).reindex(range(len(groups))).to_numpy()
+        reps[name] = grouped_ratio_bootstrap(long["num"].to_numpy(), long["den"].to_numpy(), code,
+                                             n_groups=len(groups), B=B, rng=rng)
+    out = groups.copy()
+    out["base_ms"], out["cand_ms"] = est["base"], est["cand"]
+    out["delta_ms"] = out["cand_ms"] - out["base_ms"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["rel_delta"] = np.where(out["base_ms"] > 0, out["delta_ms"] / out["base_ms"], np.nan)
+    out["ci_lo_ms"], out["ci_hi_ms"] = percentile_ci(reps["cand"] - reps["base"], conf)
+    out["regression"] = ((out["ci_lo_ms"] > 0) & (out["delta_ms"] > floor_ms)
+                         & ((out["rel_delta"] > threshold) | out["rel_delta"].isna()))
+    return out
+
+
+# ---------- main ----------
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare two benchmark runs; exit 1 on significant regressions.")
+    ap.add_argument("base", type=Path, help="run directory of the reference run")
+    ap.add_argument("cand", type=Path, help="run directory of the candidate run")
+    ap.add_argument("--agent", action="append", default=None,
+                    help="agent under test (repeatable); its win-rate drops count as regressions")
+    ap.add_argument("--alpha", type=float, default=ALPHA, help="significance level (Holm-adjusted)")
+    ap.add_argument("--win-threshold", type=float, default=WIN_THRESHOLD,
+                    help="minimum absolute win-rate drop that counts as a regression")
+    ap.add_argument("--metrics", nargs="+", default=list(DEFAULT_METRICS),
+                    help="timing metrics {ai,apply}_{mean,p50,p95} to compare")
+    ap.add_argument("--latency-threshold", type=float, default=LATENCY_THRESHOLD,
+                    help="minimum relative slow-down that counts as a regression")
+    ap.add_argument("--latency-floor", type=float, default=LATENCY_FLOOR_MS,
+                    help="ignore latency gaps below this many ms")
+    ap.add_argument("--boot", type=int, default=DEFAULT_B, help="bootstrap replicates")
+    ap.add_argument("--conf", type=float, default=0.95, help="bootstrap CI level")
+    ap.add_argument("--seed", type=int, default=DEFAULT_SEED, help="RNG seed")
+    ap.add_argument("--out", type=Path, default=DEFAULT_OUT, help="Output directory for the comparison CSVs")
+    args = ap.parse_args()
+
+    counts = {}
+    for name in ("base", "cand"):
+        d = getattr(args, name)
+        if not d.is_dir():
+            print(f"ERROR: run directory not found at: {d}"); sys.exit(1)
+        counts[name] = load_counts(d)
+        if counts[name] is None:
+            print(f"ERROR: no {DEFAULT_GAMES.name} or {DEFAULT_SUMMARY.name} in: {d}"); sys.exit(1)
+    args.out.mkdir(parents=True, exist_ok=True)
+
+    wins = compare_winrates(counts["base"], counts["cand"], agents=args.agent,
+                            alpha=args.alpha, threshold=args.win_threshold)
+    wins.to_csv(args.out / "compare_winrates.csv", index=False)
+    written = [args.out / "compare_winrates.csv"]
+    lat = None
+    tb, tc = load_timings(args.base, args.metrics), load_timings(args.cand, args.metrics)
+    if tb is None or tc is None:
+        print("Latency check skipped: both runs need a per-game CSV.")
+    else:
+        lat = compare_latency(tb, tc, metrics=args.metrics, B=args.boot, seed=args.seed, conf=args.conf,
+                              threshold=args.latency_threshold, floor_ms=args.latency_floor)
+        lat.to_csv(args.out / "compare_latency.csv", index=False)
+        written.append(args.out / "compare_latency.csv")
+    print("Wrote:" + "".join(f"\n - {p}" for p in written))
+
+    n_keys = {n: len(c) for n, c in counts.items()}
+    shared = len(wins) // len(ROLES)
+    if shared < max(n_keys.values()):
+        print(f"Note: {shared} matchups in both runs (base {n_keys['base']}, candidate {n_keys['cand']}).")
+    if not args.agent:
+        print("Win-rate deltas reported only (pass --agent to test an agent for regressions).")
+
+    regressions = []
+    for r in wins[wins["regression"]].itertuples(index=False):
+        regressions.append(f"win rate {r.grid}x{r.grid} {r.p1_ai} vs {r.p2_ai} ({r.seat}={r.agent}): "
+                           f"{r.rate_base:.3f} -> {r.rate_cand:.3f} (p_adj={r.p_adj:.2g})")
+    if lat is not None:
+        for r in lat[lat["regression"]].itertuples(index=False):
+            regressions.append(f"{r.metric} {r.grid}x{r.grid} {r.p1_ai} vs {r.p2_ai} ({r.seat}={r.agent}): "
+                               f"{r.base_ms:.3f} -> {r.cand_ms:.3f} ms "
+                               f"(+{r.delta_ms:.3f}, CI [{r.ci_lo_ms:.3f}, {r.ci_hi_ms:.3f}])")
+    if regressions:
+        print(f"REGRESSIONS ({len(regressions)}):")
+        for line in regressions: print(" -", line)
+        sys.exit(1)
+    print("No significant regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Load-once, typed view of one benchmark run (summary + per-game CSVs).
+
+Every analysis used to re-read both CSVs, re-cast the integer columns and
+rebuild the derived per-game columns (`winner` via build_winner_col in
+analyze_all.py, an inline np.where in validate_inputs.py, the unordered pair
+in game_length_by_grid). Dataset.load does that once; run_all.py hands the same
+frames to every analysis and figure plug-in.
+
+The derived per-game columns are winner, pair_A / pair_B and turns_total.
+There is no combined `pair` column: group on ['pair_A', 'pair_B'] (both
+categorical) for the unordered matchup.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from columnar_cache import read_games, read_summary
+from profiling import Profiler
+from streaming import encode_pairs
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_SUMMARY = HERE.parent / "benchmark2_summary.csv"
+DEFAULT_GAMES   = HERE.parent / "benchmark2_games.csv"
+DEFAULT_OUT     = HERE / "out"
+
+SUMMARY_INT_COLS = ['grid','games','p1_wins','p2_wins','ties']
+GAMES_INT_COLS   = ['grid','p1_score','p2_score','p1_turns','p2_turns','p1_longest_streak','p2_longest_streak']
+
+WINNER_LABELS = ['p1', 'p2', 'tie']
+
+
+def prepare_summary(summary: pd.DataFrame) -> pd.DataFrame:
+    for col in SUMMARY_INT_COLS:
+        if col in summary.columns:
+            summary[col] = summary[col].astype(int)
+    return summary
+
+
+def prepare_games(games: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast the integer columns and add the derived columns shared by the analyses:
+      winner      - 'p1' / 'p2' / 'tie' (categorical)
+      pair_A/_B   - the unordered matchup, alphabetically ordered
+      turns_total - p1_turns + p2_turns
+    Mutates and returns `games`.
+    """
+    for col in GAMES_INT_COLS:
+        if col in games.columns:
+            games[col] = games[col].astype(int)
+
+    diff = games['p1_score'].to_numpy() - games['p2_score'].to_numpy()
+    codes = np.where(diff > 0, 0, np.where(diff < 0, 1, 2))
+    games['winner'] = pd.Categorical.from_codes(codes, categories=WINNER_LABELS)
+
+    agents, a, b, _ = encode_pairs(games['p1_ai'].astype(str), games['p2_ai'].astype(str))
+    games['pair_A'] = pd.Categorical.from_codes(a, categories=agents)
+    games['pair_B'] = pd.Categorical.from_codes(b, categories=agents)
+
+    if {'p1_turns', 'p2_turns'}.issubset(games.columns):
+        games['turns_total'] = games['p1_turns'] + games['p2_turns']
+    return games
+
+
+class Dataset:
+    """Summary + per-game frames of one run, loaded and prepared once."""
+
+    def __init__(self, summary, games, summary_path=None, games_path=None):
+        self.summary = summary
+        self.games = games
+        self.summary_path = summary_path
+        self.games_path = games_path
+
+    @classmethod
+    def load(cls, summary_path=DEFAULT_SUMMARY, games_path=DEFAULT_GAMES, cache=False, prof=None):
+        prof = prof or Profiler()
+        with prof.stage("load"):
+            if cache:
+                summary, games = read_summary(summary_path), read_games(games_path)
+            else:
+                summary, games = pd.read_csv(summary_path), pd.read_csv(games_path)
+        with prof.stage("normalize"):
+            summary, games = prepare_summary(summary), prepare_games(games)
+        return cls(summary, games, summary_path=Path(summary_path), games_path=Path(games_path))
+
+    @property
+    def grids(self):
+        return sorted(self.games['grid'].unique().tolist())
+
+    @property
+    def agents(self):
+        return sorted(set(self.games['p1_ai']) | set(self.games['p2_ai']))
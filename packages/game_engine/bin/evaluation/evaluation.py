@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+One entry point for the evaluation scripts, with fast start-up.
+
+At start-up this file imports only the standard library. A subcommand imports
+its module (and with it pandas, matplotlib, ...) only when it runs, and then
+hands the remaining arguments to that module's main(). The argument parsers of
+the scripts that load pandas or matplotlib at import time live here (the
+scripts build theirs with these functions), so `--help` and usage errors are
+answered before any heavy import:
+
+  validate       validate_inputs.py  summary <-> per-game cross-checks
+  summarize      analyze_all.py      derived CSV tables
+  order-summary  analysis.py         p_{A->B}, s(A,B), Delta(A,B) tables
+  figures        make_figures.py     PNG figures
+  warehouse      warehouse.py        SQLite warehouse of many runs (ingest / runs / query)
+  serve          query_service.py    in-memory HTTP/JSON queries over the warehouse
+  startup        (here)              cold-start time of each subcommand
+
+The CSV paths default to the run next to this directory (../benchmark2_*.csv)
+rather than the scripts' own defaults. Anything passed explicitly wins.
+Matplotlib is forced onto the non-interactive Agg backend.
+
+`startup` times two things per subcommand in fresh interpreters, next to a
+bare `python -c pass`:
+  <subcommand> --help   answered by the parsers here, before the module import
+  <subcommand> import   evaluation plus the subcommand's module: what every
+                        real run pays before it does any work
+It prints the min/median of each, and with --importtime the heaviest
+top-level imports of each module import.
+
+Usage:
+  python evaluation.py validate --chunksize 500000
+  python evaluation.py summarize --out out
+  python evaluation.py order-summary --tie half --out order_summary.tex
+  python evaluation.py figures --jobs 4
+  python evaluation.py warehouse ingest --games ../benchmark2_games.csv --summary ../benchmark2_summary.csv --run baseline
+  python evaluation.py serve --port 8765
+  python evaluation.py startup --repeat 10 --importtime
+"""
+
+import argparse
+import importlib
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+SUMMARY = HERE.parent / "benchmark2_summary.csv"   # = dataset.DEFAULT_SUMMARY, without importing pandas
+GAMES = HERE.parent / "benchmark2_games.csv"
+OUT = HERE / "out"
+BOOTSTRAP_SEED = 0   # = bootstrap.DEFAULT_SEED, without importing numpy
+# the scripts' own defaults when run directly
+SCRIPT_SUMMARY = Path(r"D:\Project\dots_and_boxes_ws\packages\game_engine\bin\benchmark2_summary.csv")
+SCRIPT_GAMES = Path(r"D:\Project\dots_and_boxes_ws\packages\game_engine\bin\benchmark2_games.csv")
+SCRIPT_OUT = Path(r"D:\Project\dots_and_boxes_ws\packages\game_engine\bin\evaluation\out")
+
+# subcommand -> (module, default arguments, help)
+COMMANDS = {
+    "validate":      ("validate_inputs", ["--summary", SUMMARY, "--games", GAMES],
+                      "cross-check the summary CSV against the per-game CSV"),
+    "summarize":     ("analyze_all", ["--summary", SUMMARY, "--games", GAMES, "--out", OUT],
+                      "write the derived CSV tables (wins, unsafe, game length, streaks, metrics)"),
+    "order-summary": ("analysis", ["--csv", GAMES],
+                      "ordered win rates, s(A,B) and Delta(A,B) as LaTeX + CSV"),
+    "figures":       ("make_figures", ["--summary", SUMMARY, "--games", GAMES],
+                      "render the PNG figures (Agg backend)"),
+    "warehouse":     ("warehouse", [],
+                      "load runs into the SQLite warehouse and query its views"),
+    "serve":         ("query_service", [],
+                      "answer matchup / agent / grid queries over HTTP from memory"),
+}
+STARTUP_REPEAT = 5
+IMPORTTIME_TOP = 5
+
+
+# ---------- script parsers ----------
+
+def _read_mode(ap, chunksize_help="Stream the games CSV in chunks of N rows (bounded memory)",
+               cache_help="Read via the columnar cache (.eval_cache/ next to the CSVs; needs pyarrow)"):
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--chunksize", type=int, default=None, help=chunksize_help)
+    mode.add_argument("--cache", action="store_true", help=cache_help)
+
+
+def validate_parser():
+    """Arguments of validate_inputs.py."""
+    ap = argparse.ArgumentParser(description="Cross-check summary vs per-game CSVs (order-preserving)")
+    ap.add_argument("--summary", type=Path, default=SCRIPT_SUMMARY,
+                    help="Path to benchmark2_summary.csv")
+    ap.add_argument("--games", type=Path, default=SCRIPT_GAMES,
+                    help="Path to benchmark2_games.csv")
+    _read_mode(ap)
+    return ap
+
+
+def summarize_parser():
+    """Arguments of analyze_all.py."""
+    from profiling import add_profile_args   # standard library only
+    ap = argparse.ArgumentParser(description="Analyze Dots & Boxes benchmarks (summary + per-game).")
+    ap.add_argument("--summary", type=Path, default=SCRIPT_SUMMARY, help="Path to benchmark2_summary.csv")
+    ap.add_argument("--games",   type=Path, default=SCRIPT_GAMES,   help="Path to benchmark2_games.csv")
+    ap.add_argument("--out",     type=Path, default=SCRIPT_OUT,     help="Output directory for derived CSVs")
+    _read_mode(ap, chunksize_help="Stream the games CSV in chunks of N rows (bounded memory; "
+                                  "timing quantiles in agent_metrics.csv are t-digest estimates)")
+    add_profile_args(ap)
+    return ap
+
+
+def order_summary_parser():
+    """Arguments of analysis.py."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", required=True, help="per-game CSV path")
+    ap.add_argument("--out", default="order_summary.tex", help="LaTeX output path")
+    ap.add_argument("--tie", choices=["exclude","half"], default="exclude",
+                    help="tie handling in P1 win rate")
+    ap.add_argument("--engine", choices=["grouped","loop"], default="grouped",
+                    help="grouped: one groupby over all ordered matchups; "
+                         "loop: per-pair filtering (reference)")
+    _read_mode(ap, chunksize_help="stream the CSV in chunks of N rows (bounded memory)",
+               cache_help="read via the columnar cache (.eval_cache/ next to the CSV; needs pyarrow)")
+    ap.add_argument("--bootstrap", type=int, default=0, metavar="B",
+                    help="bootstrap replicates for CIs on s(A,B), Delta(A,B) and tie-half rates (0: off)")
+    ap.add_argument("--seed", type=int, default=BOOTSTRAP_SEED, help="bootstrap RNG seed")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="worker processes for the bootstrap slices (useful for very large B or many matchups)")
+    return ap
+
+
+def figures_parser():
+    """Arguments of make_figures.py."""
+    from profiling import add_profile_args   # standard library only
+    ap = argparse.ArgumentParser(description="Generate evaluation figures from summary & games CSVs.")
+    ap.add_argument("--summary", type=str, default=str(SCRIPT_SUMMARY), help="Path to benchmark2_summary.csv")
+    ap.add_argument("--games",   type=str, default=str(SCRIPT_GAMES),   help="Path to benchmark2_games.csv")
+    ap.add_argument("--out",     type=str, default=None,                help="Output folder for PNGs")
+    _read_mode(ap)
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="Render figures on N worker processes (Agg backend; serial with --profile)")
+    add_profile_args(ap)
+    return ap
+
+
+# module -> parser, for the scripts whose imports are heavy
+PARSERS = {
+    "validate_inputs": validate_parser,
+    "analyze_all":     summarize_parser,
+    "analysis":        order_summary_parser,
+    "make_figures":    figures_parser,
+}
+
+
+def run(command, argv):
+    """Import the subcommand's module and run its main() on defaults + argv (argv wins)."""
+    module, defaults, _ = COMMANDS[command]
+    sys.argv = [f"{Path(sys.argv[0]).name} {command}", *map(str, defaults), *argv]
+    if module in PARSERS:
+        PARSERS[module]().parse_args(sys.argv[1:])   # --help / usage errors exit here, before the import
+    return importlib.import_module(module).main()
+
+
+# ---------- startup benchmark ----------
+
+def _time_process(args, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, *args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True, cwd=HERE)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def top_imports(args, n=IMPORTTIME_TOP):
+    """[(module, cumulative seconds)] of the n heaviest top-level imports (python -X importtime)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, text=True, cwd=HERE)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "):   # depth 0 only
+            rows.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(rows, key=lambda r: -r[1])[:n]
+
+
+def startup(repeat=STARTUP_REPEAT, importtime=False, commands=None):
+    """Cold-start seconds per subcommand (--help and module import): [(label, min, median)], bare interpreter first."""
+    script = str(HERE / "evaluation.py")
+    cases = [("python -c pass", ["-c", "pass"], False), ("evaluation --help", [script, "--help"], False)]
+    for c in (commands or COMMANDS):
+        module = COMMANDS[c][0]
+        cases += [(f"{c} --help", [script, c, "--help"], False),
+                  (f"{c} import", ["-c", f"import evaluation, importlib; importlib.import_module({module!r})"], True)]
+    rows = []
+    for label, args, imports in cases:
+        t = _time_process(args, repeat)
+        rows.append((label, min(t), statistics.median(t)))
+        print(f"  {label:22s} min {min(t) * 1e3:7.1f} ms  median {statistics.median(t) * 1e3:7.1f} ms"
+              f"  (+{(min(t) - rows[0][1]) * 1e3:6.1f} ms over python)")
+        if importtime and imports:
+            for name, sec in top_imports(args):
+                print(f"      {name:28s} {sec * 1e3:7.1f} ms")
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        prog="evaluation.py",
+        description="Evaluation CLI; heavy libraries load only inside the subcommand that needs them.",
+        epilog="Arguments after the subcommand go to its script; see `evaluation.py <subcommand> --help`.")
+    sub = ap.add_subparsers(dest="command", metavar="<subcommand>")
+    for name, (module, _, help_) in COMMANDS.items():
+        sub.add_parser(name, help=f"{help_} ({module}.py)", add_help=False)
+    st = sub.add_parser("startup", help="cold-start time of each subcommand")
+    st.add_argument("--repeat", type=int, default=STARTUP_REPEAT, help="fresh interpreters per subcommand")
+    st.add_argument("--importtime", action="store_true", help="also list the heaviest top-level imports")
+    st.add_argument("--only", nargs="+", choices=list(COMMANDS), default=None, help="subcommands to time")
+
+    args, rest = ap.parse_known_args()
+    os.environ["MPLBACKEND"] = "Agg"   # before anything can import pyplot
+    if args.command is None:
+        ap.print_help(); sys.exit(1)
+    if args.command == "startup":
+        if rest:
+            ap.error(f"unrecognized arguments: {' '.join(rest)}")
+        if args.repeat < 1:
+            print("ERROR: --repeat must be at least 1"); sys.exit(1)
+        print(f"Cold start ({args.repeat} runs each; `--help`, then the module import a run pays):")
+        startup(args.repeat, args.importtime, args.only)
+        return
+    run(args.command, rest)
+
+
+if __name__ == "__main__":
+    main()
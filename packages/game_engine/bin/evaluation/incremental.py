@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Incremental, append-only analysis of the per-game CSV.
+
+New batches of games are appended to benchmark2_games.csv between runs. Instead
+of re-reading the whole file, this script keeps the per-(grid, p1_ai, p2_ai)
+GamesAccumulator state (counts, wins, ties, sums, sums of squares, value
+histograms) plus a t-digest per matchup and timing column in a state directory
+next to the outputs:
+
+    <out>/.incremental/manifest.json    source, header, byte-offset watermark
+    <out>/.incremental/accumulator.json accumulator frames + max game_idx per matchup
+    <out>/.incremental/sketches.json    TDigest centroids per matchup & timing column
+
+The frames are stored column by column as JSON lists with their dtype (floats
+round-trip exactly), not pickled, so the state survives pandas upgrades and
+changes to the accumulator class. Both JSON files carry STATE_FORMAT; a state
+of another format is discarded and rebuilt from the CSV.
+
+Each run ingests only the rows past the watermark, merges them into the state
+and refreshes the outputs from the merged state:
+wins_unordered.csv, game_length_by_grid.csv, longest_streak_by_agent.csv,
+unsafe_by_agent_summary_vs_games.csv (with --summary), order_summary.tex /
+order_summary_metrics.csv and timing_quantiles.csv.
+
+Watermarks:
+  offset   - byte offset just past the last complete line ingested (default).
+             A trailing partial line is left for the next run. If the file shrank
+             or its first bytes changed it was rewritten, and the state is rebuilt.
+  game_idx - rescan the file but ingest only rows whose game_idx is above the
+             stored maximum for their matchup (for runners that rewrite the file).
+
+Usage:
+  python incremental.py --games ../benchmark2_games.csv --summary ../benchmark2_summary.csv --out out
+  python incremental.py --games ../benchmark2_games.csv --out out --rebuild
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import analysis
+import analyze_all
+from dataset import DEFAULT_GAMES, DEFAULT_OUT
+from sketches import SKETCH_QUANTILES, SketchSet
+from streaming import (DEFAULT_CHUNKSIZE, GAMES_DTYPES, KEY, ROLES, TIMING_METRICS,
+                       GamesAccumulator, detect_unsafe_suffix, iter_games, read_header)
+
+STATE_DIRNAME = ".incremental"
+STATE_FORMAT = 2   # 1: pickled accumulator frames
+HEAD_BYTES = 1 << 16   # prefix hashed to detect a rewritten (not appended) file
+# timings stay float64 here: the sketches keep values, not just float sums
+INGEST_DTYPES = dict(GAMES_DTYPES, **{f"{r}_{t}_ms": "float64" for r in ROLES for t in TIMING_METRICS})
+
+
+# ---------- byte ranges ----------
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of bytes [start, end) of an open binary file."""
+
+    def __init__(self, f, start, end):
+        f.seek(start)
+        self.f = f
+        self.left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), self.left)
+        if n <= 0:
+            return 0
+        data = self.f.read(n)
+        b[:len(data)] = data
+        self.left -= len(data)
+        return len(data)
+
+
+def _complete_end(path):
+    """Offset just past the last newline (a line still being written is skipped)."""
+    size = Path(path).stat().st_size
+    with open(path, "rb") as f:
+        pos = size
+        while pos > 0:
+            step = min(1 << 16, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            i = block.rfind(b"\n")
+            if i >= 0:
+                return pos - step + i + 1
+            pos -= step
+    return 0
+
+
+def _head_sha1(path, upto):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(min(upto, HEAD_BYTES))).hexdigest()
+
+
+def _header_end(path):
+    with open(path, "rb") as f:
+        return len(f.readline())
+
+
+# ---------- state ----------
+
+def _frame_to_json(obj):
+    """Columnar JSON record of an indexed DataFrame or Series (None stays None)."""
+    if obj is None:
+        return None
+    df = obj.reset_index()
+    return {"index": list(obj.index.names), "series": obj.name if isinstance(obj, pd.Series) else None,
+            "columns": {c: {"dtype": str(df[c].dtype), "values": df[c].tolist()} for c in df.columns}}
+
+
+def _frame_from_json(d):
+    if d is None:
+        return None
+    df = pd.DataFrame({c: pd.Series(col["values"], dtype=col["dtype"]) for c, col in d["columns"].items()})
+    df = df.set_index(d["index"])
+    return df if d["series"] is None else df[d["series"]]
+
+
+class IncrementalState:
+    """Accumulator + per-matchup timing sketches + watermark of one games CSV."""
+
+    def __init__(self, source, header, unsafe_suffix):
+        self.manifest = {"format": STATE_FORMAT, "source": str(Path(source).resolve()),
+                         "header": header, "offset": _header_end(source), "head_sha1": None,
+                         "rows": 0}
+        self.acc = GamesAccumulator(unsafe_suffix=unsafe_suffix, sketches=True)
+        self.idx_max = None   # Series indexed by KEY: highest game_idx ingested
+
+    @classmethod
+    def load(cls, state_dir):
+        state_dir = Path(state_dir)
+        try:
+            manifest = json.loads((state_dir / "manifest.json").read_text())
+            saved = json.loads((state_dir / "accumulator.json").read_text())
+            if manifest.get("format") != STATE_FORMAT or saved.get("format") != STATE_FORMAT:
+                return None
+            frames = {k: _frame_from_json(d) for k, d in saved["frames"].items()}
+            sketches = SketchSet.load(state_dir / "sketches.json")
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        st = cls.__new__(cls)
+        st.manifest = manifest
+        st.acc = GamesAccumulator(unsafe_suffix=saved["unsafe_suffix"])
+        st.acc.state, st.acc.extrema, st.acc.hist = frames["state"], frames["extrema"], frames["hist"]
+        st.acc.sketches = sketches
+        st.idx_max = frames["idx_max"]
+        return st
+
+    def save(self, state_dir):
+        """Write atomically: a fresh directory is swapped in with os.replace."""
+        state_dir = Path(state_dir)
+        tmp = state_dir.with_name(state_dir.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        frames = {"state": self.acc.state, "extrema": self.acc.extrema, "hist": self.acc.hist,
+                  "idx_max": self.idx_max}
+        (tmp / "accumulator.json").write_text(json.dumps(
+            {"format": STATE_FORMAT, "unsafe_suffix": self.acc.unsafe_suffix,
+             "frames": {k: _frame_to_json(v) for k, v in frames.items()}}))
+        self.acc.sketches.save(tmp / "sketches.json")
+        (tmp / "manifest.json").write_text(json.dumps(self.manifest, indent=2))
+        shutil.rmtree(state_dir, ignore_errors=True)
+        os.replace(tmp, state_dir)
+
+    def ingest(self, chunk):
+        """Fold a chunk of new per-game rows into accumulator, sketches and game_idx marks."""
+        if chunk.empty:
+            return
+        self.acc.update(chunk)
+        if "game_idx" in chunk.columns:
+            m = (chunk.assign(grid=chunk["grid"].astype(np.int64),
+                              p1_ai=chunk["p1_ai"].astype(str), p2_ai=chunk["p2_ai"].astype(str))
+                      .groupby(KEY)["game_idx"].max().astype(np.int64))
+            self.idx_max = m if self.idx_max is None else m.combine(self.idx_max, max, fill_value=-1)
+        self.manifest["rows"] += len(chunk)
+
+
+# ---------- ingest ----------
+
+def ingest_by_offset(st, path, chunksize=DEFAULT_CHUNKSIZE):
+    """Ingest complete lines past the stored offset. Returns the number of rows read."""
+    start, end = st.manifest["offset"], _complete_end(path)
+    rows = 0
+    if end > start:
+        with open(path, "rb") as f:
+            reader = io.BufferedReader(_ByteRange(f, start, end))
+            for chunk in pd.read_csv(reader, header=None, names=st.manifest["header"],
+                                     dtype=INGEST_DTYPES, chunksize=chunksize):
+                st.ingest(chunk)
+                rows += len(chunk)
+        st.manifest["offset"] = end
+    st.manifest["head_sha1"] = _head_sha1(path, st.manifest["offset"])
+    return rows
+
+
+def ingest_by_game_idx(st, path, chunksize=DEFAULT_CHUNKSIZE):
+    """Rescan the file, ingesting rows whose game_idx is past their matchup's mark."""
+    rows = 0
+    marks = st.idx_max
+    for chunk in iter_games(path, chunksize=chunksize, dtype=INGEST_DTYPES):
+        if marks is not None:
+            keys = pd.MultiIndex.from_arrays([chunk["grid"].astype(np.int64).to_numpy(),
+                                              chunk["p1_ai"].astype(str).to_numpy(),
+                                              chunk["p2_ai"].astype(str).to_numpy()])
+            seen = marks.reindex(keys).fillna(-1).to_numpy()
+            chunk = chunk[chunk["game_idx"].to_numpy() > seen]
+        st.ingest(chunk)
+        rows += len(chunk)
+    st.manifest["offset"] = _complete_end(path)
+    st.manifest["head_sha1"] = _head_sha1(path, st.manifest["offset"])
+    return rows
+
+
+def is_append_of(st, path, header):
+    """True when `path` still starts with what the state has ingested."""
+    m = st.manifest
+    return (m["source"] == str(Path(path).resolve()) and m["header"] == header
+            and Path(path).stat().st_size >= m["offset"]
+            and m["head_sha1"] == _head_sha1(path, m["offset"]))
+
+
+# ---------- outputs ----------
+
+def timing_quantiles(st, qs=SKETCH_QUANTILES):
+    return st.acc.sketches.quantile_table("matchup", qs)
+
+
+def refresh_outputs(st, out_dir, summary=None, tie="exclude"):
+    """Rewrite the derived tables from the merged state. Returns the written paths."""
+    acc = st.acc
+    o = acc.ordered()
+    written = []
+
+    def write(df, name):
+        df.to_csv(out_dir / name, index=False)
+        written.append(out_dir / name)
+
+    write(analyze_all.wins_unordered(o.rename(columns={"n": "games"})), "wins_unordered.csv")
+    write(acc.game_length_by_grid(), "game_length_by_grid.csv")
+    write(acc.streaks_by_agent(), "longest_streak_by_agent.csv")
+    if summary is not None:
+        both = (pd.merge(analyze_all.unsafe_by_agent_summary(summary), acc.unsafe_by_agent_games(),
+                         on=['grid','agent'], how='outer')
+                  .sort_values(['grid','agent']).reset_index(drop=True))
+        write(both, "unsafe_by_agent_summary_vs_games.csv")
+
+    counts = pd.DataFrame({
+        "GRID": o["grid"].map(analysis.norm_grid), "P1A": o["p1_ai"], "P2A": o["p2_ai"],
+        "p1_wins": o["p1_wins"], "ties": o["ties"], "losses": o["p2_wins"],
+    }).set_index(["GRID", "P1A", "P2A"])
+    keys = counts.index.to_frame(index=False)
+    agents = sorted(set(keys["P1A"]).union(set(keys["P2A"])))
+    grids  = sorted(keys["GRID"].unique())
+    tex = out_dir / "order_summary.tex"
+    metrics = analysis.write_order_summary(analysis.order_summary_from_counts(counts, grids, agents, tie),
+                                           grids, tex)
+    written += [tex, Path(metrics)]
+    write(timing_quantiles(st), "timing_quantiles.csv")
+    return written
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Incrementally update the analyses with newly appended games.")
+    ap.add_argument("--games",   type=Path, default=DEFAULT_GAMES,   help="Path to benchmark2_games.csv")
+    ap.add_argument("--summary", type=Path, default=None,
+                    help="Path to benchmark2_summary.csv (adds the summary-vs-games unsafe table)")
+    ap.add_argument("--out",     type=Path, default=DEFAULT_OUT,     help="Output directory")
+    ap.add_argument("--state",   type=Path, default=None,
+                    help=f"State directory (default: <out>/{STATE_DIRNAME})")
+    ap.add_argument("--watermark", choices=["offset", "game_idx"], default="offset",
+                    help="offset: ingest bytes past the last run; game_idx: rescan, keep rows "
+                         "above each matchup's highest ingested game_idx")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows per ingest chunk")
+    ap.add_argument("--tie", choices=["exclude","half"], default="exclude",
+                    help="tie handling for order_summary")
+    ap.add_argument("--rebuild", action="store_true", help="discard the stored state and start over")
+    args = ap.parse_args()
+
+    if not args.games.exists():
+        print(f"ERROR: games CSV not found at: {args.games}"); sys.exit(1)
+    if args.summary is not None and not args.summary.exists():
+        print(f"ERROR: summary CSV not found at: {args.summary}"); sys.exit(1)
+    args.out.mkdir(parents=True, exist_ok=True)
+    state_dir = args.state or args.out / STATE_DIRNAME
+
+    header = read_header(args.games)
+    try:
+        suffix = detect_unsafe_suffix(header)
+    except KeyError as e:
+        print(f"ERROR: {e.args[0]}"); sys.exit(1)
+    if args.watermark == "game_idx" and "game_idx" not in header:
+        print("ERROR: --watermark game_idx needs a game_idx column"); sys.exit(1)
+
+    st = None if args.rebuild else IncrementalState.load(state_dir)
+    if st is not None and args.watermark == "offset" and not is_append_of(st, args.games, header):
+        print("Games CSV was rewritten since the last run (not an append); rebuilding state.")
+        st = None
+    if st is None:
+        st = IncrementalState(args.games, header, suffix)
+
+    before = st.manifest["offset"]
+    ingest = ingest_by_offset if args.watermark == "offset" else ingest_by_game_idx
+    rows = ingest(st, args.games, chunksize=args.chunksize)
+    st.save(state_dir)
+    print(f"Ingested {rows} new rows (bytes {before}..{st.manifest['offset']}); "
+          f"state holds {st.manifest['rows']} games in {len(st.acc.ordered())} matchups")
+
+    summary = None
+    if args.summary is not None:
+        summary = pd.read_csv(args.summary)
+        for col in ['grid','games','p1_wins','p2_wins','ties']:
+            if col in summary.columns:
+                summary[col] = summary[col].astype(int)
+    written = refresh_outputs(st, args.out, summary=summary, tie=args.tie)
+    print("Wrote:" + "".join(f"\n - {p}" for p in written))
+
+
+if __name__ == "__main__":
+    main()
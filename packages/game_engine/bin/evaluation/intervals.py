@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Wilson score intervals for win rates.
+
+Kept apart from analysis.py (which imports pandas) so that light consumers,
+such as query_service.py, load only numpy.
+"""
+
+import numpy as np
+
+
+def wilson_ci(k, n, z=1.96):
+    """Wilson 95% CI (default z≈1.96). Returns (lo, hi)."""
+    if n == 0:
+        return (np.nan, np.nan)
+    phat = k / n
+    denom = 1 + (z*z)/n
+    center = (phat + (z*z)/(2*n)) / denom
+    half = z * np.sqrt((phat*(1-phat) + (z*z)/(4*n)) / n) / denom
+    return (max(0.0, center - half), min(1.0, center + half))
+
+def wilson_ci_arrays(k, n, z=1.96):
+    """Vectorised wilson_ci over count arrays. Returns raw (lo, hi) before clamping;
+    entries with n == 0 are NaN."""
+    k = np.asarray(k)
+    n = np.asarray(n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        phat = k / n
+        denom = 1 + (z*z)/n
+        center = (phat + (z*z)/(2*n)) / denom
+        half = z * np.sqrt((phat*(1-phat) + (z*z)/(4*n)) / n) / denom
+    lo = np.where(n > 0, center - half, np.nan)
+    hi = np.where(n > 0, center + half, np.nan)
+    return lo, hi
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Latency analytics for the per-move timing columns (p{1,2}_{ai,apply}_{mean,p50,p95}_ms).
+
+Writes next to the other evaluation outputs:
+  out/latency_by_agent.csv    per grid, agent and role (p1 / p2 / both): games, moves,
+                              per-move mean (turn-weighted), median per-game p50/p95
+                              and the 95th percentile of per-game p95
+  out/latency_scaling.csv     per agent and metric: power-law fit t = c·E^k against the
+                              edge count E = 2·n·(n+1), R² and extrapolated 8×8 / 10×10
+  out/latency_drift.csv       per ordered pairing and role: summary-level (pooled) p95
+                              vs the per-game p95 distribution, flagged when they disagree
+  figs/latency_heatmap_<metric>.png   agent × grid heatmap (log colour scale)
+  figs/latency_scaling_<metric>.png   measured points, fitted curves and extrapolation
+
+The runner records times at 0.001 ms resolution, so values below
+MIN_FIT_MS (Random's move picks, most apply times) are left out of the fits.
+
+Usage:
+  python latency.py --summary ../benchmark2_summary.csv --games ../benchmark2_games.csv
+  python latency.py --metric ai_mean --extrapolate 8 10 12
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+
+from dataset import DEFAULT_GAMES, DEFAULT_OUT, DEFAULT_SUMMARY, Dataset
+from streaming import KEY, ROLES
+
+KINDS = ("ai", "apply")
+MIN_FIT_MS = 0.01           # 10× the CSV resolution
+DEFAULT_TARGETS = (8, 10)   # grid sizes to extrapolate to
+DRIFT_TOL = 0.25            # relative gap between pooled and median per-game p95
+DRIFT_FLOOR_MS = 0.05       # ...ignored below this absolute gap
+
+
+def edge_count(n):
+    """Edges on an n×n box grid: (n+1)·n horizontal + n·(n+1) vertical."""
+    return 2 * np.asarray(n) * (np.asarray(n) + 1)
+
+
+def timing_columns(columns):
+    return [f"{r}_{k}_{s}_ms" for r in ROLES for k in KINDS for s in ("mean", "p50", "p95")
+            if f"{r}_{k}_{s}_ms" in columns]
+
+
+# ---------- aggregation ----------
+
+def role_long(games: pd.DataFrame) -> pd.DataFrame:
+    """One row per (game, role): grid, agent, role, turns, {ai,apply}_{mean,p50,p95}_ms."""
+    parts = []
+    for r in ROLES:
+        cols = {"grid": games["grid"].to_numpy(),
+                "agent": games[f"{r}_ai"].astype(str).to_numpy(),
+                "role": r,
+                "turns": games[f"{r}_turns"].to_numpy()}
+        for k in KINDS:
+            for s in ("mean", "p50", "p95"):
+                c = f"{r}_{k}_{s}_ms"
+                if c in games.columns:
+                    cols[f"{k}_{s}_ms"] = games[c].to_numpy(dtype=float)
+        parts.append(pd.DataFrame(cols))
+    return pd.concat(parts, ignore_index=True)
+
+
+def latency_by_agent(games: pd.DataFrame) -> pd.DataFrame:
+    long = role_long(games)
+    long = pd.concat([long, long.assign(role="both")], ignore_index=True)
+    for k in KINDS:
+        if f"{k}_mean_ms" in long.columns:
+            long[f"{k}_mean_w"] = long[f"{k}_mean_ms"] * long["turns"]
+    g = long.groupby(["grid", "agent", "role"], sort=True)
+    out = g.agg(games=("turns", "size"), moves=("turns", "sum"))
+    for k in KINDS:
+        if f"{k}_mean_ms" not in long.columns:
+            continue
+        out[f"{k}_mean_ms"] = g[f"{k}_mean_w"].sum() / out["moves"]   # per-move mean
+        out[f"{k}_p50_ms"] = g[f"{k}_p50_ms"].median()
+        out[f"{k}_p95_ms"] = g[f"{k}_p95_ms"].median()
+        out[f"{k}_p95_ms_q95"] = g[f"{k}_p95_ms"].quantile(0.95)
+    return out.reset_index()
+
+
+def fit_scaling(lat: pd.DataFrame, metrics=("ai_p95", "ai_mean"), targets=DEFAULT_TARGETS) -> pd.DataFrame:
+    """
+    Least-squares fit of log t = log c + k·log E per agent (role 'both') for each
+    metric, with predictions at the `targets` grid sizes.
+    """
+    both = lat[lat["role"] == "both"]
+    rows = []
+    for metric in metrics:
+        col = f"{metric}_ms"
+        if col not in both.columns:
+            continue
+        for agent, sub in both.groupby("agent", sort=True):
+            x = edge_count(sub["grid"].to_numpy()).astype(float)
+            y = sub[col].to_numpy(dtype=float)
+            ok = np.isfinite(y) & (y >= MIN_FIT_MS)
+            row = {"agent": agent, "metric": metric, "points": int(ok.sum()),
+                   "grids": " ".join(str(g) for g in sub["grid"].to_numpy()[ok]),
+                   "exponent": np.nan, "coef": np.nan, "r2": np.nan}
+            if ok.sum() >= 2:
+                lx, ly = np.log(x[ok]), np.log(y[ok])
+                k, logc = np.polyfit(lx, ly, 1)
+                resid = ly - (logc + k * lx)
+                ss = ((ly - ly.mean()) ** 2).sum()
+                row.update(exponent=k, coef=np.exp(logc), r2=1 - (resid ** 2).sum() / ss if ss > 0 else np.nan)
+            for n in targets:
+                row[f"pred_{n}x{n}_ms"] = row["coef"] * float(edge_count(n)) ** row["exponent"]
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def p95_drift(summary: pd.DataFrame, games: pd.DataFrame, tol=DRIFT_TOL, floor_ms=DRIFT_FLOOR_MS) -> pd.DataFrame:
+    """
+    Compare each summary row's pooled p95 (all moves of the pairing) with the
+    per-game p95 values of the same pairing and role. A pooled quantile must lie
+    within the per-game range; beyond that, a relative gap above `tol` to the
+    median per-game p95 (and an absolute gap above `floor_ms`) is flagged.
+    """
+    gk = games.assign(grid=games["grid"].astype(int), p1_ai=games["p1_ai"].astype(str),
+                      p2_ai=games["p2_ai"].astype(str))
+    sk = summary.assign(grid=summary["grid"].astype(int), p1_ai=summary["p1_ai"].astype(str),
+                        p2_ai=summary["p2_ai"].astype(str))
+    parts = []
+    for r in ROLES:
+        for k in KINDS:
+            c = f"{r}_{k}_p95_ms"
+            if c not in gk.columns or c not in sk.columns:
+                continue
+            per_game = (gk.groupby(KEY)[c].agg(["median", "min", "max", "size"])
+                          .rename(columns={"median": "games_p95_median", "min": "games_p95_min",
+                                           "max": "games_p95_max", "size": "games"}))
+            m = sk[KEY + [c]].rename(columns={c: "summary_p95"}).merge(per_game.reset_index(), on=KEY, how="left")
+            m.insert(3, "role", r)
+            m.insert(4, "kind", k)
+            parts.append(m)
+    if not parts:
+        return pd.DataFrame()
+    d = pd.concat(parts, ignore_index=True)
+    gap = d["summary_p95"] - d["games_p95_median"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d["drift"] = np.where(d["games_p95_median"] > 0, gap / d["games_p95_median"], np.nan)
+    outside = (d["summary_p95"] < d["games_p95_min"]) | (d["summary_p95"] > d["games_p95_max"])
+    d["flag"] = outside | ((gap.abs() > floor_ms) & (d["drift"].abs() > tol))
+    return d.sort_values(KEY + ["role", "kind"], kind="stable").reset_index(drop=True)
+
+
+# ---------- figures ----------
+
+def plot_latency_heatmap(lat: pd.DataFrame, metric: str, out_dir: Path):
+    both = lat[lat["role"] == "both"]
+    mat = both.pivot(index="agent", columns="grid", values=f"{metric}_ms").sort_index()
+    vals = mat.to_numpy(dtype=float)
+    pos = vals[np.isfinite(vals) & (vals > 0)]
+
+    fig, ax = plt.subplots(figsize=(8, 5), dpi=300)
+    norm = LogNorm(vmin=pos.min(), vmax=pos.max()) if pos.size else None
+    im = ax.imshow(np.where(vals > 0, vals, np.nan), cmap="magma", norm=norm, aspect="auto")
+    ax.set_xticks(range(len(mat.columns)), labels=[f"{g}×{g}" for g in mat.columns])
+    ax.set_yticks(range(len(mat.index)), labels=mat.index.tolist())
+    ax.set_title(f"Per-move {metric.replace('_', ' ')} (ms) by agent and grid")
+    for i, j in zip(*np.nonzero(np.isfinite(vals))):
+        ax.text(j, i, f"{vals[i, j]:.3g}", ha="center", va="center", color="cyan", fontsize=9)
+    cbar = fig.colorbar(im, ax=ax)
+    cbar.set_label(f"{metric} (ms, log scale)")
+    fig.tight_layout()
+    fig.savefig(out_dir / f"latency_heatmap_{metric}.png")
+    plt.close(fig)
+
+
+def plot_latency_scaling(lat: pd.DataFrame, fits: pd.DataFrame, metric: str, out_dir: Path,
+                         targets=DEFAULT_TARGETS):
+    """
+    Measured points (≥ MIN_FIT_MS) and fitted curves on log–log axes. When no
+    point reaches MIN_FIT_MS (e.g. the apply times) the axis is left empty,
+    linear and annotated. Returns whether any point was drawn.
+    """
+    both = lat[lat["role"] == "both"]
+    grids = sorted(set(both["grid"].tolist()) | set(targets))
+    xs = np.linspace(edge_count(min(grids)), edge_count(max(grids)), 100)
+
+    fig, ax = plt.subplots(figsize=(8, 5), dpi=300)
+    drawn = False
+    for agent, sub in both.groupby("agent", sort=True):
+        y = sub[f"{metric}_ms"].to_numpy(dtype=float)
+        keep = y >= MIN_FIT_MS
+        if not keep.any():
+            continue
+        drawn = True
+        pts = ax.plot(edge_count(sub["grid"].to_numpy())[keep], y[keep], "o", label=agent)
+        f = fits[(fits["agent"] == agent) & (fits["metric"] == metric)]
+        if len(f) and np.isfinite(f["exponent"].iloc[0]):
+            k, c = f["exponent"].iloc[0], f["coef"].iloc[0]
+            ax.plot(xs, c * xs ** k, "--", color=pts[0].get_color(), lw=1,
+                    label=f"{agent} fit: E^{k:.2f}")
+    ax.set_xscale("log")
+    if drawn:
+        ax.set_yscale("log")
+        ax.legend(frameon=False, fontsize=8)
+    else:
+        ax.set_yticks([])
+        ax.text(0.5, 0.5, f"no {metric} value ≥ {MIN_FIT_MS} ms\n(below the timer resolution; no fit)",
+                transform=ax.transAxes, ha="center", va="center")
+    ax.set_xticks(edge_count(grids), labels=[f"{g}×{g}\n(E={edge_count(g)})" for g in grids])
+    ax.minorticks_off()
+    ax.set_ylabel(f"{metric} per move (ms)")
+    ax.set_title(f"Cost scaling of {metric.replace('_', ' ')} with edge count")
+    fig.tight_layout()
+    fig.savefig(out_dir / f"latency_scaling_{metric}.png")
+    plt.close(fig)
+    return drawn
+
+
+# ---------- main ----------
+
+def main():
+    ap = argparse.ArgumentParser(description="Latency analytics from the per-move timing columns.")
+    ap.add_argument("--summary", type=Path, default=DEFAULT_SUMMARY, help="Path to benchmark2_summary.csv")
+    ap.add_argument("--games",   type=Path, default=DEFAULT_GAMES,   help="Path to benchmark2_games.csv")
+    ap.add_argument("--out",     type=Path, default=DEFAULT_OUT,     help="Output directory for CSVs")
+    ap.add_argument("--figs",    type=Path, default=None,
+                    help="Output directory for PNGs (default: <games dir>/figs_eval2)")
+    ap.add_argument("--metric", default="ai_p95",
+                    help="metric for the figures: {ai,apply}_{mean,p50,p95}")
+    ap.add_argument("--extrapolate", type=int, nargs="+", default=list(DEFAULT_TARGETS),
+                    help="grid sizes to extrapolate the scaling fits to")
+    ap.add_argument("--drift-tol", type=float, default=DRIFT_TOL,
+                    help="relative pooled-vs-per-game p95 gap that flags a pairing")
+    ap.add_argument("--cache", action="store_true",
+                    help="Read via the columnar cache (.eval_cache/ next to the CSVs; needs pyarrow)")
+    args = ap.parse_args()
+
+    if not args.summary.exists():
+        print(f"ERROR: summary CSV not found at: {args.summary}"); sys.exit(1)
+    if not args.games.exists():
+        print(f"ERROR: games CSV not found at: {args.games}"); sys.exit(1)
+    args.out.mkdir(parents=True, exist_ok=True)
+    fig_dir = args.figs or args.games.parent / "figs_eval2"
+    fig_dir.mkdir(parents=True, exist_ok=True)
+
+    data = Dataset.load(args.summary, args.games, cache=args.cache)
+    if not timing_columns(data.games.columns):
+        print("ERROR: per-game CSV has no timing columns (p1_ai_mean_ms, ...)"); sys.exit(1)
+
+    lat = latency_by_agent(data.games)
+    if f"{args.metric}_ms" not in lat.columns:
+        print(f"ERROR: unknown metric {args.metric!r}"); sys.exit(1)
+    metrics = list(dict.fromkeys([args.metric, "ai_p95", "ai_mean"]))
+    fits = fit_scaling(lat, metrics=metrics, targets=args.extrapolate)
+    drift = p95_drift(data.summary, data.games, tol=args.drift_tol)
+
+    lat.to_csv(args.out / "latency_by_agent.csv", index=False)
+    fits.to_csv(args.out / "latency_scaling.csv", index=False)
+    drift.to_csv(args.out / "latency_drift.csv", index=False)
+    plot_latency_heatmap(lat, args.metric, fig_dir)
+    plot_latency_scaling(lat, fits, args.metric, fig_dir, targets=args.extrapolate)
+
+    print(f"Wrote:\n - {args.out / 'latency_by_agent.csv'}"
+          f"\n - {args.out / 'latency_scaling.csv'}"
+          f"\n - {args.out / 'latency_drift.csv'}"
+          f"\n - {fig_dir / f'latency_heatmap_{args.metric}.png'}"
+          f"\n - {fig_dir / f'latency_scaling_{args.metric}.png'}")
+    f = fits[fits["metric"] == args.metric]
+    for r in f.itertuples(index=False):
+        if not np.isfinite(r.exponent):
+            print(f"  {r.agent:12s} {args.metric}: fewer than 2 grids above {MIN_FIT_MS} ms, no fit")
+            continue
+        preds = "  ".join(f"{n}x{n}≈{getattr(r, f'pred_{n}x{n}_ms'):.3g}ms" for n in args.extrapolate)
+        print(f"  {r.agent:12s} {args.metric} ~ E^{r.exponent:.2f} (R²={r.r2:.3f})  {preds}")
+    flagged = drift[drift["flag"]] if len(drift) else drift
+    print(f"p95 drift: {len(flagged)} of {len(drift)} pairing/role/kind rows flagged (see latency_drift.csv)")
+
+
+if __name__ == "__main__":
+    main()
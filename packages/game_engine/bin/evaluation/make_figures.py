@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
-import argparse
+from streaming import GamesAccumulator, hist_boxplot_stats
+from columnar_cache import read_games, read_summary
+from analyze_all import role_stats, stack_roles
+from profiling import Profiler
+from evaluation import figures_parser
 
 # ---------- helpers ----------
 
@@ -25,14 +30,56 @@ def p1_winrate_from_games(games: pd.DataFrame) -> pd.DataFrame:
 
 def collect_agent_series(df_games: pd.DataFrame, grid: int, col_p1: str, col_p2: str):
     """Return a dict[agent] -> 1D values combined from p1 and p2 columns for a given grid."""
-    g = df_games[df_games["grid"] == grid]
-    agents = sorted(set(g["p1_ai"]) | set(g["p2_ai"]))
-    out = {}
-    for a in agents:
-        s1 = g.loc[g["p1_ai"] == a, col_p1]
-        s2 = g.loc[g["p2_ai"] == a, col_p2]
-        out[a] = pd.concat([s1, s2], ignore_index=True)
-    return out
+    long = stack_roles(df_games[df_games["grid"] == grid], col_p1, col_p2)
+    # groupby keeps row order within a group: the p1 values, then the p2 values
+    return {a: v.reset_index(drop=True) for a, v in long.groupby("agent")["value"]}
+
+class WinrateTensor:
+    """
+    P1 win rates as a dense (grid × p1 agent × p2 agent) array, NaN where a matchup
+    was not played, with index maps for grids and agents. Built once from the long
+    winrates table; plots read cells, rows and slices instead of filtering the frame.
+    """
+
+    def __init__(self, grids, agents, values):
+        self.grids = np.asarray(grids)
+        self.agents = np.asarray(agents, dtype=object)
+        self.values = values
+        self.grid_index = {g: i for i, g in enumerate(self.grids.tolist())}
+        self.agent_index = {a: i for i, a in enumerate(self.agents.tolist())}
+
+    @classmethod
+    def from_frame(cls, winrates: pd.DataFrame):
+        grids, gi = np.unique(winrates["grid"].to_numpy(), return_inverse=True)
+        p1 = winrates["p1_ai"].astype(str).to_numpy(dtype=object)
+        p2 = winrates["p2_ai"].astype(str).to_numpy(dtype=object)
+        agents, ai = np.unique(np.concatenate([p1, p2]), return_inverse=True)
+        values = np.full((len(grids), len(agents), len(agents)), np.nan)
+        values[gi, ai[:len(p1)], ai[len(p1):]] = winrates["p1_winrate_pct"].to_numpy(dtype=float)
+        return cls(grids, agents, values)
+
+    @classmethod
+    def of(cls, winrates):
+        return winrates if isinstance(winrates, cls) else cls.from_frame(winrates)
+
+    def subset(self, grids):
+        """Tensor restricted to `grids` (e.g. the one slice a heatmap worker needs)."""
+        idx = [self.grid_index[g] for g in grids]
+        return WinrateTensor(self.grids[idx], self.agents, self.values[idx])
+
+    def matrix(self, grid):
+        """(p1 agents, p2 agents, matrix) for one grid, trimmed to agents that played there."""
+        m = self.values[self.grid_index[grid]]
+        played = ~np.isnan(m)
+        r, c = played.any(axis=1), played.any(axis=0)
+        return self.agents[r].tolist(), self.agents[c].tolist(), m[np.ix_(r, c)]
+
+    def series(self, a, b):
+        """P1 win rate of a (as P1) vs b across self.grids; NaN where not played."""
+        i, j = self.agent_index.get(a), self.agent_index.get(b)
+        if i is None or j is None:
+            return np.full(len(self.grids), np.nan)
+        return self.values[:, i, j]
 
 def ensure_out(out_dir: Path):
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -40,16 +87,9 @@ def ensure_out(out_dir: Path):
 
 # ---------- plots ----------
 
-def plot_winrate_heatmap(winrates: pd.DataFrame, grid: int, out_dir: Path):
-    W = winrates[winrates["grid"] == grid]
-    rows = sorted(W["p1_ai"].unique().tolist())
-    cols = sorted(W["p2_ai"].unique().tolist())
-    mat = np.full((len(rows), len(cols)), np.nan)
-    for i, ra in enumerate(rows):
-        for j, cb in enumerate(cols):
-            m = W[(W["p1_ai"] == ra) & (W["p2_ai"] == cb)]
-            if len(m):
-                mat[i, j] = float(m["p1_winrate_pct"].iloc[0])
+def plot_winrate_heatmap(winrates, grid: int, out_dir: Path):
+    T = WinrateTensor.of(winrates)
+    rows, cols, mat = T.matrix(grid)
 
     fig, ax = plt.subplots(figsize=(8, 6), dpi=300)
     im = ax.imshow(mat, cmap="viridis", vmin=0, vmax=100, aspect="auto")
@@ -58,10 +98,8 @@ def plot_winrate_heatmap(winrates: pd.DataFrame, grid: int, out_dir: Path):
     ax.set_title(f"Win-rate heatmap (P1 wins %) — {grid}×{grid}")
 
     # annotate cells
-    for i in range(len(rows)):
-        for j in range(len(cols)):
-            if not np.isnan(mat[i, j]):
-                ax.text(j, i, f"{mat[i,j]:.0f}%", ha="center", va="center", color="white", fontsize=9)
+    for i, j in zip(*np.nonzero(~np.isnan(mat))):
+        ax.text(j, i, f"{mat[i,j]:.0f}%", ha="center", va="center", color="white", fontsize=9)
 
     cbar = fig.colorbar(im, ax=ax)
     cbar.set_label("P1 win rate (%)")
@@ -69,21 +107,19 @@ def plot_winrate_heatmap(winrates: pd.DataFrame, grid: int, out_dir: Path):
     fig.savefig(out_dir / f"winrate_heatmap_{grid}x{grid}.png")
     plt.close(fig)
 
-def plot_slope_selected_pairs(winrates: pd.DataFrame, out_dir: Path):
+SLOPE_PAIRS = [
+    ("Deep2", "Random"),
+    ("Deep2", "Heuristic1"),
+    ("Heuristic1", "Random"),
+]
+
+def plot_slope_selected_pairs(winrates, out_dir: Path, pairs=SLOPE_PAIRS):
     """Show P1 win rate across grids for selected pairs to illustrate scaling."""
-    pairs = [
-        ("Deep2", "Random"),
-        ("Deep2", "Heuristic1"),
-        ("Heuristic1", "Random"),
-    ]
-    grids = sorted(winrates["grid"].unique().tolist())
+    T = WinrateTensor.of(winrates)
+    grids = T.grids.tolist()
     fig, ax = plt.subplots(figsize=(8, 5), dpi=300)
     for a, b in pairs:
-        ys = []
-        for g in grids:
-            row = winrates[(winrates["grid"] == g) & (winrates["p1_ai"] == a) & (winrates["p2_ai"] == b)]
-            ys.append(float(row["p1_winrate_pct"].iloc[0]) if len(row) else np.nan)
-        ax.plot(grids, ys, marker="o", label=f"{a} vs {b}")
+        ax.plot(grids, T.series(a, b), marker="o", label=f"{a} vs {b}")
     ax.set_xticks(grids, labels=[f"{g}×{g}" for g in grids])
     ax.set_ylabel("P1 win rate (%)")
     ax.set_title("Head-to-head P1 win rate across grid sizes")
@@ -92,6 +128,14 @@ def plot_slope_selected_pairs(winrates: pd.DataFrame, out_dir: Path):
     fig.savefig(out_dir / "slope_winrates_selected_pairs.png")
     plt.close(fig)
 
+def _save_unsafe_boxplot(fig, ax, out_dir: Path):
+    ax.set_ylabel("Unsafe moves per game")
+    ax.set_title("Unsafe moves by agent — distribution (6×6)")
+    plt.xticks(rotation=0)
+    fig.tight_layout()
+    fig.savefig(out_dir / "unsafe_boxplot_6x6.png")
+    plt.close(fig)
+
 def plot_unsafe_boxplot_at_6(games: pd.DataFrame, out_dir: Path):
     grid = 6
     data = collect_agent_series(games, grid, "p1_unsafe_moves", "p2_unsafe_moves")
@@ -100,25 +144,41 @@ def plot_unsafe_boxplot_at_6(games: pd.DataFrame, out_dir: Path):
 
     fig, ax = plt.subplots(figsize=(8, 5), dpi=300)
     bp = ax.boxplot(series, labels=agents, showmeans=True, meanline=False)
-    ax.set_ylabel("Unsafe moves per game")
-    ax.set_title("Unsafe moves by agent — distribution (6×6)")
-    plt.xticks(rotation=0)
-    fig.tight_layout()
-    fig.savefig(out_dir / "unsafe_boxplot_6x6.png")
-    plt.close(fig)
+    _save_unsafe_boxplot(fig, ax, out_dir)
 
-def plot_streak_errorbars(games: pd.DataFrame, out_dir: Path):
+def unsafe_box_stats_6(acc: GamesAccumulator):
+    """Axes.bxp statistics per agent at 6×6 from the accumulator's value histograms."""
+    hist = acc.histogram(6, "unsafe")
+    return [hist_boxplot_stats(v, c, label=a) for a, (v, c) in sorted(hist.items())]
+
+def plot_unsafe_boxplot_at_6_from_hist(acc: GamesAccumulator, out_dir: Path, stats=None):
+    """Streaming variant: box statistics come from the accumulator's value histograms."""
+    stats = unsafe_box_stats_6(acc) if stats is None else stats
+
+    fig, ax = plt.subplots(figsize=(8, 5), dpi=300)
+    ax.bxp(stats, showmeans=True, meanline=False)
+    _save_unsafe_boxplot(fig, ax, out_dir)
+
+def streak_stats(games: pd.DataFrame):
+    """Return (grids, agents, means, stds) of the longest streak per agent and grid."""
+    st = role_stats(games, "p1_longest_streak", "p2_longest_streak").set_index(["grid", "agent"])
     grids = sorted(games["grid"].unique().tolist())
     agents = sorted(set(games["p1_ai"]) | set(games["p2_ai"]))
-    means = {a: [] for a in agents}
-    stds  = {a: [] for a in agents}
+    means = {a: [st["mean"].get((g, a), np.nan) for g in grids] for a in agents}
+    stds  = {a: [st["std"].get((g, a), np.nan) for g in grids] for a in agents}
+    return grids, agents, means, stds
+
+def streak_stats_from_acc(acc: GamesAccumulator):
+    """streak_stats() computed from accumulated sums / sums of squares."""
+    st = acc.agent_mean_std("streak").set_index(["grid", "agent"])
+    grids = sorted(st.index.get_level_values("grid").unique().tolist())
+    agents = sorted(st.index.get_level_values("agent").unique().tolist())
+    means = {a: [st["mean"].get((g, a), np.nan) for g in grids] for a in agents}
+    stds  = {a: [st["std"].get((g, a), np.nan) for g in grids] for a in agents}
+    return grids, agents, means, stds
 
-    for g in grids:
-        data = collect_agent_series(games, g, "p1_longest_streak", "p2_longest_streak")
-        for a in agents:
-            v = data[a].dropna().astype(float)
-            means[a].append(v.mean())
-            stds[a].append(v.std())
+def plot_streak_errorbars(games: pd.DataFrame, out_dir: Path, stats=None):
+    grids, agents, means, stds = stats if stats is not None else streak_stats(games)
 
     fig, ax = plt.subplots(figsize=(8, 5), dpi=300)
     for a in agents:
@@ -131,10 +191,13 @@ def plot_streak_errorbars(games: pd.DataFrame, out_dir: Path):
     fig.savefig(out_dir / "streak_errorbars.png")
     plt.close(fig)
 
-def plot_hbar_unsafe_matchups_6(games: pd.DataFrame, out_dir: Path):
+def unsafe_matchups_6(games: pd.DataFrame) -> pd.DataFrame:
     g = games[games["grid"] == 6].copy()
     g["avg_unsafe_both"] = (g["p1_unsafe_moves"] + g["p2_unsafe_moves"]) / 2.0
-    m = g.groupby(["p1_ai", "p2_ai"])["avg_unsafe_both"].mean().reset_index()
+    return g.groupby(["p1_ai", "p2_ai"])["avg_unsafe_both"].mean().reset_index()
+
+def plot_hbar_unsafe_matchups_6(games: pd.DataFrame, out_dir: Path, m=None):
+    m = unsafe_matchups_6(games) if m is None else m.copy()
     m["label"] = m["p1_ai"] + " vs " + m["p2_ai"]
     m = m.sort_values("avg_unsafe_both", ascending=True)
 
@@ -146,16 +209,67 @@ def plot_hbar_unsafe_matchups_6(games: pd.DataFrame, out_dir: Path):
     fig.savefig(out_dir / "hbar_unsafe_matchups_6x6.png")
     plt.close(fig)
 
+# ---------- rendering ----------
+
+def figure_tasks(winrates, games=None, games6=None, acc=None):
+    """
+    Independent plot jobs as (png name, plot function, args). Each job carries only
+    the small slice it draws from (one grid of the win-rate tensor, 6×6 unsafe columns,
+    precomputed streak/matchup tables), so a worker process never needs the whole
+    per-game frame. Pass `acc` for the streaming path instead of games/games6.
+    """
+    T = WinrateTensor.of(winrates)
+    tasks = []
+    for g in T.grids.tolist():
+        tasks.append((f"winrate_heatmap_{g}x{g}.png", plot_winrate_heatmap, (T.subset([g]), g)))
+    tasks.append(("slope_winrates_selected_pairs.png", plot_slope_selected_pairs, (T,)))
+    if acc is not None:
+        if 6 in T.grid_index:
+            tasks.append(("unsafe_boxplot_6x6.png", plot_unsafe_boxplot_at_6_from_hist,
+                          (None,), {"stats": unsafe_box_stats_6(acc)}))
+            tasks.append(("hbar_unsafe_matchups_6x6.png", plot_hbar_unsafe_matchups_6,
+                          (None,), {"m": acc.matchup_unsafe_both(6)}))
+        tasks.append(("streak_errorbars.png", plot_streak_errorbars, (None,),
+                      {"stats": streak_stats_from_acc(acc)}))
+        return tasks
+    if 6 in games["grid"].unique():
+        g6 = games6.loc[games6["grid"] == 6, ["grid", "p1_ai", "p2_ai", "p1_unsafe_moves", "p2_unsafe_moves"]]
+        tasks.append(("unsafe_boxplot_6x6.png", plot_unsafe_boxplot_at_6, (g6,)))
+        tasks.append(("hbar_unsafe_matchups_6x6.png", plot_hbar_unsafe_matchups_6,
+                      (None,), {"m": unsafe_matchups_6(g6)}))
+    tasks.append(("streak_errorbars.png", plot_streak_errorbars, (None,), {"stats": streak_stats(games)}))
+    return tasks
+
+def _worker_init():
+    plt.switch_backend("Agg")
+
+def _render(fn, args, kwargs, out_dir):
+    t0 = time.perf_counter()
+    fn(*args, out_dir, **kwargs)
+    return time.perf_counter() - t0
+
+def render_all(tasks, out_dir: Path, jobs=1, prof=None):
+    """
+    Draw every task, serially or on a process pool (Agg). Returns {png: seconds}.
+    An enabled Profiler gets one stage per figure, which needs the serial path.
+    """
+    calls = [(name, fn, args, kw[0] if kw else {}) for name, fn, args, *kw in tasks]
+    if jobs <= 1 or (prof is not None and prof.enabled):
+        prof = prof or Profiler()
+        return {name: prof.call(name, _render, fn, args, kw, out_dir) for name, fn, args, kw in calls}
+    with ProcessPoolExecutor(max_workers=min(jobs, len(calls)), initializer=_worker_init) as ex:
+        futs = {name: ex.submit(_render, fn, args, kw, out_dir) for name, fn, args, kw in calls}
+        return {name: f.result() for name, f in futs.items()}
+
+def print_timings(timings, wall):
+    for name, sec in timings.items():
+        print(f"  {name:38s} {sec:6.2f}s")
+    print(f"  {'(sum of figures)':38s} {sum(timings.values()):6.2f}s   wall {wall:.2f}s")
+
 # ---------- main ----------
 
 def main():
-    DEFAULT_SUMMARY = Path(r"D:\Project\dots_and_boxes_ws\packages\game_engine\bin\benchmark2_summary.csv")
-    DEFAULT_GAMES   = Path(r"D:\Project\dots_and_boxes_ws\packages\game_engine\bin\benchmark2_games.csv")
-    
-    ap = argparse.ArgumentParser(description="Generate evaluation figures from summary & games CSVs.")
-    ap.add_argument("--summary", type=str, default=str(DEFAULT_SUMMARY), help="Path to benchmark2_summary.csv")
-    ap.add_argument("--games",   type=str, default=str(DEFAULT_GAMES),   help="Path to benchmark2_games.csv")
-    ap.add_argument("--out",     type=str, default=None,                 help="Output folder for PNGs")
+    ap = figures_parser()
     args = ap.parse_args()
 
     
@@ -166,10 +280,20 @@ def main():
         out_dir = ensure_out(Path(args.out))
     else:
         out_dir = ensure_out(games_path.parent / "figs_eval2")
+    prof = Profiler.from_args(args, out_dir, "make_figures")
 
-    # Load CSVs
-    summary = pd.read_csv(sum_path)
-    games   = pd.read_csv(games_path)
+    if args.chunksize:
+        # constant-memory path: every figure is drawn from per-matchup accumulators
+        with prof.stage("load_games"):
+            acc = GamesAccumulator.from_csv(games_path, chunksize=args.chunksize)
+        winrates = prof.call("winrates", acc.p1_winrates)
+        tasks = prof.call("figure_tasks", figure_tasks, winrates, acc=acc)
+        t0 = time.perf_counter()
+        timings = render_all(tasks, out_dir, jobs=args.jobs, prof=prof)
+        print_timings(timings, time.perf_counter() - t0)
+        print(f"Saved figures to: {out_dir.resolve()}")
+        prof.write()
+        return
 
     # Basic column checks (fail fast with clear errors)
     req_games = {
@@ -177,29 +301,35 @@ def main():
         "p1_unsafe_moves","p2_unsafe_moves",
         "p1_longest_streak","p2_longest_streak"
     }
-    missing_g = req_games - set(games.columns)
+    missing_g = req_games - set(pd.read_csv(games_path, nrows=0).columns)
     if missing_g:
         raise ValueError(f"games CSV missing columns: {sorted(missing_g)}")
 
-    # Compute winrates from per-game data to avoid any mismatches
-    winrates = p1_winrate_from_games(games)
-
-    # 1) Heatmaps per grid
-    for g in sorted(winrates["grid"].unique()):
-        plot_winrate_heatmap(winrates, g, out_dir)
-
-    # 2) Slope chart across grids for selected pairs
-    plot_slope_selected_pairs(winrates, out_dir)
+    # Load CSVs
+    with prof.stage("load"):
+        if args.cache:
+            # project per figure group; the 6×6 plots only touch the grid=6 partition
+            summary = read_summary(sum_path)
+            games   = read_games(games_path, columns=sorted(req_games - {"p1_unsafe_moves", "p2_unsafe_moves"}))
+            games6  = read_games(games_path, columns=["grid", "p1_ai", "p2_ai", "p1_unsafe_moves", "p2_unsafe_moves"],
+                                 grids=[6])
+        else:
+            summary = pd.read_csv(sum_path)
+            games   = pd.read_csv(games_path)
+            games6  = games
 
-    # 3) Distribution of unsafe moves at 6×6
-    if 6 in games["grid"].unique():
-        plot_unsafe_boxplot_at_6(games, out_dir)
-        plot_hbar_unsafe_matchups_6(games, out_dir)
+    # Compute winrates from per-game data to avoid any mismatches
+    winrates = prof.call("winrates", p1_winrate_from_games, games)
 
-    # 4) Longest scoring streak — mean ± SD across grids
-    plot_streak_errorbars(games, out_dir)
+    # 1) Heatmaps per grid, 2) slope chart across grids for selected pairs,
+    # 3) distribution of unsafe moves at 6×6, 4) longest scoring streak — mean ± SD
+    tasks = prof.call("figure_tasks", figure_tasks, winrates, games=games, games6=games6)
+    t0 = time.perf_counter()
+    timings = render_all(tasks, out_dir, jobs=args.jobs, prof=prof)
+    print_timings(timings, time.perf_counter() - t0)
 
     print(f"Saved figures to: {out_dir.resolve()}")
+    prof.write()
 
 if __name__ == "__main__":
     main()
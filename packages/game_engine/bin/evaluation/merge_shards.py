@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Merge benchmark runs from several worker machines (shards) into one run.
+
+Each shard directory holds the runner's benchmark2_games.csv, and usually
+benchmark2_summary.csv and benchmark2_sketches.json. game_idx ranges overlap
+between shards, and summary rows cannot simply be concatenated (pooled
+percentiles do not add up). The merge streams every shard in chunks:
+
+  1. re-key   - every game gets a `shard` column (directory name or --shard-ids),
+                so (grid, p1_ai, p2_ai, shard, game_idx) is unique.
+  2. spill    - rows go to one Arrow IPC file per matchup in a temp directory,
+                through one open writer per matchup (at most MAX_OPEN_SPILLS are
+                open; a matchup whose writer was closed continues in a new file).
+  3. dedup    - matchup by matchup, in sorted order, the spilled rows are read
+                back. A row with identical values (shard column aside) to an
+                earlier one, in shard order, is dropped: a shard copied or
+                uploaded twice. Duplicates always share the matchup, so no
+                global set of rows or hashes is kept.
+  4. write    - the kept rows are sorted by (shard, game_idx) and appended to
+                <out>/benchmark2_games.csv and its grid-partitioned columnar cache
+                (<out>/.eval_cache/, the layout columnar_cache.py reads with --cache).
+  5. summary  - rows are recomputed from the merged per-game aggregates.
+                Per-move timing means and p50/p95 come from the shards' merged
+                t-digests (benchmark2_sketches.json) where every contributing
+                shard has one. Otherwise means are turn-weighted per-game means,
+                p50/p95 are copied when only one shard played the matchup, and
+                are left empty when several did (per-game percentiles cannot be
+                pooled).
+  6. validate - each shard's summary is checked against its own games, and the
+                merged summary against the merged games (validate_inputs logic).
+
+Memory holds one chunk, one matchup and the spill writers' buffers.
+Needs pyarrow for the spill and the columnar output.
+
+Usage:
+  python merge_shards.py runs/box1 runs/box2 runs/box3 --out runs/merged
+  python merge_shards.py runs/* --out runs/merged --shard-ids a b c --chunksize 500000
+"""
+
+import argparse
+import json
+import shutil
+import sys
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from columnar_cache import CACHE_FORMAT, CACHE_GAMES_DTYPES, _source_key, cache_dir_for, file_sha1
+from dataset import DEFAULT_GAMES, DEFAULT_SUMMARY
+from sketches import SketchSet
+from streaming import (DEFAULT_CHUNKSIZE, GAMES_DTYPES, KEY, ROLES, TIMING_METRICS, TIMING_QUANTILE_METRICS,
+                       GamesAccumulator, detect_unsafe_suffix, read_header)
+from validate_inputs import check_against_aggregates
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional dependency
+    pa = None
+
+SKETCHES_NAME = "benchmark2_sketches.json"
+TMP_DIRNAME = ".merge_tmp"
+MAX_OPEN_SPILLS = 256   # open per-matchup spill writers (file descriptors)
+TIMING_COLS = [f"{r}_{t}_ms" for r in ROLES for t in TIMING_METRICS]
+# the runner's column order: p1 ai, p2 ai, p1 apply, p2 apply
+RUNNER_TIMING_COLS = [f"{r}_{t}_ms" for kind in ("ai", "apply") for r in ROLES
+                      for t in TIMING_METRICS if t.startswith(kind)]
+# timings stay float64 while merging so the CSV can be rewritten with the runner's 3 decimals
+MERGE_DTYPES = dict(GAMES_DTYPES, **{c: "float64" for c in TIMING_COLS})
+# summary column -> decimals, as benchmark.dart writes them
+SUMMARY_DECIMALS = dict(
+    {f"{r}_avg": 3 for r in ROLES}, **{f"{r}_unsafe_avg": 3 for r in ROLES},
+    **{f"{r}_turns_avg": 2 for r in ROLES}, **{f"{r}_streak_avg": 2 for r in ROLES},
+    **{c: 3 for c in TIMING_COLS})
+
+
+# ---------- pass 1: stream, dedup, spill ----------
+
+class ShardMerge:
+    def __init__(self, shards, ids, out_dir, chunksize=DEFAULT_CHUNKSIZE):
+        self.shards, self.ids = shards, ids
+        self.out_dir, self.chunksize = out_dir, chunksize
+        self.tmp = out_dir / TMP_DIRNAME
+        self.header = None
+        self.acc = None
+        self.shard_accs = {}
+        self.parts = {}      # (grid, p1_ai, p2_ai) -> list of spill files
+        self.writers = OrderedDict()   # (grid, p1_ai, p2_ai) -> (open spill writer, schema), least recently used first
+        self.played = {}     # (grid, p1_ai, p2_ai) -> set of shard ids that kept rows
+        self.dropped = {}    # (shard id, grid, p1_ai, p2_ai) -> duplicate rows dropped
+        self.stats = {sid: {"rows": 0, "duplicates": 0} for sid in ids}
+
+    def check_headers(self):
+        headers = {sid: read_header(p / DEFAULT_GAMES.name) for sid, p in zip(self.ids, self.shards)}
+        first = headers[self.ids[0]]
+        errs = [f"shard {sid}: columns differ from shard {self.ids[0]}"
+                for sid, h in headers.items() if h != first]
+        self.header = first
+        return errs
+
+    def _spill(self, key, part):
+        """Append a matchup's rows to its open spill file (a new file if its writer was closed)."""
+        tbl = pa.Table.from_pandas(part, preserve_index=False)
+        w, schema = self.writers.pop(key, (None, tbl.schema))
+        if w is None:
+            if len(self.writers) >= MAX_OPEN_SPILLS:
+                self.writers.popitem(last=False)[1][0].close()
+            f = self.tmp / f"part-{sum(map(len, self.parts.values()))}.arrow"
+            w = pa.ipc.new_file(str(f), schema)
+            self.parts.setdefault(key, []).append(f)
+        w.write_table(tbl.cast(schema))
+        self.writers[key] = (w, schema)
+
+    def ingest(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        self.tmp.mkdir(parents=True)
+        suffix = detect_unsafe_suffix(self.header)
+        self.acc = GamesAccumulator(unsafe_suffix=suffix)
+        try:
+            for sid, path in zip(self.ids, self.shards):
+                sacc = self.shard_accs[sid] = GamesAccumulator(unsafe_suffix=suffix)
+                for chunk in pd.read_csv(path / DEFAULT_GAMES.name, dtype=MERGE_DTYPES, chunksize=self.chunksize):
+                    sacc.update(chunk)
+                    self.stats[sid]["rows"] += len(chunk)
+                    # re-merging a merged run nests its shard ids: "<sid>/<old id>"
+                    chunk = chunk.assign(shard=(sid + "/" + chunk["shard"].astype(str)) if "shard" in chunk else sid)
+                    for c in ("p1_ai", "p2_ai"):
+                        chunk[c] = chunk[c].astype(str)
+                    for key, part in chunk.groupby(KEY, sort=False):
+                        self._spill((int(key[0]), str(key[1]), str(key[2])), part)
+        finally:
+            while self.writers:
+                self.writers.popitem()[1][0].close()
+
+    def _dedup(self, key, df):
+        """Drop rows identical (shard column aside) to an earlier row of the matchup; count them per shard."""
+        sid = df["shard"].str.split("/").str[0]
+        dup = df.duplicated(subset=[c for c in df.columns if c != "shard"], keep="first").to_numpy()
+        for s, cnt in sid[dup].value_counts().items():
+            self.dropped[(s,) + key] = int(cnt)
+            self.stats[s]["duplicates"] += int(cnt)
+        self.played[key] = set(sid[~dup])
+        return df[~dup]
+
+    # ---------- pass 2: sorted CSV + columnar cache ----------
+
+    def write_games(self):
+        csv_path = self.out_dir / DEFAULT_GAMES.name
+        cols = [c for c in self.header if c != "shard"]
+        cols.insert(cols.index("game_idx"), "shard")
+        cache = cache_dir_for(csv_path)
+        cache_tmp = cache.with_name(cache.name + ".tmp")
+        shutil.rmtree(cache_tmp, ignore_errors=True)
+        cache_tmp.mkdir(parents=True)
+        order = {sid: i for i, sid in enumerate(self.ids)}
+        writers, schema, rows = {}, None, 0
+        arrow_dtypes = {c: t for c, t in CACHE_GAMES_DTYPES.items() if t != "category"}
+        with open(csv_path, "w", newline="") as f:
+            f.write(",".join(cols) + "\n")
+            try:
+                for key in sorted(self.parts):
+                    df = pd.concat([pa.ipc.open_file(str(p)).read_pandas() for p in self.parts[key]],
+                                   ignore_index=True)
+                    df = self._dedup(key, df)
+                    self.acc.update(df)
+                    df = (df.assign(_o=df["shard"].str.split("/").str[0].map(order))
+                            .sort_values(["_o", "shard", "game_idx"], kind="stable")[cols])
+                    df.to_csv(f, header=False, index=False, float_format="%.3f", lineterminator="\n")
+                    rows += len(df)
+                    a = df.drop(columns=["grid"])
+                    a = a.astype({c: t for c, t in arrow_dtypes.items() if c in a.columns})
+                    tbl = pa.Table.from_pandas(a, preserve_index=False)
+                    if schema is None:
+                        schema = tbl.schema
+                    tbl = tbl.cast(schema)
+                    w = writers.get(key[0])
+                    if w is None:
+                        d = cache_tmp / f"grid={key[0]}"
+                        d.mkdir()
+                        w = writers[key[0]] = pa.ipc.new_file(str(d / "part.arrow"), schema)
+                    w.write_table(tbl)
+            finally:
+                for w in writers.values():
+                    w.close()
+        manifest = dict(_source_key(csv_path), format=CACHE_FORMAT, sha1=file_sha1(csv_path), columns=cols,
+                        grids=sorted(writers), rows=rows, grid_dtype=str(np.dtype(GAMES_DTYPES["grid"])))
+        (cache_tmp / "manifest.json").write_text(json.dumps(manifest, indent=2))
+        shutil.rmtree(cache, ignore_errors=True)
+        cache_tmp.replace(cache)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        return csv_path, rows
+
+    # ---------- summary ----------
+
+    def merged_sketches(self):
+        """Merged per-move digests, and the keys where every contributing shard supplied them."""
+        merged, have = SketchSet(), {}
+        for sid, path in zip(self.ids, self.shards):
+            p = path / SKETCHES_NAME
+            if not p.exists():
+                continue
+            # a digest cannot drop duplicate games: skip it where this shard had any
+            s = SketchSet.load(p)
+            s.digests = {k: d for k, d in s.digests.items()
+                         if self.dropped.get((sid,) + k[:3], 0) == 0 and sid in self.played.get(k[:3], ())}
+            for k in s.digests:
+                have.setdefault(k[:3], set()).add(sid)
+            merged.merge(s)
+        complete = {key for key, sids in have.items() if sids == self.played.get(key)}
+        return merged, complete
+
+    def summary(self):
+        out = summary_from_aggregates(self.acc.ordered())
+        sketches, complete = self.merged_sketches()
+        single = self._single_shard_quantiles(out)
+        keys = list(zip(out["grid"], out["p1_ai"].astype(str), out["p2_ai"].astype(str)))
+        pooled = 0
+        for i, key in enumerate(keys):
+            for r in ROLES:
+                for kind in ("ai", "apply"):
+                    d = sketches.digests.get(key + (f"{r}_{kind}_ms",)) if key in complete else None
+                    if d is not None:
+                        q50, q95 = d.quantile([0.5, 0.95])
+                        out.loc[i, [f"{r}_{kind}_mean_ms", f"{r}_{kind}_p50_ms", f"{r}_{kind}_p95_ms"]] = \
+                            [d.mean, q50, q95]
+                        pooled += 1
+                    elif key in single:
+                        for t in ("p50", "p95"):
+                            out.loc[i, f"{r}_{kind}_{t}_ms"] = single[key].get(f"{r}_{kind}_{t}_ms", np.nan)
+        return finish_summary(out), sketches, pooled
+
+    def _single_shard_quantiles(self, out):
+        """Shard summary p50/p95 for matchups that only one shard played, as-is."""
+        single = {}
+        for sid, path in zip(self.ids, self.shards):
+            p = path / DEFAULT_SUMMARY.name
+            if not p.exists():
+                continue
+            s = pd.read_csv(p)
+            for row in s.itertuples(index=False):
+                key = (int(row.grid), str(row.p1_ai), str(row.p2_ai))
+                if self.played.get(key) == {sid} and self.dropped.get((sid,) + key, 0) == 0:
+                    single[key] = {f"{r}_{t}_ms": getattr(row, f"{r}_{t}_ms") for r in ROLES
+                                   for t in TIMING_QUANTILE_METRICS if hasattr(row, f"{r}_{t}_ms")}
+        return single
+
+    # ---------- validation ----------
+
+    def validate(self, merged_summary):
+        errs = []
+        for sid, path in zip(self.ids, self.shards):
+            p = path / DEFAULT_SUMMARY.name
+            if p.exists():
+                errs += [f"shard {sid}: {e}" for e in
+                         check_against_aggregates(pd.read_csv(p), self.shard_accs[sid].ordered())]
+        errs += [f"merged: {e}" for e in check_against_aggregates(merged_summary, self.acc.ordered())]
+        return errs
+
+
+# ---------- summary rows ----------
+
+def summary_from_aggregates(o):
+    """
+    Summary rows from GamesAccumulator.ordered() output: counts, per-seat means
+    and turn-weighted per-move timing means. p50/p95 are left NaN (per-game
+    percentiles cannot be pooled); callers fill them from whatever they have.
+    """
+    n = o["n"].to_numpy(dtype=float)
+    out = pd.DataFrame({"grid": o["grid"].astype(int), "games": o["n"].astype(int),
+                        "p1_ai": o["p1_ai"], "p2_ai": o["p2_ai"],
+                        "p1_wins": o["p1_wins"], "p2_wins": o["p2_wins"], "ties": o["ties"]})
+    for r in ROLES:
+        out[f"{r}_avg"] = o[f"{r}_score_sum"] / n
+    out["total_boxes"] = out["grid"] ** 2
+    for m, col in (("unsafe", "unsafe_avg"), ("turns", "turns_avg"), ("streak", "streak_avg")):
+        for r in ROLES:
+            out[f"{r}_{col}"] = o[f"{r}_{m}_sum"] / n
+    for r in ROLES:
+        for t in TIMING_METRICS:
+            c = f"{r}_{t}_ms"
+            if t.endswith("_mean") and f"{r}_{t}_wsum" in o:
+                out[c] = o[f"{r}_{t}_wsum"] / o[f"{r}_turns_sum"]
+            else:
+                out[c] = np.nan
+    return out
+
+
+def finish_summary(out):
+    """Runner column order and decimals."""
+    cols = [c for c in ["grid", "games", "p1_ai", "p2_ai", "p1_wins", "p2_wins", "ties",
+                        "p1_avg", "p2_avg", "total_boxes", "p1_unsafe_avg", "p2_unsafe_avg",
+                        "p1_turns_avg", "p2_turns_avg", "p1_streak_avg", "p2_streak_avg"] + RUNNER_TIMING_COLS
+            if c in out.columns]
+    out = out[cols]
+    for c, d in SUMMARY_DECIMALS.items():
+        if c in out.columns:
+            out[c] = out[c].round(d)
+    return out
+
+
+def write_summary(summary, path):
+    fmt = summary.copy()
+    for c, d in SUMMARY_DECIMALS.items():
+        if c in fmt.columns:
+            fmt[c] = fmt[c].map(lambda v, d=d: "" if pd.isna(v) else f"{v:.{d}f}")
+    fmt.to_csv(path, index=False, lineterminator="\n")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Merge sharded benchmark runs into one deduplicated, sorted run.")
+    ap.add_argument("shards", type=Path, nargs="+", help="shard directories (each with benchmark2_games.csv)")
+    ap.add_argument("--out", type=Path, required=True, help="output run directory")
+    ap.add_argument("--shard-ids", nargs="+", default=None, help="shard ids (default: directory names)")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows per chunk")
+    args = ap.parse_args()
+
+    if pa is None:
+        print("ERROR: pyarrow is required for the merge (spill files and columnar output)."); sys.exit(1)
+    for d in args.shards:
+        if not (d / DEFAULT_GAMES.name).exists():
+            print(f"ERROR: games CSV not found at: {d / DEFAULT_GAMES.name}"); sys.exit(1)
+    ids = args.shard_ids or [d.resolve().name for d in args.shards]
+    if len(ids) != len(args.shards):
+        print("ERROR: --shard-ids needs one id per shard directory"); sys.exit(1)
+    if len(set(ids)) != len(ids):
+        ids = [f"{i}_{sid}" for i, sid in enumerate(ids)]
+    if any(d.resolve() == args.out.resolve() for d in args.shards):
+        print("ERROR: --out must not be one of the shard directories"); sys.exit(1)
+    args.out.mkdir(parents=True, exist_ok=True)
+
+    m = ShardMerge(args.shards, ids, args.out, chunksize=args.chunksize)
+    errs = m.check_headers()
+    if errs:
+        print("MERGE FAILURES:")
+        for e in errs: print(" -", e)
+        sys.exit(1)
+    try:
+        m.ingest()
+    except KeyError as e:
+        print(f"ERROR: {e.args[0]}"); sys.exit(1)
+    games_path, rows = m.write_games()
+
+    summary, sketches, pooled = m.summary()
+    summary_path = args.out / DEFAULT_SUMMARY.name
+    write_summary(summary, summary_path)
+    written = [games_path, cache_dir_for(games_path), summary_path]
+    if len(sketches):
+        sketches.save(args.out / SKETCHES_NAME)
+        written.append(args.out / SKETCHES_NAME)
+
+    errs = m.validate(pd.read_csv(summary_path))
+    if rows != int(m.acc.ordered()["n"].sum()):
+        errs.append(f"merged: wrote {rows} games but aggregated {int(m.acc.ordered()['n'].sum())}")
+    report = {"shards": [dict(id=sid, path=str(p), **m.stats[sid]) for sid, p in zip(ids, args.shards)],
+              "rows_written": rows, "matchups": len(summary), "pooled_timing_digests": pooled,
+              "missing_percentiles": int(summary[[c for c in summary.columns if c.endswith(("_p50_ms", "_p95_ms"))]]
+                                         .isna().any(axis=1).sum()),
+              "errors": errs}
+    (args.out / "merge_report.json").write_text(json.dumps(report, indent=2))
+    written.append(args.out / "merge_report.json")
+
+    print("Wrote:" + "".join(f"\n - {p}" for p in written))
+    for s in report["shards"]:
+        print(f"  shard {s['id']}: {s['rows']} rows, {s['duplicates']} duplicates dropped")
+    print(f"  merged: {rows} games in {len(summary)} matchups; "
+          f"{report['missing_percentiles']} summary rows without pooled p50/p95 (no sketches)")
+    if errs:
+        print("MERGE VALIDATION FAILURES:")
+        for e in errs: print(" -", e)
+        sys.exit(1)
+    print("Merged run passes the summary↔games cross-checks.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Performance regression suite for the analysis pipeline itself.
+
+For every scale (per-game rows), a synthetic run is written with synthetic.py
+to <data>/<rows>/. It is reused while its parameters are unchanged. The suite
+times Dataset.load (read + normalize) and then these run_all tasks on the
+loaded frames:
+
+  wins_unordered, unsafe_games (unsafe_by_agent_games), game_length,
+  order_summary (analysis.py), validate (validate_inputs) and the
+  fig_* figure generators
+
+A task's dependencies run once, untimed. The task itself runs --repeat times,
+and the min and median wall seconds are kept. Outputs of a task (CSV, LaTeX,
+PNG) go to a scratch directory and are part of its time.
+
+Writes:
+  <out>/perf_results.csv  - this run: scale, task, repeat, min_s, median_s, rows_per_s
+  <out>/perf_history.csv  - every run so far, with run_at and the Python/pandas versions
+  <out>/perf_compare.csv  - this run against the baseline (if there is one)
+
+A (scale, task) is a regression when its min time grew by more than
+--threshold (relative) and by more than --floor seconds. Regressions are
+printed and the exit status is 1. --save-baseline stores this run as the
+baseline (<out>/perf_baseline.csv, or --baseline) instead of comparing.
+
+Usage:
+  python perf_suite.py --save-baseline                  # scales 1e4 1e5 1e6
+  python perf_suite.py                                  # compare with the baseline
+  python perf_suite.py --scales 1e4 1e7 --cache --tasks load validate order_summary
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+import run_all
+import synthetic
+from columnar_cache import file_sha1
+from dataset import DEFAULT_GAMES, DEFAULT_OUT, DEFAULT_SUMMARY, Dataset
+from streaming import DEFAULT_CHUNKSIZE
+
+DEFAULT_SCALES = (10_000, 100_000, 1_000_000)
+BENCH_TASKS = ["load", "wins_unordered", "unsafe_games", "game_length", "order_summary", "validate",
+               "fig_heatmaps", "fig_slope", "fig_unsafe_boxplot", "fig_hbar_unsafe", "fig_streaks"]
+REPEAT = 3
+THRESHOLD = 0.25   # relative slow-down of the min time
+FLOOR_S = 0.05     # ignore slow-downs smaller than this
+RESULT_COLUMNS = ["scale", "task", "repeat", "min_s", "median_s", "rows_per_s"]
+
+
+# ---------- data ----------
+
+def ensure_data(data_dir, rows, agents=3, grids=None, seed=synthetic.SEED, template=DEFAULT_GAMES):
+    """Synthetic run for `rows` under data_dir/<rows>/, regenerated only when its parameters change."""
+    run_dir = Path(data_dir) / str(rows)
+    params = {"rows": rows, "agents": agents, "grids": grids, "seed": seed,
+              "template": file_sha1(template), "generator": synthetic.POOL_GAMES}
+    stamp = run_dir / "params.json"
+    if stamp.exists() and json.loads(stamp.read_text()) == params \
+            and (run_dir / DEFAULT_GAMES.name).exists() and (run_dir / DEFAULT_SUMMARY.name).exists():
+        return run_dir
+    t0 = time.perf_counter()
+    synthetic.generate(run_dir, agents, grids, rows=rows, seed=seed, template=template,
+                       chunksize=min(rows, DEFAULT_CHUNKSIZE))
+    stamp.write_text(json.dumps(params))
+    print(f"  generated {rows} rows in {time.perf_counter() - t0:.1f}s -> {run_dir}")
+    return run_dir
+
+
+# ---------- timing ----------
+
+def _timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return out, times
+
+
+def bench_scale(run_dir, rows, tasks, scratch, repeat=REPEAT, cache=False, tie="exclude"):
+    """Time Dataset.load and each run_all task on one synthetic run. Returns result rows."""
+    summary_path, games_path = run_dir / DEFAULT_SUMMARY.name, run_dir / DEFAULT_GAMES.name
+    data, times = _timed(lambda: Dataset.load(summary_path, games_path, cache=cache), repeat)
+    results = [("load", times)] if "load" in tasks else []
+
+    out_dir = scratch / str(rows)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name in [t for t in tasks if t != "load"]:
+        ctx = run_all.Context(data, out_dir, out_dir, tie=tie)
+        for dep in run_all.resolve([name])[:-1]:
+            ctx.results[dep] = run_all.REGISTRY[dep].fn(ctx)
+        _, times = _timed(lambda: run_all.REGISTRY[name].fn(ctx), repeat)
+        results.append((name, times))
+
+    return [{"scale": rows, "task": name, "repeat": len(t), "min_s": min(t),
+             "median_s": statistics.median(t), "rows_per_s": rows / min(t) if min(t) > 0 else float("nan")}
+            for name, t in results]
+
+
+def compare(results, baseline, threshold=THRESHOLD, floor_s=FLOOR_S):
+    """Join on (scale, task); ratio = min_s / base_min_s, `regression` per the thresholds."""
+    base = baseline[["scale", "task", "min_s"]].rename(columns={"min_s": "base_min_s"})
+    out = results[["scale", "task", "min_s"]].merge(base, on=["scale", "task"], how="left")
+    out["ratio"] = out["min_s"] / out["base_min_s"]
+    out["regression"] = (out["ratio"] > 1 + threshold) & (out["min_s"] - out["base_min_s"] > floor_s)
+    return out
+
+
+def _scale(s):
+    """Row counts like 1e6 or 1_000_000."""
+    return int(float(s.replace("_", "")))
+
+
+def main():
+    default_out = DEFAULT_OUT / "perf"
+    ap = argparse.ArgumentParser(description="Time the analysis pipeline on synthetic runs; exit 1 on slowdowns.")
+    ap.add_argument("--scales", type=_scale, nargs="+", default=list(DEFAULT_SCALES),
+                    help="per-game row counts to benchmark (e.g. 1e4 1e5 1e6 1e7)")
+    ap.add_argument("--tasks", nargs="+", default=BENCH_TASKS,
+                    help="'load' and/or run_all task names (see run_all.py --list)")
+    ap.add_argument("--agents", type=int, default=3, help="agents in the synthetic runs")
+    ap.add_argument("--grids", type=int, nargs="+", default=None, help="grid sizes (default: the template's)")
+    ap.add_argument("--seed", type=int, default=synthetic.SEED, help="RNG seed of the synthetic runs")
+    ap.add_argument("--template", type=Path, default=DEFAULT_GAMES, help="per-game CSV the generator resamples")
+    ap.add_argument("--repeat", type=int, default=REPEAT, help="timed runs per task (min and median kept)")
+    ap.add_argument("--cache", action="store_true",
+                    help="Load via the columnar cache (.eval_cache/ next to the CSVs; needs pyarrow; built on the first load)")
+    ap.add_argument("--out", type=Path, default=default_out, help="Output directory for the results")
+    ap.add_argument("--data", type=Path, default=None, help="synthetic runs directory (default: <out>/data)")
+    ap.add_argument("--baseline", type=Path, default=None, help="baseline CSV (default: <out>/perf_baseline.csv)")
+    ap.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD,
+                    help="minimum relative slow-down that counts as a regression")
+    ap.add_argument("--floor", type=float, default=FLOOR_S, help="ignore slow-downs below this many seconds")
+    args = ap.parse_args()
+
+    unknown = [t for t in args.tasks if t != "load" and t not in run_all.REGISTRY]
+    if unknown:
+        print(f"ERROR: unknown task {unknown[0]!r} (see run_all.py --list)"); sys.exit(1)
+    if not args.template.exists():
+        print(f"ERROR: template games CSV not found at: {args.template}"); sys.exit(1)
+    if args.repeat < 1:
+        print("ERROR: --repeat must be at least 1"); sys.exit(1)
+    args.out.mkdir(parents=True, exist_ok=True)
+    data_dir = args.data or args.out / "data"
+    baseline_path = args.baseline or args.out / "perf_baseline.csv"
+
+    rows = []
+    for n in args.scales:
+        print(f"scale {n}:")
+        run_dir = ensure_data(data_dir, n, args.agents, args.grids, args.seed, args.template)
+        for r in bench_scale(run_dir, n, args.tasks, args.out / "scratch", args.repeat, args.cache):
+            print(f"  {r['task']:20s} min {r['min_s']:8.3f}s  median {r['median_s']:8.3f}s")
+            rows.append(r)
+    results = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    results.to_csv(args.out / "perf_results.csv", index=False)
+
+    history_path = args.out / "perf_history.csv"
+    history = results.assign(run_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                             python=sys.version.split()[0], pandas=pd.__version__)
+    history.to_csv(history_path, mode="a", header=not history_path.exists(), index=False)
+    written = [args.out / "perf_results.csv", history_path]
+
+    if args.save_baseline:
+        results.to_csv(baseline_path, index=False)
+        print("Wrote:" + "".join(f"\n - {p}" for p in written + [baseline_path]))
+        return
+    if not baseline_path.exists():
+        print("Wrote:" + "".join(f"\n - {p}" for p in written))
+        print(f"No baseline at {baseline_path}; run with --save-baseline to store one.")
+        return
+
+    cmp = compare(results, pd.read_csv(baseline_path), args.threshold, args.floor)
+    cmp.to_csv(args.out / "perf_compare.csv", index=False)
+    print("Wrote:" + "".join(f"\n - {p}" for p in written + [args.out / "perf_compare.csv"]))
+    missing = int(cmp["base_min_s"].isna().sum())
+    if missing:
+        print(f"Note: {missing} (scale, task) rows have no baseline.")
+    regressions = cmp[cmp["regression"]]
+    if len(regressions):
+        print(f"REGRESSIONS ({len(regressions)}):")
+        for r in regressions.itertuples(index=False):
+            print(f" - {r.task} @ {r.scale} rows: {r.base_min_s:.3f}s -> {r.min_s:.3f}s ({r.ratio:.2f}x)")
+        sys.exit(1)
+    print("No slowdowns beyond the threshold.")
+
+
+if __name__ == "__main__":
+    main()
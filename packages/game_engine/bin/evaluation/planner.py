@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Adaptive game allocation for the benchmark round-robin.
+
+benchmark.dart plays gamesPerPair games for every ordered pairing, including
+pairings that are settled after a handful of games (Deep2 vs Random on 4x4).
+This planner reads the results so far and works out how many more games each
+(grid, p1_ai, p2_ai) needs. A pairing is done once either:
+
+  precision - the Wilson 95% CI of the P1 win rate is no wider than
+              ±--halfwidth, or
+  decided   - the CI excludes --decide-at (default 0.5: it is clear which
+              seat wins more often). Disable this with --no-decide.
+
+The total is found by a vectorised binary search over n, assuming the
+observed win rate holds (0.5 for pairings without games). It is clamped to
+[--min-games, --max-games] and rounded up to a multiple of --batch.
+Under --tie exclude only decisive games count, so the total is scaled by the
+observed tie rate.
+
+Writes a schedule the runner consumes (dart run bin/benchmark.dart --schedule <json>):
+  plan.json  {"seed", "tie", "halfwidth", "decide_at", "schedule": [{grid, p1_ai, p2_ai,
+              played, extra, target, reason}, ...]}
+  plan.csv   the same rows
+
+Usage:
+  python planner.py --games ../benchmark2_games.csv --halfwidth 0.05
+  python planner.py --summary ../benchmark2_summary.csv --max-games 1000 --out-json plan.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset import DEFAULT_OUT, DEFAULT_SUMMARY
+from intervals import wilson_ci_arrays
+from ratings import counts_from_games, counts_from_summary
+from streaming import DEFAULT_CHUNKSIZE, KEY
+
+HALFWIDTH = 0.05
+DECIDE_AT = 0.5
+MIN_GAMES = 20
+MAX_GAMES = 300    # benchmark.dart's gamesPerPair
+BATCH = 10
+SEED = 42
+
+
+def _wilson_bounds(p, n):
+    """Wilson interval for a success *rate* p over n trials (vectorised)."""
+    lo, hi = wilson_ci_arrays(p * n, n)
+    return lo, hi
+
+
+def _smallest_n(done, lo_n, hi_n):
+    """Per row, the smallest n in [lo_n, hi_n] with done(n) true (hi_n if none)."""
+    lo, hi = lo_n.astype(np.int64), hi_n.astype(np.int64)
+    while np.any(lo < hi):
+        mid = (lo + hi) // 2
+        ok = done(mid)
+        hi = np.where(ok, mid, hi)
+        lo = np.where(ok, lo, mid + 1)
+    return hi
+
+
+def plan(counts, tie="exclude", halfwidth=HALFWIDTH, decide_at=DECIDE_AT, min_games=MIN_GAMES,
+         max_games=MAX_GAMES, batch=BATCH):
+    """Per ordered matchup: played, target total, extra games and why it stops."""
+    c = counts.reset_index(drop=True)
+    w, l, t = (c[k].to_numpy(dtype=np.float64) for k in ("p1_wins", "p2_wins", "ties"))
+    played = (w + l + t).astype(np.int64)
+    if tie == "exclude":
+        trials, succ = w + l, w
+        decisive = np.where(played > 0, (w + l) / np.maximum(played, 1), 1.0)
+    else:
+        trials, succ = w + l + t, w + 0.5 * t
+        decisive = np.ones(len(c))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(trials > 0, succ / trials, 0.5)
+    decisive = np.maximum(decisive, 1e-3)
+
+    # in trial units (decisive games under --tie exclude): max_games games only buy
+    # about max_games * decisive trials, so a stop found above that is not reachable
+    lo_n = np.ones(len(c), dtype=np.int64)
+    hi_n = np.maximum(np.floor(max_games * decisive + 1e-9), 1).astype(np.int64)
+
+    def precise(n):
+        lo, hi = _wilson_bounds(p, n)
+        return (hi - lo) / 2 <= halfwidth
+
+    def decided(n):
+        lo, hi = _wilson_bounds(p, n)
+        return (lo > decide_at) | (hi < decide_at)
+
+    n_prec = _smallest_n(precise, lo_n, hi_n)
+    reach_prec = precise(n_prec)
+    if decide_at is None:
+        n_need, reach = n_prec, reach_prec
+        reason = np.where(reach_prec, "precision", "max_games")
+    else:
+        n_dec = _smallest_n(decided, lo_n, hi_n)
+        reach_dec = decided(n_dec)
+        n_dec = np.where(reach_dec, n_dec, hi_n)
+        n_p = np.where(reach_prec, n_prec, hi_n)
+        n_need = np.minimum(n_p, n_dec)
+        reach = reach_prec | reach_dec
+        reason = np.where(~reach, "max_games", np.where(n_dec < n_p, "decided", "precision"))
+
+    target = np.ceil(n_need / decisive)
+    target = np.clip(np.ceil(np.maximum(target, min_games) / batch) * batch, min_games, max_games)
+    target = np.where(reach, target, max_games).astype(np.int64)
+    extra = np.maximum(target - played, 0)
+    reason = np.where(extra == 0, np.where(reach, "done", "max_games"), reason)
+
+    out = c[KEY].copy()
+    out["played"] = played
+    out["p1_rate"] = p
+    out["target"] = target
+    out["extra"] = extra
+    out["reason"] = reason
+    return out.sort_values(KEY).reset_index(drop=True)
+
+
+def write_schedule(sched, path, **meta):
+    rows = [{"grid": int(r.grid), "p1_ai": str(r.p1_ai), "p2_ai": str(r.p2_ai), "played": int(r.played),
+             "extra": int(r.extra), "target": int(r.target), "reason": str(r.reason)}
+            for r in sched.itertuples(index=False)]
+    Path(path).write_text(json.dumps(dict(meta, schedule=rows), indent=1))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Plan how many more games each ordered pairing needs.")
+    ap.add_argument("--games", type=Path, default=None,
+                    help="per-game CSV with the results so far (streamed in chunks)")
+    ap.add_argument("--summary", type=Path, default=DEFAULT_SUMMARY,
+                    help="summary CSV with the results so far (used without --games)")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows per chunk with --games")
+    ap.add_argument("--tie", choices=["exclude", "half"], default="exclude", help="tie handling")
+    ap.add_argument("--halfwidth", type=float, default=HALFWIDTH,
+                    help="target Wilson 95%% CI half-width of the P1 win rate")
+    ap.add_argument("--decide-at", type=float, default=DECIDE_AT,
+                    help="also stop once the CI excludes this win rate")
+    ap.add_argument("--no-decide", action="store_true", help="precision target only")
+    ap.add_argument("--min-games", type=int, default=MIN_GAMES, help="minimum games per ordered pairing")
+    ap.add_argument("--max-games", type=int, default=MAX_GAMES, help="maximum games per ordered pairing")
+    ap.add_argument("--batch", type=int, default=BATCH, help="round targets up to a multiple of this")
+    ap.add_argument("--seed", type=int, default=SEED, help="RNG seed recorded for the runner")
+    ap.add_argument("--out-json", type=Path, default=DEFAULT_OUT / "plan.json", help="schedule JSON path")
+    ap.add_argument("--out-csv", type=Path, default=DEFAULT_OUT / "plan.csv", help="schedule CSV path")
+    args = ap.parse_args()
+
+    if args.games is not None:
+        if not args.games.exists():
+            print(f"ERROR: games CSV not found at: {args.games}"); sys.exit(1)
+        counts = counts_from_games(args.games, args.chunksize)
+    else:
+        if not args.summary.exists():
+            print(f"ERROR: summary CSV not found at: {args.summary}"); sys.exit(1)
+        counts = counts_from_summary(pd.read_csv(args.summary))
+    if args.min_games > args.max_games:
+        print("ERROR: --min-games is above --max-games"); sys.exit(1)
+
+    decide_at = None if args.no_decide else args.decide_at
+    sched = plan(counts, tie=args.tie, halfwidth=args.halfwidth, decide_at=decide_at,
+                 min_games=args.min_games, max_games=args.max_games, batch=args.batch)
+    args.out_json.parent.mkdir(parents=True, exist_ok=True)
+    args.out_csv.parent.mkdir(parents=True, exist_ok=True)
+    write_schedule(sched, args.out_json, seed=args.seed, tie=args.tie, halfwidth=args.halfwidth,
+                   decide_at=decide_at)
+    sched.to_csv(args.out_csv, index=False)
+
+    fixed = args.max_games * len(sched)
+    planned = int(np.maximum(sched["played"], sched["target"]).sum())    # played + extra
+    print(f"Wrote:\n - {args.out_json}\n - {args.out_csv}")
+    print(f"{len(sched)} ordered pairings: {int(sched['extra'].sum())} extra games scheduled; "
+          f"{planned} games in total vs {fixed} at a fixed {args.max_games} per pairing "
+          f"({abs(100 * (1 - planned / fixed)):.0f}% {'fewer' if planned <= fixed else 'more'})")
+    print(sched["reason"].value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Per-stage profiling for the evaluation scripts.
+
+Wrap each named step (load, normalize, every analysis function, every plot)
+in `with prof.stage(name):`. With profiling on, each stage records:
+
+  wall_s            elapsed time (perf_counter)
+  cpu_s             CPU time of the process (process_time)
+  rss_peak_mb       peak resident set size of the process so far (getrusage; on
+                    Windows psutil's peak working set, NaN without psutil)
+  rss_peak_grew_mb  how much that peak rose during the stage
+  alloc_delta_mb    Python allocations still live at the end minus at the start (tracemalloc)
+  alloc_peak_mb     highest Python allocation above the start during the stage (tracemalloc)
+
+With profiling off, a stage is a no-op. Stages may nest, and a parent's
+tracemalloc peak includes its children. With cProfile dumps on, every
+outermost stage also writes <out>/profile/<script>/<stage>.prof (open it with
+`python -m pstats` or snakeviz).
+
+Switch it on with --profile / --cprofile on analyze_all.py, make_figures.py
+and run_all.py, or with EVAL_PROFILE=1 (EVAL_PROFILE=cprofile for the dumps)
+for any of them. tracemalloc slows Python allocation down, so compare wall
+times between profiled runs only. The profile is written next to the outputs
+as profile_<script>.json and profile_<script>.csv.
+"""
+
+import cProfile
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ENV_VAR = "EVAL_PROFILE"
+PROFILE_COLUMNS = ["stage", "parent", "wall_s", "cpu_s", "rss_peak_mb", "rss_peak_grew_mb",
+                   "alloc_delta_mb", "alloc_peak_mb"]
+_MB = 2**20
+# ru_maxrss is in KiB on Linux and in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def _rss_peak_mb():
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT / _MB
+    try:
+        import psutil   # optional dependency
+    except ImportError:
+        return float("nan")
+    return getattr(psutil.Process().memory_info(), "peak_wset", float("nan")) / _MB
+
+
+def add_profile_args(ap):
+    ap.add_argument("--profile", action="store_true",
+                    help=f"record wall/CPU time and memory per stage (or set {ENV_VAR}=1)")
+    ap.add_argument("--cprofile", action="store_true",
+                    help=f"--profile plus a cProfile dump per stage (or set {ENV_VAR}=cprofile)")
+
+
+class Profiler:
+    """Collects one row per stage; a no-op unless enabled."""
+
+    def __init__(self, enabled=False, cprofile_dir=None, out_dir=".", script="evaluation"):
+        self.enabled = enabled or cprofile_dir is not None
+        self.cprofile_dir = Path(cprofile_dir) if cprofile_dir is not None else None
+        self.out_dir = Path(out_dir)
+        self.script = script
+        self.rows = []
+        self._stack = []    # open stages: [name, running tracemalloc peak]
+        self._cprofiling = False
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @classmethod
+    def from_args(cls, args, out_dir, script):
+        """Profiler for a script run, from --profile / --cprofile or the EVAL_PROFILE variable."""
+        env = os.environ.get(ENV_VAR, "").strip().lower()
+        dumps = getattr(args, "cprofile", False) or env == "cprofile"
+        enabled = dumps or getattr(args, "profile", False) or env not in ("", "0", "false", "no")
+        return cls(enabled, Path(out_dir) / "profile" / script if dumps else None, out_dir, script)
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        cur0, peak0 = tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak0)
+        tracemalloc.reset_peak()
+        parent = self._stack[-1][0] if self._stack else ""
+        self._stack.append([name, 0])
+        profiler = None
+        if self.cprofile_dir is not None and not self._cprofiling:
+            profiler, self._cprofiling = cProfile.Profile(), True
+            profiler.enable()
+        rss0 = _rss_peak_mb()
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+            if profiler is not None:
+                profiler.disable()
+                self._cprofiling = False
+                self.cprofile_dir.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(self.cprofile_dir / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}.prof")
+            cur, peak = tracemalloc.get_traced_memory()
+            _, running = self._stack.pop()
+            peak = max(peak, running)
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            rss = _rss_peak_mb()
+            self.rows.append({"stage": name, "parent": parent, "wall_s": wall, "cpu_s": cpu,
+                              "rss_peak_mb": rss, "rss_peak_grew_mb": rss - rss0,
+                              "alloc_delta_mb": (cur - cur0) / _MB,
+                              "alloc_peak_mb": max(peak - cur0, 0) / _MB})
+
+    def call(self, name, fn, *args, **kwargs):
+        """fn(*args, **kwargs) inside stage `name`."""
+        with self.stage(name):
+            return fn(*args, **kwargs)
+
+    def table(self):
+        import pandas as pd   # lazily: a --help only needs add_profile_args
+        return pd.DataFrame(self.rows, columns=PROFILE_COLUMNS)
+
+    def write(self, out_dir=None, script=None):
+        """Write profile_<script>.json / .csv and print the table. Returns the paths (none when off)."""
+        if not self.enabled:
+            return []
+        out_dir = Path(out_dir or self.out_dir)
+        script = script or self.script
+        out_dir.mkdir(parents=True, exist_ok=True)
+        table = self.table()
+        paths = [out_dir / f"profile_{script}.json", out_dir / f"profile_{script}.csv"]
+        meta = {"script": script, "argv": sys.argv[1:], "python": sys.version.split()[0],
+                "cprofile_dir": str(self.cprofile_dir) if self.cprofile_dir is not None else None,
+                "stages": table.to_dict(orient="records")}
+        paths[0].write_text(json.dumps(meta, indent=1))
+        table.to_csv(paths[1], index=False)
+        print(f"\nProfile ({script}):")
+        print(table.round(3).to_string(index=False))
+        print("Wrote:" + "".join(f"\n - {p}" for p in paths)
+              + (f"\n - {self.cprofile_dir}/*.prof" if self.cprofile_dir is not None else ""))
+        return paths
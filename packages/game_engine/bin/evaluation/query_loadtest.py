@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Load test for query_service.py: latency percentiles under concurrent clients.
+
+--concurrency keep-alive connections send --requests GETs between them. The
+requests are a seeded random mix of /matchup (ordered pairs of distinct agents,
+ties excluded or half), /agent and /grid, each over all runs or the last
+--last runs, built from the service's /runs. A request's latency runs from
+writing it to reading the whole response body.
+
+Writes (with --out):
+  <out>/query_latency.csv  - endpoint, requests, errors, p50_ms, p90_ms, p99_ms, max_ms, req_per_s
+
+With --db the service is started on --port for the test and stopped after.
+With --max-p99-ms, a p99 above the limit is printed and the exit status is 1.
+
+Usage:
+  python query_loadtest.py --url http://127.0.0.1:8765 --requests 20000 --concurrency 32
+  python query_loadtest.py --db out/results.sqlite --max-p99-ms 20 --out out/perf
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+from query_service import DEFAULT_HOST, DEFAULT_PORT
+
+HERE = Path(__file__).resolve().parent
+REQUESTS = 10_000
+CONCURRENCY = 16
+LAST_RUNS = 5
+MIX = (("matchup", 0.7), ("agent", 0.2), ("grid", 0.1))
+START_TIMEOUT_S = 60.0
+COLUMNS = ["endpoint", "requests", "errors", "p50_ms", "p90_ms", "p99_ms", "max_ms", "req_per_s"]
+
+
+# ---------- client ----------
+
+async def _get(reader, writer, host, target):
+    """One keep-alive GET; returns (status, body bytes)."""
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (h := await reader.readline()) not in (b"\r\n", b""):
+        k, _, v = h.decode("latin-1").partition(":")
+        if k.strip().lower() == "content-length":
+            length = int(v)
+    return status, await reader.readexactly(length)
+
+
+async def fetch_json(host, port, target):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, body = await _get(reader, writer, host, target)
+    finally:
+        writer.close()
+    if status != 200:
+        raise RuntimeError(f"GET {target}: HTTP {status} {body[:200]!r}")
+    return json.loads(body)
+
+
+def build_targets(meta, n, last=LAST_RUNS, seed=0):
+    """[(endpoint, target)] mixing the MIX endpoints over the loaded grids/agents."""
+    rng = random.Random(seed)
+    grids, agents = meta["grids"], meta["agents"]
+    names, weights = zip(*MIX)
+    out = []
+    for endpoint in rng.choices(names, weights, k=n):
+        q = {"runs": last} if rng.random() < 0.5 else {}
+        if endpoint == "matchup":
+            a, b = rng.sample(agents, 2) if len(agents) > 1 else (agents[0], agents[0])
+            q.update(grid=rng.choice(grids), a=a, b=b, tie=rng.choice(["exclude", "half"]))
+        elif endpoint == "agent":
+            q.update(agent=rng.choice(agents))
+            if rng.random() < 0.5:
+                q["grid"] = rng.choice(grids)
+        else:
+            q["grid"] = rng.choice(grids)
+        out.append((endpoint, f"/{endpoint}?{urlencode(q)}"))
+    return out
+
+
+async def run_load(host, port, targets, concurrency):
+    """Latencies (s) and error flags per target, in target order, plus the wall time."""
+    lat = np.zeros(len(targets))
+    err = np.zeros(len(targets), dtype=bool)
+    todo = iter(range(len(targets)))
+
+    async def worker():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in todo:   # shared iterator: each target is taken once
+                t0 = time.perf_counter()
+                status, _ = await _get(reader, writer, host, targets[i][1])
+                lat[i] = time.perf_counter() - t0
+                err[i] = status != 200
+        finally:
+            writer.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return lat, err, time.perf_counter() - t0
+
+
+def summarize(targets, lat, err, wall):
+    endpoints = np.array([e for e, _ in targets])
+    rows = []
+    for name in ["all"] + [e for e, _ in MIX]:
+        m = np.ones(len(targets), dtype=bool) if name == "all" else endpoints == name
+        if not m.any():
+            continue
+        ms = lat[m] * 1e3
+        p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+        rows.append({"endpoint": name, "requests": int(m.sum()), "errors": int(err[m].sum()), "p50_ms": p50,
+                     "p90_ms": p90, "p99_ms": p99, "max_ms": ms.max(), "req_per_s": m.sum() / wall})
+    return rows
+
+
+# ---------- service process ----------
+
+def start_service(db, port):
+    proc = subprocess.Popen([sys.executable, str(HERE / "query_service.py"), "--db", str(db), "--port", str(port)],
+                            stdout=subprocess.DEVNULL, cwd=HERE)
+    deadline = time.monotonic() + START_TIMEOUT_S
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"query_service.py exited with status {proc.returncode}")
+        try:
+            asyncio.run(fetch_json(DEFAULT_HOST, port, "/health"))
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"query_service.py did not answer within {START_TIMEOUT_S:.0f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure query_service.py latency percentiles under load.")
+    ap.add_argument("--url", default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", help="service base URL")
+    ap.add_argument("--db", type=Path, default=None, help="start the service on this warehouse for the test")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT, help="port for the service started with --db")
+    ap.add_argument("--requests", type=int, default=REQUESTS, help="total requests")
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY, help="keep-alive client connections")
+    ap.add_argument("--last", type=int, default=LAST_RUNS, help="runs=N used by half of the requests")
+    ap.add_argument("--seed", type=int, default=0, help="seed of the request mix")
+    ap.add_argument("--warmup", type=int, default=200, help="untimed requests first")
+    ap.add_argument("--max-p99-ms", type=float, default=None, help="exit 1 when the overall p99 exceeds this")
+    ap.add_argument("--out", type=Path, default=None, help="write query_latency.csv here")
+    args = ap.parse_args()
+
+    if args.requests < 1 or args.concurrency < 1:
+        print("ERROR: --requests and --concurrency must be at least 1"); sys.exit(1)
+    if args.db is not None and not args.db.exists():
+        print(f"ERROR: warehouse not found at: {args.db}"); sys.exit(1)
+
+    proc = None
+    if args.db is not None:
+        host, port = DEFAULT_HOST, args.port
+        try:
+            proc = start_service(args.db, port)
+        except RuntimeError as e:
+            print(f"ERROR: {e}"); sys.exit(1)
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    try:
+        try:
+            meta = asyncio.run(fetch_json(host, port, "/runs"))
+        except (OSError, RuntimeError) as e:
+            print(f"ERROR: cannot query {host}:{port}: {e}"); sys.exit(1)
+        if not meta["runs"]:
+            print("ERROR: the service has no runs loaded"); sys.exit(1)
+        if args.warmup:
+            asyncio.run(run_load(host, port, build_targets(meta, args.warmup, args.last, args.seed + 1),
+                                 min(args.concurrency, args.warmup)))
+        targets = build_targets(meta, args.requests, args.last, args.seed)
+        lat, err, wall = asyncio.run(run_load(host, port, targets, args.concurrency))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    rows = summarize(targets, lat, err, wall)
+    print(f"{args.requests} requests, {args.concurrency} connections, {len(meta['runs'])} runs loaded:")
+    for r in rows:
+        print(f"  {r['endpoint']:8s} n={r['requests']:6d} err={r['errors']:3d}  p50 {r['p50_ms']:6.2f} ms"
+              f"  p90 {r['p90_ms']:6.2f} ms  p99 {r['p99_ms']:6.2f} ms  max {r['max_ms']:7.2f} ms"
+              f"  {r['req_per_s']:8.0f} req/s")
+    if args.out is not None:
+        args.out.mkdir(parents=True, exist_ok=True)
+        with open(args.out / "query_latency.csv", "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=COLUMNS)
+            w.writeheader()
+            w.writerows(rows)
+        print(f"Wrote: {args.out / 'query_latency.csv'}")
+    if rows[0]["errors"]:
+        print(f"ERROR: {rows[0]['errors']} requests failed"); sys.exit(1)
+    if args.max_p99_ms is not None and rows[0]["p99_ms"] > args.max_p99_ms:
+        print(f"REGRESSIONS (1):\n - p99 {rows[0]['p99_ms']:.2f} ms > {args.max_p99_ms:.2f} ms"); sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Local HTTP/JSON query service over the results warehouse (warehouse.py).
+
+On start-up the per-(run, grid, p1_ai, p2_ai) aggregates of the warehouse's
+`matchups` table, plus the summary's timing columns, are read once into NumPy
+arrays of shape (run, grid, agent, agent). A query picks runs, sums over that
+axis (the sums are cached per run selection) and reads a few cells, so an
+answer never touches SQLite or a CSV. The warehouse file (and its -wal) is
+polled every --poll seconds. When it changes, the arrays are rebuilt in a
+worker thread from one read transaction and swapped in; queries keep seeing
+the old data until the swap. A failed reload keeps the old data.
+
+Endpoints (GET, JSON; NaN is null):
+  /health                          status and the loaded data's version
+  /runs                            loaded runs (oldest first), grids, agents
+  /matchup?grid=6&a=Deep2&b=Heuristic1
+        unordered A/B win and tie rates, ordered p_A_to_B / p_B_to_A with
+        Wilson CIs, s and Delta (as analysis.py), game length, and per-agent
+        unsafe / streak means and timings within the matchup
+  /agent?agent=Deep2[&grid=6]      per grid: games, wins/losses/ties, win rate
+                                   (ties excluded) with Wilson CI, unsafe and
+                                   streak means, timings
+  /grid?grid=6                     every agent's /agent entry on one grid, plus game length
+
+Common parameters:
+  runs=5           the last 5 runs; runs=base,after picks runs by label (default: all)
+  tie=half         count ties as half a win in p_A_to_B / p_B_to_A (default: exclude)
+
+Timings are the summary's pooled per-matchup values, averaged with the
+matchups' game counts as weights. The mean is exact; p50/p95 over several
+matchups or runs are an approximation.
+
+Usage:
+  python query_service.py --db out/results.sqlite --port 8765
+  curl 'http://127.0.0.1:8765/matchup?grid=6&a=Deep2&b=Heuristic1&runs=5'
+  python query_loadtest.py --url http://127.0.0.1:8765 --requests 20000
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from intervals import wilson_ci
+from warehouse import DEFAULT_DB, TIMING_COLS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+POLL_S = 1.0
+SELECTION_CACHE = 64   # cached run selections per loaded version
+
+# (run, grid, p1, p2) counters, in the warehouse's matchups columns
+FIELDS = ["n", "p1_wins", "p2_wins", "ties", "p1_unsafe_sum", "p2_unsafe_sum",
+          "p1_streak_sum", "p2_streak_sum", "turns_sum", "turns_sumsq"]
+TIMINGS = list(dict.fromkeys(c[3:] for c in TIMING_COLS))   # ai_mean_ms, ..., apply_p95_ms
+
+
+class QueryError(Exception):
+    """A bad request: answered with 400 and the message."""
+
+
+def _jsonable(v):
+    """Plain JSON types; NaN becomes None."""
+    if isinstance(v, dict):
+        return {k: _jsonable(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_jsonable(x) for x in v]
+    if isinstance(v, np.integer):
+        return int(v)
+    if isinstance(v, (float, np.floating)):
+        return None if math.isnan(v) else float(v)
+    return v
+
+
+def _ratio(num, den):
+    return float(num) / float(den) if den else float("nan")
+
+
+# ---------- data ----------
+
+class Tables:
+    """One loaded version of the warehouse as dense (run, grid, agent, agent) arrays."""
+
+    def __init__(self, runs, grids, agents, counts, timing, weight, version):
+        self.runs = runs            # [(run_id, label)] by run_id
+        self.grids = grids          # sorted ints
+        self.agents = agents        # sorted names
+        self.counts = counts        # (len(FIELDS), R, G, A, A) int64
+        self.timing = timing        # (len(TIMINGS), R, G, agent, opponent): summary value × games, both seats
+        self.weight = weight        # same shape: summary games where the value is known
+        self.version = version
+        self.loaded_at = time.time()
+        self._grid = {g: i for i, g in enumerate(grids)}
+        self._agent = {a: i for i, a in enumerate(agents)}
+        self._label = {label: i for i, (_, label) in enumerate(runs)}
+        self._sums = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, db, version=None):
+        conn = sqlite3.connect(f"file:{Path(db).resolve()}?mode=ro", uri=True)
+        try:
+            conn.execute("BEGIN")   # one snapshot across the three reads
+            runs = conn.execute("SELECT run_id, label FROM runs ORDER BY run_id").fetchall()
+            rows = conn.execute(f"SELECT run_id, grid, p1_ai, p2_ai, {', '.join(FIELDS)} FROM matchups").fetchall()
+            trows = conn.execute(f"SELECT run_id, grid, p1_ai, p2_ai, games, {', '.join(TIMING_COLS)} "
+                                 "FROM summary").fetchall()
+        finally:
+            conn.close()
+        grids = sorted({r[1] for r in rows})
+        agents = sorted({r[2] for r in rows} | {r[3] for r in rows})
+        run_ix = {run_id: i for i, (run_id, _) in enumerate(runs)}
+        grid_ix, agent_ix = {g: i for i, g in enumerate(grids)}, {a: i for i, a in enumerate(agents)}
+        shape = (len(runs), len(grids), len(agents), len(agents))
+
+        counts = np.zeros((len(FIELDS),) + shape, dtype=np.int64)
+        if rows:
+            idx = tuple(np.array([[run_ix[r[0]], grid_ix[r[1]], agent_ix[r[2]], agent_ix[r[3]]] for r in rows]).T)
+            counts[(slice(None),) + idx] = np.array([[v or 0 for v in r[4:]] for r in rows], dtype=np.int64).T
+
+        timing = np.zeros((len(TIMINGS),) + shape)
+        weight = np.zeros((len(TIMINGS),) + shape)
+        trows = [r for r in trows if r[0] in run_ix and r[1] in grid_ix and r[2] in agent_ix and r[3] in agent_ix]
+        if trows:
+            idx = tuple(np.array([[run_ix[r[0]], grid_ix[r[1]], agent_ix[r[2]], agent_ix[r[3]]] for r in trows]).T)
+            games = np.array([r[4] or 0 for r in trows], dtype=float)
+            vals = np.array([[np.nan if v is None else v for v in r[5:]] for r in trows], dtype=float)
+            w = np.where(np.isnan(vals), 0.0, games[:, None])
+            weighted = np.nan_to_num(vals) * w
+            for role in ("p1", "p2"):   # P1's values land at (p1, p2), P2's at (p2, p1)
+                cols = [TIMING_COLS.index(f"{role}_{t}") for t in TIMINGS]
+                cell = idx if role == "p1" else (idx[0], idx[1], idx[3], idx[2])
+                np.add.at(timing, (slice(None),) + cell, weighted[:, cols].T)
+                np.add.at(weight, (slice(None),) + cell, w[:, cols].T)
+        return cls(runs, grids, agents, counts, timing, weight, version)
+
+    # ---------- selection ----------
+
+    def select_runs(self, spec):
+        """Run indices for `runs=` (None: all; an integer N: the last N; else comma-separated labels)."""
+        if not spec:
+            return tuple(range(len(self.runs)))
+        if spec.isdigit():
+            n = int(spec)
+            if n < 1:
+                raise QueryError("runs must be at least 1")
+            return tuple(range(max(0, len(self.runs) - n), len(self.runs)))
+        labels = [s for s in spec.split(",") if s]
+        missing = [s for s in labels if s not in self._label]
+        if missing:
+            raise QueryError(f"unknown run {missing[0]!r}")
+        return tuple(sorted({self._label[s] for s in labels}))
+
+    def sums(self, sel):
+        """Totals over the selected runs; cached per selection."""
+        with self._lock:
+            hit = self._sums.get(sel)
+        if hit is not None:
+            return hit
+        ix = list(sel)
+        out = Totals(self.counts[:, ix].sum(axis=1), self.timing[:, ix].sum(axis=1), self.weight[:, ix].sum(axis=1))
+        with self._lock:
+            if len(self._sums) >= SELECTION_CACHE:
+                self._sums.pop(next(iter(self._sums)))
+            self._sums[sel] = out
+        return out
+
+    def grid_index(self, value):
+        try:
+            g = int(str(value).lower().split("x")[0])
+        except ValueError:
+            raise QueryError(f"bad grid {value!r}") from None
+        if g not in self._grid:
+            raise QueryError(f"unknown grid {g} (loaded: {self.grids})")
+        return self._grid[g]
+
+    def agent_index(self, name):
+        if name not in self._agent:
+            raise QueryError(f"unknown agent {name!r}")
+        return self._agent[name]
+
+
+class Totals:
+    """Counters and timings of one run selection, with the per-agent and per-grid margins a query reads."""
+
+    def __init__(self, counts, timing, weight):
+        self.counts = counts                     # (len(FIELDS), G, A, A)
+        self.as_p1 = counts.sum(axis=3)          # (len(FIELDS), G, A): the agent in seat 1, every opponent
+        self.as_p2 = counts.sum(axis=2)          # same, seat 2
+        self.grid = counts.sum(axis=(2, 3))      # (len(FIELDS), G)
+        self.timing, self.weight = timing, weight
+        self.agent_timing, self.agent_weight = timing.sum(axis=3), weight.sum(axis=3)
+
+
+# ---------- queries ----------
+
+def _fields(values):
+    return dict(zip(FIELDS, values.tolist()))
+
+
+def _p1_rate(wins, ties, losses, tie):
+    """analysis.p1_winrate on counts: (p, lo, hi, n_rows)."""
+    n_rows = wins + ties + losses
+    if tie == "exclude":
+        lo, hi = wilson_ci(wins, wins + losses)
+        return _ratio(wins, wins + losses), lo, hi, n_rows
+    return _ratio(wins + 0.5 * ties, n_rows), float("nan"), float("nan"), n_rows
+
+
+def _timings(num, den):
+    """Games-weighted timing per TIMINGS name."""
+    return dict(zip(TIMINGS, np.divide(num, den, out=np.full(len(TIMINGS), np.nan), where=den > 0).tolist()))
+
+
+def _length(n, s, ss):
+    """Mean and sample std of p1_turns + p2_turns from games, sum and sum of squares."""
+    std = math.sqrt((n * ss - s * s) / (n * (n - 1))) if n > 1 else float("nan")
+    return {"games": n, "turns_mean": _ratio(s, n), "turns_std": std}
+
+
+def agent_stats(t, tot, g, a):
+    """One agent on one grid, both seats, all opponents (analyze_all's role-stacked means)."""
+    p1, p2 = _fields(tot.as_p1[:, g, a]), _fields(tot.as_p2[:, g, a])
+    games = p1["n"] + p2["n"]
+    wins = p1["p1_wins"] + p2["p2_wins"]
+    losses = p1["p2_wins"] + p2["p1_wins"]
+    ties = games - wins - losses
+    lo, hi = wilson_ci(wins, wins + losses)
+    return {
+        "grid": t.grids[g], "agent": t.agents[a], "games": games, "wins": wins, "losses": losses, "ties": ties,
+        "win_rate": _ratio(wins, wins + losses), "win_rate_lo": lo, "win_rate_hi": hi,
+        "tie_rate": _ratio(ties, games),
+        "unsafe_mean": _ratio(p1["p1_unsafe_sum"] + p2["p2_unsafe_sum"], games),
+        "longest_streak_mean": _ratio(p1["p1_streak_sum"] + p2["p2_streak_sum"], games),
+        **_timings(tot.agent_timing[:, g, a], tot.agent_weight[:, g, a]),
+    }
+
+
+def matchup(t, tot, g, a, b, tie):
+    """A vs B on one grid, both seat orders (a single cell when A is B)."""
+    ab = _fields(tot.counts[:, g, a, b])
+    ba = _fields(tot.counts[:, g, b, a]) if a != b else dict.fromkeys(FIELDS, 0)
+    games = ab["n"] + ba["n"]
+    a_wins, b_wins = ab["p1_wins"] + ba["p2_wins"], ab["p2_wins"] + ba["p1_wins"]
+    ties = games - a_wins - b_wins
+    out = {"grid": t.grids[g], "agent_A": t.agents[a], "agent_B": t.agents[b],
+           "games": games, "A_wins": a_wins, "B_wins": b_wins, "ties": ties,
+           "A_win_rate": _ratio(a_wins, games), "B_win_rate": _ratio(b_wins, games), "tie_rate": _ratio(ties, games)}
+    if a != b:
+        p1, lo1, hi1, n1 = _p1_rate(ab["p1_wins"], ab["ties"], ab["p2_wins"], tie)
+        p2, lo2, hi2, n2 = _p1_rate(ba["p1_wins"], ba["ties"], ba["p2_wins"], tie)
+        out.update({"tie": tie, "p_A_to_B": p1, "p_A_to_B_lo": lo1, "p_A_to_B_hi": hi1, "n_AB": n1,
+                    "p_B_to_A": p2, "p_B_to_A_lo": lo2, "p_B_to_A_hi": hi2, "n_BA": n2,
+                    "s": 0.5 * (p1 + (1 - p2)), "Delta": p1 - (1 - p2)})
+    out.update(_length(games, ab["turns_sum"] + ba["turns_sum"], ab["turns_sumsq"] + ba["turns_sumsq"]))
+    seats = 2 * games if a == b else games
+    for key, me, other, first, second in (("A", a, b, ab, ba), ("B", b, a, ba, ab)):
+        if a == b:
+            first = second = ab
+        out[key] = {
+            "unsafe_mean": _ratio(first["p1_unsafe_sum"] + second["p2_unsafe_sum"], seats),
+            "longest_streak_mean": _ratio(first["p1_streak_sum"] + second["p2_streak_sum"], seats),
+            **_timings(tot.timing[:, g, me, other], tot.weight[:, g, me, other]),
+        }
+    return out
+
+
+# ---------- service ----------
+
+class Service:
+    def __init__(self, db, poll_s=POLL_S):
+        self.db = Path(db)
+        self.poll_s = poll_s
+        self.tables = None
+        self.reloads = 0
+
+    def signature(self):
+        sig = []
+        for p in (self.db, self.db.with_name(self.db.name + "-wal")):
+            try:
+                st = p.stat()
+                sig.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                sig.append(None)
+        return tuple(sig)
+
+    def reload(self):
+        sig = self.signature()
+        t0 = time.perf_counter()
+        tables = Tables.load(self.db, version=sig)
+        self.tables, self.reloads = tables, self.reloads + 1   # swap: in-flight queries keep the old object
+        print(f"loaded {len(tables.runs)} runs, {len(tables.grids)} grids, {len(tables.agents)} agents "
+              f"in {(time.perf_counter() - t0) * 1e3:.0f} ms", flush=True)
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll_s)
+            if self.signature() == self.tables.version:
+                continue
+            try:
+                await asyncio.to_thread(self.reload)
+            except sqlite3.Error as e:   # e.g. mid-ingest; retried on the next poll
+                print(f"reload failed, keeping the previous data: {e}", flush=True)
+
+    def answer(self, target):
+        """(status, payload) for one GET target."""
+        url = urlsplit(target)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        t = self.tables
+        if url.path == "/health":
+            return 200, {"status": "ok", "runs": len(t.runs), "version": list(t.version), "reloads": self.reloads,
+                         "loaded_at": t.loaded_at}
+        if url.path == "/runs":
+            return 200, {"runs": [{"run_id": r, "label": l} for r, l in t.runs], "grids": t.grids,
+                         "agents": t.agents, "loaded_at": t.loaded_at}
+        if url.path not in ("/matchup", "/agent", "/grid"):
+            return 404, {"error": f"unknown path {url.path}"}
+        if not t.runs:
+            return 503, {"error": "the warehouse has no runs yet"}
+        sel = t.select_runs(q.get("runs"))
+        if not sel:
+            raise QueryError("no runs selected")
+        runs = [t.runs[i][1] for i in sel]
+        if url.path == "/matchup":
+            for k in ("grid", "a", "b"):
+                if k not in q:
+                    raise QueryError(f"missing parameter {k!r}")
+            tie = q.get("tie", "exclude")
+            if tie not in ("exclude", "half"):
+                raise QueryError("tie must be 'exclude' or 'half'")
+            g, a, b = t.grid_index(q["grid"]), t.agent_index(q["a"]), t.agent_index(q["b"])
+            return 200, {**matchup(t, t.sums(sel), g, a, b, tie), "runs": runs}
+        if url.path == "/agent":
+            if "agent" not in q:
+                raise QueryError("missing parameter 'agent'")
+            a = t.agent_index(q["agent"])
+            grids = [t.grid_index(q["grid"])] if "grid" in q else range(len(t.grids))
+            tot = t.sums(sel)
+            return 200, {"agent": t.agents[a], "runs": runs, "grids": [agent_stats(t, tot, g, a) for g in grids]}
+        if "grid" not in q:
+            raise QueryError("missing parameter 'grid'")
+        g, tot = t.grid_index(q["grid"]), t.sums(sel)
+        totals = _fields(tot.grid[:, g])
+        return 200, {"grid": t.grids[g], "runs": runs,
+                     **_length(totals["n"], totals["turns_sum"], totals["turns_sumsq"]),
+                     "agents": [agent_stats(t, tot, g, a) for a in range(len(t.agents))]}
+
+    def respond(self, method, target):
+        if method != "GET":
+            return 405, {"error": "only GET is supported"}
+        try:
+            return self.answer(target)
+        except QueryError as e:
+            return 400, {"error": str(e)}
+
+    async def handle(self, reader, writer):
+        """HTTP/1.1 with keep-alive; one request at a time per connection."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while (h := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip().lower()
+                status, payload = self.respond(method, target)
+                body = json.dumps(_jsonable(payload)).encode()
+                keep = version == "HTTP/1.1" and headers.get("connection") != "close"
+                writer.write(f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep else 'close'}\r\n"
+                             f"\r\n".encode() + body)
+                await writer.drain()
+                if not keep:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"serving {service.db} on http://{host}:{server.sockets[0].getsockname()[1]}", flush=True)
+    async with server:
+        await asyncio.gather(server.serve_forever(), service.watch())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Answer matchup / agent / grid queries from memory over HTTP.")
+    ap.add_argument("--db", type=Path, default=DEFAULT_DB, help="warehouse file (default: out/results.sqlite)")
+    ap.add_argument("--host", default=DEFAULT_HOST, help="interface to listen on")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port (0: any free port)")
+    ap.add_argument("--poll", type=float, default=POLL_S, help="seconds between checks of the warehouse file")
+    args = ap.parse_args()
+
+    if not args.db.exists():
+        print(f"ERROR: warehouse not found at: {args.db} (create it with warehouse.py ingest)"); sys.exit(1)
+    service = Service(args.db, args.poll)
+    try:
+        service.reload()
+    except sqlite3.Error as e:
+        print(f"ERROR: cannot read {args.db}: {e}"); sys.exit(1)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Bradley–Terry ratings with a first-move (P1) advantage per grid.
+
+For an ordered matchup on grid g (agent i as P1, agent j as P2):
+
+    P(P1 wins) = σ(θ_gi − θ_gj + h_g)
+
+Ties count as half a win (--tie half, default) or are dropped (--tie exclude).
+The model is fitted to the aggregated counts, one row per ordered matchup, so
+the cost depends on the number of matchups, not on the number of games.
+
+Ratings are per grid (θ_gi, not one θ_i shared by all grids): an agent's
+strength may change with the board size, and each grid's table stands on its
+own. Every row then involves one grid's ratings and h_g only, so the
+log-likelihood separates by grid and its Hessian is block diagonal. Each grid
+is fitted on its own by Newton–Raphson over its agents + 1 parameters, and
+the cost grows linearly with the number of grids instead of the dense
+(grids·agents + grids)² system. A shared θ_i would couple the blocks and need
+a sparse (or Schur-complement) solve instead. Within a block, gradient and
+Hessian are assembled with np.bincount over the three non-zero design
+entries of every row (+θ_i, −θ_j, +h_g). Self-play rows only inform h.
+A weak Gaussian prior on the ratings (--ridge λ) keeps agents that win or lose
+every game finite. Ratings are centred over the agents that play on the grid,
+and the standard errors come from the inverse Hessian projected onto the
+centred ratings.
+
+Writes:
+  out/ratings.csv               grid, agent, games, rating, se, elo, elo_se
+  out/ratings_p1_advantage.csv  grid, games, h, se, p1_win_prob (σ(h) for equal agents)
+  out/ratings_predicted.csv     per ordered matchup: observed and predicted P1 win
+                                rate and the standardised residual
+
+Elo = 1500 + rating · 400 / ln 10 (so 400 Elo points mean 10:1 odds).
+
+Usage:
+  python ratings.py --summary ../benchmark2_summary.csv
+  python ratings.py --games ../benchmark2_games.csv --chunksize 500000 --tie exclude
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset import DEFAULT_OUT, DEFAULT_SUMMARY
+from streaming import DEFAULT_CHUNKSIZE, KEY, GamesAccumulator
+
+RIDGE = 0.01        # prior precision on each rating
+MAX_ITER = 100
+TOL = 1e-10
+ELO_BASE = 1500.0
+ELO_SCALE = 400.0 / np.log(10.0)
+
+
+def _sigmoid(x):
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+def matchup_outcomes(counts, tie="half"):
+    """(n, y) per ordered matchup row: trials and P1 successes under the tie rule."""
+    w, l, t = (counts[c].to_numpy(dtype=np.float64) for c in ("p1_wins", "p2_wins", "ties"))
+    if tie == "half":
+        return w + l + t, w + 0.5 * t
+    return w + l, w
+
+
+def _fit_block(cols, n, y, pen, max_iter=MAX_ITER, tol=TOL):
+    """
+    Newton–Raphson on one grid's penalised log-likelihood. `cols` holds each
+    row's (P1 rating, P2 rating, h) parameter indices, with design
+    coefficients (+1, −1, +1); `pen` is the prior precision per parameter.
+    Returns (beta, eta, cov, iterations, loglik).
+    """
+    P = len(pen)
+    coef = np.array([1.0, -1.0, 1.0])
+    pair = (cols[:, :, None] * P + cols[:, None, :]).reshape(len(n), 9)
+    pair_coef = np.outer(coef, coef).ravel()
+
+    def objective(beta):
+        eta = beta[cols] @ coef
+        return (np.sum(y * eta - n * np.logaddexp(0.0, eta)) - 0.5 * np.sum(pen * beta**2)), eta
+
+    def hessian(p):
+        w = n * p * (1 - p)
+        H = np.bincount(pair.ravel(), weights=(w[:, None] * pair_coef).ravel(),
+                        minlength=P * P).reshape(P, P)
+        H[np.diag_indices(P)] += pen
+        # agents seen only in self-play, or no P1 data at all, leave empty rows
+        H[np.diag_indices(P)] += (np.diag(H) == 0)
+        return H
+
+    beta = np.zeros(P)
+    ll, eta = objective(beta)
+    it = 0
+    for it in range(1, max_iter + 1):
+        p = _sigmoid(eta)
+        grad = np.bincount(cols.ravel(), weights=((y - n * p)[:, None] * coef).ravel(), minlength=P) - pen * beta
+        step = np.linalg.solve(hessian(p), grad)
+        t = 1.0
+        while True:
+            new_ll, new_eta = objective(beta + t * step)
+            if new_ll >= ll - 1e-12 or t < 1e-8:
+                break
+            t *= 0.5
+        beta, eta, gain, ll = beta + t * step, new_eta, new_ll - ll, new_ll
+        if np.max(np.abs(t * step)) < tol or abs(gain) < tol:
+            break
+    return beta, eta, np.linalg.inv(hessian(_sigmoid(eta))), it, ll
+
+
+def fit_bradley_terry(counts, tie="half", ridge=RIDGE, max_iter=MAX_ITER, tol=TOL):
+    """
+    Fit ratings and per-grid P1 advantage to ordered-matchup counts
+    (columns grid, p1_ai, p2_ai, p1_wins, p2_wins, ties), one grid block at a time.
+    Returns (ratings, advantage, predicted, info).
+    """
+    counts = counts.reset_index(drop=True)
+    n, y = matchup_outcomes(counts, tie)
+    keep = n > 0
+    counts, n, y = counts[keep].reset_index(drop=True), n[keep], y[keep]
+
+    grids = np.sort(counts["grid"].unique())
+    agents = np.array(sorted(set(counts["p1_ai"].astype(str)) | set(counts["p2_ai"].astype(str))))
+    G, A = len(grids), len(agents)
+    g = np.searchsorted(grids, counts["grid"].to_numpy())
+    i = np.searchsorted(agents, counts["p1_ai"].astype(str).to_numpy())
+    j = np.searchsorted(agents, counts["p2_ai"].astype(str).to_numpy())
+
+    # outputs: θ[g, a] at g·A + a, then h[g] at G·A + g (NaN where an agent does not play)
+    beta_c = np.full(G * A + G, np.nan)
+    se = np.full(G * A + G, np.nan)
+    p = np.empty(len(n))
+    it, ll, P = 0, 0.0, 0
+    by_grid = np.argsort(g, kind="stable")
+    bounds = np.searchsorted(g[by_grid], np.arange(G + 1))
+    for k in range(G):
+        rows = by_grid[bounds[k]:bounds[k + 1]]
+        present = np.unique(np.r_[i[rows], j[rows]])
+        Ak = len(present)
+        cols = np.stack([np.searchsorted(present, i[rows]), np.searchsorted(present, j[rows]),
+                         np.full(len(rows), Ak)], axis=1)
+        beta, eta, cov, it_k, ll_k = _fit_block(cols, n[rows], y[rows], np.r_[np.full(Ak, ridge), 0.0],
+                                                max_iter, tol)
+        # centre the ratings: θ_c = C θ with C = I − 1/Ak on the rating block
+        C = np.eye(Ak + 1)
+        C[:Ak, :Ak] -= 1.0 / Ak
+        idx = np.r_[k * A + present, G * A + k]
+        beta_c[idx] = C @ beta
+        se[idx] = np.sqrt(np.clip(np.diag(C @ cov @ C.T), 0, None))
+        p[rows] = _sigmoid(eta)
+        it, ll, P = max(it, it_k), ll + ll_k, P + Ak + 1
+    w = n * p * (1 - p)
+
+    games = (pd.concat([pd.DataFrame({"grid": counts["grid"], "agent": counts[f"{r}_ai"].astype(str), "n": n})
+                        for r in ("p1", "p2")])
+               .groupby(["grid", "agent"])["n"].sum())
+    gg, aa = np.meshgrid(grids, agents, indexing="ij")
+    ratings = pd.DataFrame({"grid": gg.ravel(), "agent": aa.ravel(),
+                            "rating": beta_c[:G * A], "se": se[:G * A]})
+    ratings["games"] = games.reindex(pd.MultiIndex.from_frame(ratings[["grid", "agent"]])).to_numpy()
+    ratings = ratings[ratings["games"].notna()].copy()
+    ratings["games"] = ratings["games"].astype(np.int64)
+    ratings["elo"] = ELO_BASE + ELO_SCALE * ratings["rating"]
+    ratings["elo_se"] = ELO_SCALE * ratings["se"]
+    ratings = (ratings[["grid", "agent", "games", "rating", "se", "elo", "elo_se"]]
+                 .sort_values(["grid", "rating"], ascending=[True, False]).reset_index(drop=True))
+
+    advantage = pd.DataFrame({"grid": grids,
+                              "games": np.bincount(g, weights=n, minlength=G).astype(np.int64),
+                              "h": beta_c[G * A:], "se": se[G * A:]})
+    advantage["p1_win_prob"] = _sigmoid(advantage["h"].to_numpy())
+
+    predicted = counts[KEY].copy()
+    predicted["games"] = n.astype(np.int64)
+    predicted["observed"] = y / n
+    predicted["predicted"] = p
+    with np.errstate(divide="ignore", invalid="ignore"):
+        predicted["residual_z"] = np.where(w > 0, (y - n * p) / np.sqrt(w), 0.0)
+    predicted = predicted.sort_values(KEY).reset_index(drop=True)
+
+    info = {"iterations": it, "loglik": float(ll), "parameters": P, "matchups": len(n)}
+    return ratings, advantage, predicted, info
+
+
+def counts_from_summary(summary):
+    s = summary.copy()
+    s["grid"] = s["grid"].astype(int)
+    return s[KEY + ["p1_wins", "p2_wins", "ties"]]
+
+
+def counts_from_games(path, chunksize=DEFAULT_CHUNKSIZE):
+    o = GamesAccumulator.from_csv(path, chunksize=chunksize).ordered()
+    return o[KEY + ["p1_wins", "p2_wins", "ties"]]
+
+
+def win_matrix(predicted, grid, value):
+    """P1 (rows) × P2 (columns) matrix of `value` ('observed' / 'predicted') on one grid."""
+    return predicted[predicted["grid"] == grid].pivot(index="p1_ai", columns="p2_ai", values=value)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Bradley–Terry ratings with a per-grid P1 advantage.")
+    ap.add_argument("--summary", type=Path, default=DEFAULT_SUMMARY, help="Path to benchmark2_summary.csv")
+    ap.add_argument("--games", type=Path, default=None,
+                    help="fit from a per-game CSV instead (streamed in chunks)")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows per chunk with --games")
+    ap.add_argument("--out", type=Path, default=DEFAULT_OUT, help="Output directory for the rating CSVs")
+    ap.add_argument("--tie", choices=["half", "exclude"], default="half", help="tie handling")
+    ap.add_argument("--ridge", type=float, default=RIDGE,
+                    help="prior precision on each rating (keeps unbeaten agents finite)")
+    args = ap.parse_args()
+
+    if args.games is not None:
+        if not args.games.exists():
+            print(f"ERROR: games CSV not found at: {args.games}"); sys.exit(1)
+        counts = counts_from_games(args.games, args.chunksize)
+    else:
+        if not args.summary.exists():
+            print(f"ERROR: summary CSV not found at: {args.summary}"); sys.exit(1)
+        counts = counts_from_summary(pd.read_csv(args.summary))
+    args.out.mkdir(parents=True, exist_ok=True)
+
+    ratings, advantage, predicted, info = fit_bradley_terry(counts, tie=args.tie, ridge=args.ridge)
+    ratings.to_csv(args.out / "ratings.csv", index=False)
+    advantage.to_csv(args.out / "ratings_p1_advantage.csv", index=False)
+    predicted.to_csv(args.out / "ratings_predicted.csv", index=False)
+
+    print(f"Fitted {info['parameters']} parameters to {info['matchups']} ordered matchups "
+          f"in {info['iterations']} Newton steps (log-lik {info['loglik']:.2f})")
+    for grid, sub in ratings.groupby("grid"):
+        adv = advantage[advantage["grid"] == grid].iloc[0]
+        print(f"\n{grid}x{grid}: P1 advantage h={adv['h']:+.3f} ± {adv['se']:.3f} "
+              f"(P1 wins {100*adv['p1_win_prob']:.1f}% between equal agents)")
+        for r in sub.itertuples(index=False):
+            print(f"  {r.agent:12s} Elo {r.elo:7.1f} ± {r.elo_se:5.1f}  ({r.games} games)")
+        print("  observed / predicted P1 win rate:")
+        obs, pred = win_matrix(predicted, grid, "observed"), win_matrix(predicted, grid, "predicted")
+        both = obs.map(lambda v: f"{v:.2f}") + " / " + pred.map(lambda v: f"{v:.2f}")
+        print("  " + both.to_string().replace("\n", "\n  "))
+    print("\nWrote:" + "".join(f"\n - {args.out / n}" for n in
+                               ("ratings.csv", "ratings_p1_advantage.csv", "ratings_predicted.csv")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Single-pass driver: load the benchmark CSVs once and run a chosen set of
+analyses and figure generators against the shared Dataset.
+
+Each analysis/figure is a plug-in registered with @task(name, deps=...). The
+scheduler resolves the selected tasks plus their dependencies into a DAG and runs
+every task whose dependencies are done on a thread pool, so independent analyses
+overlap while sharing one in-memory frame (no per-worker copies). Figure tasks
+are serialised on a lock because pyplot keeps global state.
+
+With --profile (or EVAL_PROFILE=1) the load, normalize and every task become
+profiled stages, written to <out>/profile_run_all.{json,csv}; tasks then run
+one at a time so each stage's CPU and memory figures are its own.
+
+Usage:
+  python run_all.py                               # everything
+  python run_all.py --only tables --jobs 4        # CSV/LaTeX outputs only
+  python run_all.py --only fig_heatmaps validate  # plus their dependencies
+  python run_all.py --profile --cprofile          # + per-stage .prof dumps
+  python run_all.py --list
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")  # before make_figures imports pyplot
+
+import pandas as pd
+
+import analysis
+import analyze_all
+import latency
+import make_figures
+import ratings
+import validate_inputs
+from dataset import DEFAULT_GAMES, DEFAULT_OUT, DEFAULT_SUMMARY, Dataset
+from profiling import Profiler, add_profile_args
+
+_PLOT_LOCK = threading.Lock()
+
+
+class Task:
+    def __init__(self, name, fn, deps=(), kind="table", help=""):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.kind = kind      # "table" | "figure" | "check" | "data"
+        self.help = help
+
+
+class Context:
+    """What a task sees: the shared dataset, output dirs and results of its deps."""
+
+    def __init__(self, data, out_dir, fig_dir, tie="exclude", prof=None):
+        self.data = data
+        self.out_dir = out_dir
+        self.fig_dir = fig_dir
+        self.tie = tie
+        self.prof = prof or Profiler()
+        self.results = {}
+
+
+REGISTRY = {}
+
+
+def task(name, deps=(), kind="table"):
+    def register(fn):
+        REGISTRY[name] = Task(name, fn, deps=deps, kind=kind, help=(fn.__doc__ or "").strip())
+        return fn
+    return register
+
+
+# ---------- scheduler ----------
+
+def resolve(names, registry=REGISTRY):
+    """Selected tasks plus their transitive deps, in a valid topological order."""
+    order, done, visiting = [], set(), set()
+
+    def visit(n):
+        if n in done:
+            return
+        if n not in registry:
+            raise KeyError(f"unknown task {n!r}; see --list")
+        if n in visiting:
+            raise ValueError(f"dependency cycle through {n!r}")
+        visiting.add(n)
+        for d in registry[n].deps:
+            visit(d)
+        visiting.discard(n)
+        done.add(n)
+        order.append(n)
+
+    for n in names:
+        visit(n)
+    return order
+
+
+def _run_one(t, ctx):
+    if t.kind == "figure":
+        with _PLOT_LOCK, ctx.prof.stage(t.name):
+            t0 = time.perf_counter()
+            return t.fn(ctx), time.perf_counter() - t0
+    with ctx.prof.stage(t.name):
+        t0 = time.perf_counter()
+        return t.fn(ctx), time.perf_counter() - t0
+
+
+def run_dag(names, ctx, jobs=1, registry=REGISTRY):
+    """Run `names` (already dependency-closed) respecting deps; returns {task: seconds}."""
+    pending = {n: set(registry[n].deps) for n in names}
+    timings = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        running = {}
+
+        def launch():
+            for n in [n for n, d in pending.items() if not d]:
+                del pending[n]
+                running[ex.submit(_run_one, registry[n], ctx)] = n
+
+        launch()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                n = running.pop(f)
+                ctx.results[n], timings[n] = f.result()
+                for d in pending.values():
+                    d.discard(n)
+            launch()
+    return timings
+
+
+# ---------- plug-ins: tables ----------
+
+@task("wins_unordered")
+def _wins_unordered(ctx):
+    """Unordered wins/ties per matchup (summary CSV) -> wins_unordered.csv"""
+    out = analyze_all.wins_unordered(ctx.data.summary)
+    out.to_csv(ctx.out_dir / "wins_unordered.csv", index=False)
+    return out
+
+
+@task("unsafe_games", kind="data")
+def _unsafe_games(ctx):
+    """Unsafe-move means per agent & grid from per-game rows"""
+    return analyze_all.unsafe_by_agent_games(ctx.data.games)
+
+
+@task("unsafe_summary", kind="data")
+def _unsafe_summary(ctx):
+    """Unsafe-move means per agent & grid from summary rows"""
+    return analyze_all.unsafe_by_agent_summary(ctx.data.summary)
+
+
+@task("unsafe_both", deps=("unsafe_summary", "unsafe_games"))
+def _unsafe_both(ctx):
+    """Side-by-side unsafe means -> unsafe_by_agent_summary_vs_games.csv"""
+    out = (pd.merge(ctx.results["unsafe_summary"], ctx.results["unsafe_games"],
+                    on=['grid','agent'], how='outer')
+             .sort_values(['grid','agent'])
+             .reset_index(drop=True))
+    out.to_csv(ctx.out_dir / "unsafe_by_agent_summary_vs_games.csv", index=False)
+    return out
+
+
+@task("game_length")
+def _game_length(ctx):
+    """Turns per game by grid and unordered pair -> game_length_by_grid.csv"""
+    out = analyze_all.game_length_by_grid(ctx.data.games)
+    out.to_csv(ctx.out_dir / "game_length_by_grid.csv", index=False)
+    return out
+
+
+@task("streaks")
+def _streaks(ctx):
+    """Longest scoring streak per agent & grid -> longest_streak_by_agent.csv"""
+    out = analyze_all.streaks_by_agent(ctx.data.games)
+    out.to_csv(ctx.out_dir / "longest_streak_by_agent.csv", index=False)
+    return out
+
+
+@task("agent_metrics")
+def _agent_metrics(ctx):
+    """Per-role metric distributions per agent & grid -> agent_metrics.csv"""
+    out = analyze_all.agent_metrics(ctx.data.games)
+    out.to_csv(ctx.out_dir / "agent_metrics.csv", index=False)
+    return out
+
+
+@task("latency")
+def _latency(ctx):
+    """Timing aggregates, scaling fits and p95 drift -> latency_*.csv"""
+    lat = latency.latency_by_agent(ctx.data.games)
+    fits = latency.fit_scaling(lat)
+    lat.to_csv(ctx.out_dir / "latency_by_agent.csv", index=False)
+    fits.to_csv(ctx.out_dir / "latency_scaling.csv", index=False)
+    latency.p95_drift(ctx.data.summary, ctx.data.games).to_csv(ctx.out_dir / "latency_drift.csv", index=False)
+    return lat, fits
+
+
+@task("ratings")
+def _ratings(ctx):
+    """Bradley-Terry ratings + per-grid P1 advantage (summary counts) -> ratings*.csv"""
+    rt, adv, pred, _ = ratings.fit_bradley_terry(ratings.counts_from_summary(ctx.data.summary))
+    rt.to_csv(ctx.out_dir / "ratings.csv", index=False)
+    adv.to_csv(ctx.out_dir / "ratings_p1_advantage.csv", index=False)
+    pred.to_csv(ctx.out_dir / "ratings_predicted.csv", index=False)
+    return rt, adv, pred
+
+
+@task("order_summary")
+def _order_summary(ctx):
+    """p_{A->B}, p_{B->A}, s(A,B), Delta(A,B) -> order_summary.tex + _metrics.csv"""
+    df = analysis.normalize_games(ctx.data.games, "grid", "p1_ai", "p2_ai", "p1_score", "p2_score")
+    agents = sorted(set(df["P1A"]).union(set(df["P2A"])))
+    grids  = sorted(df["GRID"].unique())
+    out = analysis.order_summary_from_counts(analysis.matchup_counts(df), grids, agents, ctx.tie)
+    analysis.write_order_summary(out, grids, ctx.out_dir / "order_summary.tex")
+    return out
+
+
+@task("validate", kind="check")
+def _validate(ctx):
+    """Summary <-> per-game cross-checks (returns the list of failures)"""
+    return validate_inputs.check_games(ctx.data.summary, ctx.data.games)
+
+
+# ---------- plug-ins: figures ----------
+
+@task("winrates", kind="data")
+def _winrates(ctx):
+    """P1 win rate (%) per ordered matchup from per-game rows, as a dense tensor"""
+    return make_figures.WinrateTensor.from_frame(make_figures.p1_winrate_from_games(ctx.data.games))
+
+
+@task("fig_heatmaps", deps=("winrates",), kind="figure")
+def _fig_heatmaps(ctx):
+    """winrate_heatmap_<n>x<n>.png per grid"""
+    T = ctx.results["winrates"]
+    for g in T.grids.tolist():
+        make_figures.plot_winrate_heatmap(T, g, ctx.fig_dir)
+
+
+@task("fig_slope", deps=("winrates",), kind="figure")
+def _fig_slope(ctx):
+    """slope_winrates_selected_pairs.png"""
+    make_figures.plot_slope_selected_pairs(ctx.results["winrates"], ctx.fig_dir)
+
+
+@task("fig_unsafe_boxplot", kind="figure")
+def _fig_unsafe_boxplot(ctx):
+    """unsafe_boxplot_6x6.png (skipped without 6x6 games)"""
+    if 6 in ctx.data.grids:
+        make_figures.plot_unsafe_boxplot_at_6(ctx.data.games, ctx.fig_dir)
+
+
+@task("fig_hbar_unsafe", kind="figure")
+def _fig_hbar_unsafe(ctx):
+    """hbar_unsafe_matchups_6x6.png (skipped without 6x6 games)"""
+    if 6 in ctx.data.grids:
+        make_figures.plot_hbar_unsafe_matchups_6(ctx.data.games, ctx.fig_dir)
+
+
+@task("fig_streaks", kind="figure")
+def _fig_streaks(ctx):
+    """streak_errorbars.png"""
+    make_figures.plot_streak_errorbars(ctx.data.games, ctx.fig_dir)
+
+
+@task("fig_latency", deps=("latency",), kind="figure")
+def _fig_latency(ctx):
+    """latency_heatmap_ai_p95.png, latency_scaling_ai_p95.png"""
+    lat, fits = ctx.results["latency"]
+    latency.plot_latency_heatmap(lat, "ai_p95", ctx.fig_dir)
+    latency.plot_latency_scaling(lat, fits, "ai_p95", ctx.fig_dir)
+
+
+GROUPS = {
+    "tables":  lambda: [n for n, t in REGISTRY.items() if t.kind == "table"],
+    "figures": lambda: [n for n, t in REGISTRY.items() if t.kind == "figure"],
+    "all":     lambda: list(REGISTRY),
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run analyses and figures over one shared load of the benchmark CSVs.")
+    ap.add_argument("--summary", type=Path, default=DEFAULT_SUMMARY, help="Path to benchmark2_summary.csv")
+    ap.add_argument("--games",   type=Path, default=DEFAULT_GAMES,   help="Path to benchmark2_games.csv")
+    ap.add_argument("--out",     type=Path, default=DEFAULT_OUT,     help="Output directory for CSV/LaTeX outputs")
+    ap.add_argument("--figs",    type=Path, default=None,
+                    help="Output directory for PNGs (default: <games dir>/figs_eval2)")
+    ap.add_argument("--only", nargs="+", default=["all"],
+                    help="task names and/or groups (tables, figures, all)")
+    ap.add_argument("--jobs", type=int, default=4, help="worker threads for independent tasks")
+    ap.add_argument("--tie", choices=["exclude","half"], default="exclude",
+                    help="tie handling for order_summary")
+    ap.add_argument("--cache", action="store_true",
+                    help="Read via the columnar cache (.eval_cache/ next to the CSVs; needs pyarrow)")
+    ap.add_argument("--list", action="store_true", help="list tasks and exit")
+    add_profile_args(ap)
+    args = ap.parse_args()
+
+    if args.list:
+        for n, t in REGISTRY.items():
+            deps = f"  [after: {', '.join(t.deps)}]" if t.deps else ""
+            print(f"{n:20s} {t.kind:7s} {t.help}{deps}")
+        return
+
+    selected = []
+    for n in args.only:
+        selected.extend(GROUPS[n]() if n in GROUPS else [n])
+    try:
+        names = resolve(selected)
+    except (KeyError, ValueError) as e:
+        print(f"ERROR: {e.args[0]}"); sys.exit(1)
+
+    if not args.summary.exists():
+        print(f"ERROR: summary CSV not found at: {args.summary}"); sys.exit(1)
+    if not args.games.exists():
+        print(f"ERROR: games CSV not found at: {args.games}"); sys.exit(1)
+    args.out.mkdir(parents=True, exist_ok=True)
+    fig_dir = make_figures.ensure_out(args.figs or args.games.parent / "figs_eval2")
+
+    prof = Profiler.from_args(args, args.out, "run_all")
+    if prof.enabled and args.jobs > 1:
+        print("profiling: running tasks one at a time (--jobs 1)")
+        args.jobs = 1
+
+    t0 = time.perf_counter()
+    data = Dataset.load(args.summary, args.games, cache=args.cache, prof=prof)
+    load_s = time.perf_counter() - t0
+
+    ctx = Context(data, args.out, fig_dir, tie=args.tie, prof=prof)
+    timings = run_dag(names, ctx, jobs=args.jobs)
+
+    print(f"load: {load_s:.2f}s ({len(data.games)} games, {len(data.summary)} summary rows)")
+    for n in names:
+        print(f"{n:20s} {timings[n]:6.2f}s")
+    print(f"Outputs in: {args.out.resolve()}  figures in: {fig_dir.resolve()}")
+    prof.write()
+
+    errs = ctx.results.get("validate")
+    if errs:
+        validate_inputs.report(errs)   # prints failures and exits 1
+    elif "validate" in ctx.results:
+        print("All summary↔games (order-preserving) cross-checks PASSED.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Batch simulator of the Game rules (lib/src/game.dart) in NumPy.
+
+Thousands of boards of one grid size advance in lockstep. Every game on an
+n×n grid lasts exactly E = 2·n·(n+1) moves, so step t plays one edge on every
+board. The state per board is:
+
+  edges  drawn edges as a bit mask, packed into ⌈E/64⌉ uint64 words
+  sides  drawn sides per box (an incidence counter, updated through the
+         precomputed edge → box table)
+  owner, player, scores
+
+Edge ids follow Game.availableEdges(): horizontal edges row by row, then
+vertical edges row by row. A box is completed when its side counter reaches
+4. The mover keeps the turn after completing a box (extra-turn rule).
+
+The agents are vectorised over the side counters:
+
+  Random      uniform over the free edges
+  Heuristic1  uniform over the safe edges (those after which no box has
+              three sides, i.e. givesBoxToOpponent is false), else over all
+  Deep2       best (own gain − opponent's best single-edge reply), ties
+              broken uniformly
+
+The recorded metrics match benchmark.dart: scores, unsafe moves, turns and
+longest streak per seat. The double-cross count (moves that complete two
+boxes at once) is added. replay() runs logged move streams through the same
+rules and returns the same per-game columns. Timings are not simulated.
+With --trace every move is also appended to a binary move trace (traces.py).
+
+Usage:
+  python simulator.py --grids 4 5 6 --agents Random Heuristic1 --games 10000
+  python simulator.py --grids 6 --agents Deep2 Random --games 2000 --seed 7 --out out/sim_games.csv
+  python simulator.py --replay moves.npy --grid 5 --out out/replay_games.csv
+  python simulator.py --grids 5 --agents Heuristic1 Deep2 --trace out/sim_trace.bin
+"""
+
+import argparse
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset import DEFAULT_OUT, DEFAULT_SUMMARY
+from streaming import KEY, ROLES, GamesAccumulator
+from traces import TraceWriter, game_records
+
+SEED = 0
+GAMES = 1000
+BATCH = 4096       # boards advanced together
+GAME_COLUMNS = ["p1_score", "p2_score", "p1_unsafe_moves", "p2_unsafe_moves",
+                "p1_turns", "p2_turns", "p1_longest_streak", "p2_longest_streak",
+                "p1_double_crosses", "p2_double_crosses"]
+
+# ---------- geometry ----------
+
+
+class Geometry:
+    """Edge / box incidence tables for an n×n grid (box id = row·n + col; id n² is 'no box')."""
+
+    def __init__(self, size):
+        n = self.size = size
+        self.n_boxes = B = n * n
+        self.n_edges = E = 2 * n * (n + 1)
+        self.n_words = (E + 63) // 64
+
+        coords = [(x, y, x + 1, y) for y in range(n + 1) for x in range(n)]
+        coords += [(x, y, x, y + 1) for y in range(n) for x in range(n + 1)]
+        self.coords = np.array(coords, dtype=np.int16)
+        index = {c: e for e, c in enumerate(coords)}
+
+        self.edge_boxes = np.full((E, 2), B, dtype=np.intp)
+        self.box_edges = np.empty((B + 1, 4), dtype=np.intp)
+        for r in range(n):
+            for c in range(n):
+                b = r * n + c
+                self.box_edges[b] = (index[(c, r, c + 1, r)], index[(c, r + 1, c + 1, r + 1)],
+                                     index[(c, r, c, r + 1)], index[(c + 1, r, c + 1, r + 1)])
+        self.box_edges[B] = E            # sentinel edge: always reads as drawn
+        for b in range(B):
+            for e in self.box_edges[b]:
+                k = 0 if self.edge_boxes[e, 0] == B else 1
+                self.edge_boxes[e, k] = b
+        # box on the other side of each side of each box (B where the side is on the border)
+        other = np.where(self.edge_boxes[self.box_edges[:B]] == np.arange(B)[:, None, None],
+                         B, self.edge_boxes[self.box_edges[:B]]).min(axis=2)
+        self.neighbour = np.vstack([other, np.full((1, 4), B)]).astype(np.intp)
+
+        # flat (box, side) slot of each edge in box_edges, for per-side box tables
+        self.edge_slots = np.full((E, 2), 4 * B, dtype=np.intp)
+        for k in range(2):
+            b = self.edge_boxes[:, k]
+            real = b < B
+            self.edge_slots[real, k] = 4 * b[real] + np.argmax(self.box_edges[b[real]] == np.arange(E)[real, None], axis=1)
+
+        e = np.arange(E)
+        self.word = (e // 64).astype(np.intp)
+        self.bit = (e % 64).astype(np.uint64)
+
+    def edge_ids(self, coords):
+        """Edge ids of [..., 4] dot coordinates (x1, y1, x2, y2), in either dot order."""
+        c = np.asarray(coords, dtype=np.int64)
+        x, y = np.minimum(c[..., 0], c[..., 2]), np.minimum(c[..., 1], c[..., 3])
+        horiz = c[..., 1] == c[..., 3]
+        n = self.size
+        return np.where(horiz, y * n + x, n * (n + 1) + y * (n + 1) + x)
+
+
+@lru_cache(maxsize=None)
+def geometry(size):
+    return Geometry(size)
+
+
+# ---------- boards ----------
+
+
+class Boards:
+    """N games of one grid size, advanced one move per board per step."""
+
+    def __init__(self, size, n):
+        self.geo = g = geometry(size)
+        self.n = n
+        self.edges = np.zeros((n, g.n_words), dtype=np.uint64)
+        self.sides = np.zeros((n, g.n_boxes + 1), dtype=np.int8)
+        self.sides[:, -1] = -8          # 'no box' never reads as 2, 3 or 4 sides
+        self.three = np.zeros(n, dtype=np.int16)    # boxes with three sides drawn
+        self.owner = np.zeros((n, g.n_boxes), dtype=np.int8)
+        self.player = np.zeros(n, dtype=np.int8)
+        self.scores = np.zeros((n, 2), dtype=np.int16)
+        # undrawn edges as a list per board (swap-remove), for O(1) uniform draws
+        self.free_list = np.tile(np.arange(g.n_edges, dtype=np.int16), (n, 1))
+        self.free_pos = self.free_list.copy()
+        self.n_free = np.full(n, g.n_edges, dtype=np.int16)
+
+    def free(self, rows=slice(None)):
+        """(N, E) mask of undrawn edges."""
+        # as little-endian words, bit i of the mask is bit i % 8 of byte i // 8
+        words = self.edges[rows].astype("<u8", copy=False).view(np.uint8)
+        return np.unpackbits(words, axis=1, count=self.geo.n_edges, bitorder="little") == 0
+
+    def play(self, e):
+        """Draw edge e[i] on board i. Returns the boxes completed per board (0, 1 or 2)."""
+        g, rows = self.geo, np.arange(self.n)
+        w, mask = g.word[e], np.uint64(1) << g.bit[e]
+        drawn = (self.edges[rows, w] & mask) != 0
+        if drawn.any():
+            raise ValueError(f"edge already drawn on {int(drawn.sum())} board(s), "
+                             f"first at board {int(np.flatnonzero(drawn)[0])}")
+        self.edges[rows, w] |= mask
+        i, self.n_free = self.free_pos[rows, e], self.n_free - 1
+        moved = self.free_list[rows, self.n_free]
+        self.free_list[rows, i] = moved
+        self.free_pos[rows, moved] = i
+
+        boxes = g.edge_boxes[e]                            # (N, 2)
+        after = self.sides[rows[:, None], boxes] + 1
+        self.sides[rows[:, None], boxes] = after
+        self.sides[:, -1] = -8
+        done = after == 4
+        gained = done.sum(axis=1)
+        self.three += (after == 3).sum(axis=1, dtype=np.int16) - gained.astype(np.int16)
+        # each box completes exactly once, when its 4th side is drawn
+        r, k = np.nonzero(done)
+        self.owner[r, boxes[r, k]] = self.player[r] + 1
+        self.scores[rows, self.player] += gained.astype(np.int16)
+        self.player = np.where(gained == 0, 1 - self.player, self.player).astype(np.int8)
+        return gained
+
+
+# ---------- agents ----------
+
+
+def unsafe_mask(geo, sides, three):
+    """(N, E): after drawing the edge some box has three sides (givesBoxToOpponent)."""
+    b0, b1 = geo.edge_boxes[:, 0], geo.edge_boxes[:, 1]
+    is2, is3 = sides == 2, sides == 3
+    takes = is3[:, b0].view(np.int8) + is3[:, b1].view(np.int8)
+    return (three[:, None] > takes) | is2[:, b0] | is2[:, b1]
+
+
+def _unsafe_of(geo, sides, three, e):
+    """unsafe_mask for one chosen edge per board."""
+    c = sides[np.arange(len(e))[:, None], geo.edge_boxes[e]]
+    return ((three - (c == 3).sum(axis=1)) > 0) | (c == 2).any(axis=1)
+
+
+def deep2_values(geo, sides, three, free):
+    """
+    (N, E) value of every edge for deep2Move: boxes it completes, or, if it
+    completes none, minus the most boxes the opponent can take with one edge.
+    """
+    b0, b1 = geo.edge_boxes[:, 0], geo.edge_boxes[:, 1]
+    is2, is3 = sides == 2, sides == 3
+    gain = is3[:, b0].view(np.int8) + is3[:, b1].view(np.int8)
+    reply = ((three[:, None] > gain) | is2[:, b0] | is2[:, b1]).view(np.int8)
+    # the opponent takes two boxes with one edge if a free edge lies between
+    # two three-sided boxes, either already or because the edge turns a
+    # two-sided box into one whose last free side borders a three-sided box
+    double = (free & is3[:, b0] & is3[:, b1]).any(axis=1)[:, None]
+    free_x = np.concatenate([free, np.zeros((len(free), 1), dtype=bool)], axis=1)   # sentinel edge = drawn
+    across = free_x[:, geo.box_edges] & is3[:, geo.neighbour]          # (N, B+1, 4)
+    last = is2[:, :, None] & (across.sum(axis=2, dtype=np.int8)[:, :, None] > across)
+    last = last.reshape(len(free), -1)
+    double = double | last[:, geo.edge_slots[:, 0]] | last[:, geo.edge_slots[:, 1]]
+    return np.where(gain > 0, gain, -np.where(double, 2, reply).astype(np.int8))
+
+
+def _pick(mask, rng):
+    """One uniformly chosen True column per row."""
+    k = (rng.random(len(mask)) * mask.sum(axis=1, dtype=np.int16)).astype(np.int16)
+    return np.argmax(np.cumsum(mask, axis=1, dtype=np.int16) > k[:, None], axis=1)
+
+
+# Agents pick one edge for each board in `rows` (an index array into boards).
+
+def random_move(boards, rows, rng):
+    k = (rng.random(len(rows)) * boards.n_free[rows]).astype(np.intp)
+    return boards.free_list[rows, k].astype(np.intp)
+
+
+def heuristic1_move(boards, rows, rng):
+    free = boards.free(rows)
+    safe = free & ~unsafe_mask(boards.geo, boards.sides[rows], boards.three[rows])
+    none = ~safe.any(axis=1)           # no safe edge: any edge
+    safe[none] = free[none]
+    return _pick(safe, rng)
+
+
+def deep2_move(boards, rows, rng):
+    free = boards.free(rows)
+    val = deep2_values(boards.geo, boards.sides[rows], boards.three[rows], free)
+    val = np.where(free, val, np.iinfo(np.int8).min)
+    return _pick(val == val.max(axis=1, keepdims=True), rng)
+
+
+AGENTS = {"Random": random_move, "Heuristic1": heuristic1_move, "Deep2": deep2_move}
+
+
+# ---------- games ----------
+
+
+def _run(boards, choose, trace=None):
+    """
+    Play all E moves; choose(step, boards) returns one edge per board. Returns
+    per-game metrics. With a `trace` dict the (N, E) move arrays are stored in it.
+    """
+    g, n = boards.geo, boards.n
+    rows = np.arange(n)
+    unsafe = np.zeros((n, 2), dtype=np.int16)
+    turns = np.zeros((n, 2), dtype=np.int16)
+    longest = np.zeros((n, 2), dtype=np.int16)
+    doubles = np.zeros((n, 2), dtype=np.int16)
+    streak = np.zeros(n, dtype=np.int16)
+    last = np.full(n, -1, dtype=np.int8)
+    if trace is not None:
+        for k in ("edges", "players", "boxes", "unsafe"):
+            trace[k] = np.zeros((n, g.n_edges), dtype=np.int16)
+    for step in range(g.n_edges):
+        mover = boards.player.copy()
+        streak = np.where(mover != last, 0, streak) + 1
+        last = mover
+        e = choose(step, boards)
+        risky = _unsafe_of(g, boards.sides, boards.three, e)
+        unsafe[rows, mover] += risky
+        gained = boards.play(e)
+        if trace is not None:
+            for k, v in (("edges", e), ("players", mover), ("boxes", gained), ("unsafe", risky)):
+                trace[k][:, step] = v
+        turns[rows, mover] += 1
+        doubles[rows, mover] += gained == 2
+        ends = gained == 0
+        longest[rows[ends], mover[ends]] = np.maximum(longest[rows[ends], mover[ends]], streak[ends])
+    longest[rows, last] = np.maximum(longest[rows, last], streak)
+    return np.column_stack([boards.scores[:, 0], boards.scores[:, 1], unsafe[:, 0], unsafe[:, 1],
+                            turns[:, 0], turns[:, 1], longest[:, 0], longest[:, 1],
+                            doubles[:, 0], doubles[:, 1]])
+
+
+def _frame(grid, p1, p2, first_idx, metrics):
+    df = pd.DataFrame(metrics, columns=GAME_COLUMNS).astype(np.int64)
+    df.insert(0, "game_idx", np.arange(first_idx, first_idx + len(df)))
+    df.insert(0, "p2_ai", p2)
+    df.insert(0, "p1_ai", p1)
+    df.insert(0, "grid", grid)
+    return df
+
+
+def _play(grid, p1, p2, first_idx, boards, choose, trace):
+    """_run one batch; with a TraceWriter also append its moves (zero timings)."""
+    if trace is None:
+        return _frame(grid, p1, p2, first_idx, _run(boards, choose))
+    moves = {}
+    df = _frame(grid, p1, p2, first_idx, _run(boards, choose, moves))
+    games = df[["grid", "p1_ai", "p2_ai", "game_idx"]].copy()
+    games.insert(0, "game", np.arange(trace.next_game, trace.next_game + len(df)))
+    trace.append(game_records(games["game"], moves["edges"], moves["players"], moves["boxes"],
+                              moves["unsafe"]), games)
+    return df
+
+
+def simulate(grid, p1, p2, n_games, rng, batch=BATCH, trace=None):
+    """
+    Play n_games of agent p1 (first mover) vs p2 on an n×n grid. Returns
+    per-game rows; with a traces.TraceWriter the moves are appended to it too.
+    """
+    fns = (AGENTS[p1], AGENTS[p2])
+
+    def choose(step, boards):
+        if fns[0] is fns[1]:
+            return fns[0](boards, np.arange(boards.n), rng)
+        e = np.empty(boards.n, dtype=np.intp)
+        for seat, fn in enumerate(fns):
+            sel = np.flatnonzero(boards.player == seat)
+            if len(sel):
+                e[sel] = fn(boards, sel, rng)
+        return e
+
+    parts = [_play(grid, p1, p2, i, Boards(grid, min(batch, n_games - i)), choose, trace)
+             for i in range(0, n_games, batch)]
+    return pd.concat(parts, ignore_index=True)
+
+
+def replay(grid, moves, p1="replay", p2="replay", trace=None):
+    """
+    Replay logged move streams: (N, E) edge ids, or (N, E, 4) dot coordinates,
+    one full game per row. Raises ValueError on an illegal move.
+    """
+    geo = geometry(grid)
+    moves = np.asarray(moves)
+    if moves.ndim == 3:
+        moves = geo.edge_ids(moves)
+    if moves.ndim != 2 or moves.shape[1] != geo.n_edges:
+        raise ValueError(f"expected (games, {geo.n_edges}) moves for a {grid}x{grid} grid, got {moves.shape}")
+    if moves.min() < 0 or moves.max() >= geo.n_edges:
+        raise ValueError(f"edge ids must lie in [0, {geo.n_edges})")
+    moves = moves.astype(np.intp)
+    return _play(grid, p1, p2, 0, Boards(grid, len(moves)), lambda step, b: moves[:, step], trace)
+
+
+# ---------- reporting ----------
+
+
+def summarize(games):
+    """Per ordered matchup: games, P1/P2 win rates and per-seat means (from GamesAccumulator sums)."""
+    o = GamesAccumulator().update(games).ordered()
+    out = o[KEY].copy()
+    out["games"] = o["n"]
+    for c in ("p1_wins", "p2_wins", "ties"):
+        out[c] = o[c]
+    for metric in ("unsafe", "turns", "streak"):
+        for r in ROLES:
+            out[f"{r}_{metric}_avg"] = o[f"{r}_{metric}_sum"] / o["n"]
+    dc = (games.groupby(KEY)[[f"{r}_double_crosses" for r in ROLES]].mean()
+               .rename(columns=lambda c: f"{c}_avg").reset_index())
+    return out.merge(dc, on=KEY, how="left")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Vectorised Game simulator for baselines and move-stream replays.")
+    ap.add_argument("--grids", type=int, nargs="+", default=[4, 5, 6], help="grid sizes to simulate")
+    ap.add_argument("--agents", nargs="+", default=["Random", "Heuristic1"], choices=sorted(AGENTS),
+                    help="agents to round-robin (every ordered pairing, self-play included)")
+    ap.add_argument("--games", type=int, default=GAMES, help="games per ordered pairing")
+    ap.add_argument("--seed", type=int, default=SEED, help="RNG seed (one child stream per pairing)")
+    ap.add_argument("--batch", type=int, default=BATCH, help="boards advanced together")
+    ap.add_argument("--replay", type=Path, default=None,
+                    help=".npy of logged moves, (games, edges) ids or (games, edges, 4) dot coordinates")
+    ap.add_argument("--grid", type=int, default=None, help="grid size of the --replay moves")
+    ap.add_argument("--summary", type=Path, default=DEFAULT_SUMMARY,
+                    help="logged summary to compare simulated pairings against (skipped if missing)")
+    ap.add_argument("--out", type=Path, default=DEFAULT_OUT / "sim_games.csv", help="per-game CSV path")
+    ap.add_argument("--trace", type=Path, default=None,
+                    help="also append every move to this binary trace (see traces.py)")
+    args = ap.parse_args()
+
+    trace = None
+    if args.trace is not None:
+        try:
+            trace = TraceWriter(args.trace)
+        except ValueError as e:
+            print(f"ERROR: {e}"); sys.exit(1)
+    t0 = time.perf_counter()
+    if args.replay is not None:
+        if args.grid is None:
+            print("ERROR: --replay needs --grid"); sys.exit(1)
+        if not args.replay.exists():
+            print(f"ERROR: moves file not found at: {args.replay}"); sys.exit(1)
+        try:
+            games = replay(args.grid, np.load(args.replay), trace=trace)
+        except ValueError as e:
+            print(f"ERROR: {e}"); sys.exit(1)
+    else:
+        pairs = [(g, a, b) for g in args.grids for a in args.agents for b in args.agents]
+        seqs = np.random.SeedSequence(args.seed).spawn(len(pairs))
+        games = pd.concat([simulate(g, a, b, args.games, np.random.default_rng(q), args.batch, trace)
+                           for (g, a, b), q in zip(pairs, seqs)], ignore_index=True)
+    elapsed = time.perf_counter() - t0
+    moves = int((games["p1_turns"] + games["p2_turns"]).sum())
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    games.to_csv(args.out, index=False)
+    table = summarize(games)
+    print(f"{len(games)} games, {moves} moves in {elapsed:.2f}s ({moves / elapsed / 1e6:.2f} M moves/s)")
+    print(table.round(3).to_string(index=False))
+    if args.replay is None and args.summary.exists():
+        logged = pd.read_csv(args.summary)
+        both = table.merge(logged, on=KEY, suffixes=("", "_logged"))
+        if len(both):
+            cmp = both[KEY].copy()
+            cmp["p1_rate"] = both["p1_wins"] / both["games"]
+            cmp["p1_rate_logged"] = both["p1_wins_logged"] / both["games_logged"]
+            for c in ("p1_unsafe_avg", "p1_turns_avg", "p1_streak_avg"):
+                cmp[c] = both[c]
+                cmp[f"{c}_logged"] = both[f"{c}_logged"]
+            print(f"\nAgainst {args.summary}:")
+            print(cmp.round(3).to_string(index=False))
+    print(f"\nWrote:\n - {args.out}")
+    if trace is not None:
+        print(f" - {trace.path} (+ {trace.games_path.name})")
+
+
+if __name__ == "__main__":
+    main()
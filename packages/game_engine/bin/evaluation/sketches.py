@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Mergeable quantile sketches for timing columns.
+
+TDigest keeps a few hundred weighted centroids instead of the samples, so per
+matchup timing distributions can be persisted between incremental runs and
+merged across batches or shards. Compression is vectorised: values (or incoming
+centroids) are sorted, each is placed on the k1 scale
+k(q) = δ/(2π)·asin(2q − 1) by the midpoint of its cumulative weight, and every
+unit-width k bucket collapses into one centroid with np.add.reduceat. Buckets
+near q = 0 / 1 are narrow in q, so the tails stay close to exact.
+
+SketchSet holds one digest per (grid, p1_ai, p2_ai, column) and is what gets
+serialised: a JSON list of {grid, p1_ai, p2_ai, column, digest} records. Two
+kinds of column share the format:
+  p1_ai_ms, p2_apply_ms, ...      every move's time, written by benchmark.dart
+                                  to benchmark2_sketches.json
+  p1_ai_p50_ms, p2_ai_mean_ms ... per-game values, built from the games CSV
+Sets from different shards or nights merge digest by digest, and `rollup`
+merges them up to the agent or grid level, so p50/p95/p99 are available at any
+level without the samples.
+
+Usage:
+  python sketches.py ../benchmark2_sketches.json --level agent
+  python sketches.py night1.json night2.json --save merged.json --out out/timing_quantiles_by_agent.csv
+  python sketches.py --games ../benchmark2_games.csv --level matchup
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DELTA = 300   # ~150 centroids; p99 within ~0.5% on skewed data
+_BUFFER = 4096   # pending samples before a compression pass
+SKETCH_QUANTILES = (0.5, 0.95, 0.99)
+SKETCH_KEY = ("grid", "p1_ai", "p2_ai")
+DEFAULT_SKETCHES = Path(__file__).resolve().parent.parent / "benchmark2_sketches.json"
+
+
+class TDigest:
+    def __init__(self, delta=DEFAULT_DELTA):
+        self.delta = delta
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buf = []
+        self._nbuf = 0
+
+    # ---------- ingest ----------
+
+    def update(self, values):
+        """Add an array of samples (NaNs are ignored)."""
+        v = np.asarray(values, dtype=np.float64).ravel()
+        v = v[~np.isnan(v)]
+        if v.size == 0:
+            return self
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+        self._buf.append(v)
+        self._nbuf += v.size
+        if self._nbuf >= _BUFFER:
+            self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold another digest into this one."""
+        other._compress()
+        if other.weights.size == 0:
+            return self
+        self._compress()
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._absorb(np.concatenate([self.means, other.means]),
+                     np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _compress(self):
+        if not self._buf:
+            return
+        v = np.concatenate(self._buf)
+        self._buf, self._nbuf = [], 0
+        self._absorb(np.concatenate([self.means, v]),
+                     np.concatenate([self.weights, np.ones(v.size)]))
+
+    def _absorb(self, means, weights):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cum = np.cumsum(weights)
+        total = cum[-1]
+        q = (cum - weights / 2) / total
+        k = self.delta / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1.0, 1.0))
+        bucket = np.floor(k - k[0]).astype(np.int64)
+        start = np.flatnonzero(np.r_[True, np.diff(bucket) != 0])
+        w = np.add.reduceat(weights, start)
+        self.means = np.add.reduceat(means * weights, start) / w
+        self.weights = w
+
+    # ---------- queries ----------
+
+    def copy(self):
+        return TDigest.from_dict(self.to_dict())
+
+    @property
+    def count(self):
+        return float(self.weights.sum()) + self._nbuf
+
+    @property
+    def mean(self):
+        """Exact mean of everything added (centroid means are weighted sums)."""
+        self._compress()
+        return float(self.means @ self.weights / self.weights.sum()) if self.weights.size else np.nan
+
+    def quantile(self, q):
+        """Estimated q-quantile(s) (q in [0, 1]); NaN when empty."""
+        self._compress()
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.weights.size == 0:
+            out = np.full(qs.shape, np.nan)
+        elif self.weights.size == 1:
+            out = np.full(qs.shape, self.means[0])
+        else:
+            # centroid i sits at the middle of its weight; min / max anchor the ends
+            total = self.weights.sum()
+            pos = np.r_[0.0, np.cumsum(self.weights) - self.weights / 2, total]
+            val = np.r_[self.min, self.means, self.max]
+            out = np.interp(qs * total, pos, val)
+        return out if np.ndim(q) else float(out[0])
+
+    # ---------- persistence ----------
+
+    def to_dict(self):
+        self._compress()
+        return {"delta": self.delta, "min": self.min, "max": self.max,
+                "means": self.means.tolist(), "weights": self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        t = cls(delta=d["delta"])
+        t.min, t.max = d["min"], d["max"]
+        t.means = np.asarray(d["means"], dtype=np.float64)
+        t.weights = np.asarray(d["weights"], dtype=np.float64)
+        return t
+
+
+# ---------- keyed sets ----------
+
+def _role_split(column):
+    """'p2_ai_p95_ms' -> ('p2', 'ai_p95')."""
+    return column[:2], column[3:-3]
+
+
+class SketchSet:
+    """TDigests keyed by (grid, p1_ai, p2_ai, column)."""
+
+    LEVELS = ("matchup", "agent", "agent_all", "grid")
+
+    def __init__(self, delta=DEFAULT_DELTA):
+        self.delta = delta
+        self.digests = {}
+
+    def __len__(self):
+        return len(self.digests)
+
+    def update(self, chunk, columns):
+        """Add `columns` of a per-game chunk to the digest of each row's matchup."""
+        columns = [c for c in columns if c in chunk.columns]
+        if not columns or chunk.empty:
+            return self
+        values = {c: chunk[c].to_numpy(dtype=np.float64) for c in columns}
+        for key, idx in chunk.groupby(list(SKETCH_KEY), observed=True, sort=False).indices.items():
+            key = (int(key[0]), str(key[1]), str(key[2]))
+            for c in columns:
+                self.add(key, c, values[c][idx])
+        return self
+
+    def add(self, key, column, values):
+        d = self.digests.get(key + (column,))
+        if d is None:
+            d = self.digests[key + (column,)] = TDigest(self.delta)
+        d.update(values)
+        return self
+
+    def merge(self, other):
+        """Fold another set in (another shard, file or night)."""
+        for k, d in other.digests.items():
+            if k in self.digests:
+                self.digests[k].merge(d)
+            else:
+                self.digests[k] = d.copy()
+        return self
+
+    # ---------- persistence ----------
+
+    def to_records(self):
+        return [{"grid": int(k[0]), "p1_ai": k[1], "p2_ai": k[2], "column": k[3], "digest": d.to_dict()}
+                for k, d in sorted(self.digests.items())]
+
+    @classmethod
+    def from_records(cls, records):
+        s = cls()
+        for r in records:
+            s.digests[(int(r["grid"]), r["p1_ai"], r["p2_ai"], r["column"])] = TDigest.from_dict(r["digest"])
+        return s
+
+    def save(self, path):
+        Path(path).write_text(json.dumps(self.to_records()))
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_records(json.loads(Path(path).read_text()))
+
+    # ---------- queries ----------
+
+    def rollup(self, level="matchup"):
+        """
+        Merge digests up to `level`; returns {key: TDigest} with keys
+          matchup   - (grid, p1_ai, p2_ai, metric), metric keeps the role: 'p1_ai_p50'
+          agent     - (grid, agent, metric), both roles of the agent: 'ai_p50'
+          agent_all - (agent, metric) over all grids
+          grid      - (grid, metric) over all agents
+        """
+        if level not in self.LEVELS:
+            raise ValueError(f"unknown level {level!r} (choose from {', '.join(self.LEVELS)})")
+        out = {}
+        for (grid, p1, p2, col), d in sorted(self.digests.items()):
+            role, metric = _role_split(col)
+            agent = p1 if role == "p1" else p2
+            key = {"matchup": (grid, p1, p2, col[:-3]), "agent": (grid, agent, metric),
+                   "agent_all": (agent, metric), "grid": (grid, metric)}[level]
+            if key in out:
+                out[key].merge(d)
+            else:
+                out[key] = d.copy()
+        return out
+
+    def quantile_table(self, level="matchup", qs=SKETCH_QUANTILES):
+        """One row per rolled-up key: n and the requested quantiles (ms)."""
+        names = {"matchup": ["grid", "p1_ai", "p2_ai", "metric"], "agent": ["grid", "agent", "metric"],
+                 "agent_all": ["agent", "metric"], "grid": ["grid", "metric"]}[level]
+        rows = []
+        for key, d in self.rollup(level).items():
+            row = dict(zip(names, key))
+            row["n"] = int(d.count)
+            for q, v in zip(qs, d.quantile(list(qs))):
+                row[f"p{int(round(q*100))}"] = v
+            rows.append(row)
+        return pd.DataFrame(rows, columns=names + ["n"] + [f"p{int(round(q*100))}" for q in qs])
+
+
+def sketches_from_games(path, columns=None, chunksize=250_000):
+    """SketchSet of the per-game timing columns of a games CSV (read in chunks)."""
+    header = pd.read_csv(path, nrows=0).columns
+    columns = columns or [c for c in header if c.endswith("_ms")]
+    s = SketchSet()
+    for chunk in pd.read_csv(path, usecols=list(SKETCH_KEY) + columns, chunksize=chunksize,
+                             dtype={"p1_ai": "category", "p2_ai": "category"}):
+        s.update(chunk, columns)
+    return s
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Merge timing sketches and report p50/p95/p99 at any level.")
+    ap.add_argument("sketches", nargs="*", type=Path,
+                    help="sketch JSON files (incremental sketches.json, other shards, ...); "
+                         "default: ../benchmark2_sketches.json")
+    ap.add_argument("--games", type=Path, nargs="*", default=[],
+                    help="per-game CSVs to sketch as well (per-game timing columns)")
+    ap.add_argument("--level", choices=SketchSet.LEVELS, default="agent", help="aggregation level")
+    ap.add_argument("--quantiles", type=float, nargs="+", default=list(SKETCH_QUANTILES))
+    ap.add_argument("--save", type=Path, default=None, help="write the merged sketch set here")
+    ap.add_argument("--out", type=Path, default=None, help="write the quantile table as CSV (default: print)")
+    args = ap.parse_args()
+
+    if not args.sketches and not args.games:
+        args.sketches = [DEFAULT_SKETCHES]
+    merged = SketchSet()
+    for p in list(args.sketches) + list(args.games):
+        if not p.exists():
+            print(f"ERROR: input not found at: {p}"); sys.exit(1)
+    for p in args.sketches:
+        merged.merge(SketchSet.load(p))
+    for p in args.games:
+        merged.merge(sketches_from_games(p))
+
+    if args.save is not None:
+        merged.save(args.save)
+        print(f"Saved {len(merged)} digests to {args.save}")
+    table = merged.quantile_table(args.level, tuple(args.quantiles))
+    if args.out is not None:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        table.to_csv(args.out, index=False)
+        print(f"Wrote {args.out}")
+    else:
+        print(table.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
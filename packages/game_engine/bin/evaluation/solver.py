@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Exact endgame solver, used to grade logged moves.
+
+givesBoxToOpponent and deep2Move (ai.dart) are one- and two-ply proxies, so
+the benchmark can count "unsafe" moves but cannot say whether a move was
+actually wrong. This module computes the exact value of late-game positions
+and small boards.
+
+A position is the set of drawn edges, as a Python int bit mask (bit e is
+edge e in Game.availableEdges() order). Boxes already taken do not affect
+later play, so the value V(mask) is the best final margin, over the
+remaining boxes, for the player to move:
+
+  V(mask) = max over free edges e of   k + V(mask | e)   if e completes k > 0 boxes
+                                        −V(mask | e)      otherwise
+
+The search is fail-soft negamax with alpha-beta:
+- The window is clamped to ±(boxes left).
+- Moves are ordered: the transposition-table move, captures, moves that
+  leave no three-sided box, then the rest.
+- The transposition table is keyed by Zobrist hashes. Eight hashes (one
+  per symmetry of the square) are updated incrementally with every edge,
+  and the smallest is the key, so all 8 images of a position share one
+  entry. Keys are 64-bit hashes: a collision would go unnoticed, but is
+  negligible at these table sizes.
+- The table is an LRU (OrderedDict), capped at --tt-mb megabytes.
+
+Grading replays traces (traces.py) and solves every position with at most
+--max-free undrawn edges. The position after a move is the next logged
+position, so one search per ply yields both values:
+
+  q(move) = k + V(next)  or  −V(next)      loss = V(position) − q(move) ≥ 0
+
+Writes:
+  out/solver_move_grades.csv   one row per graded move: game, grid, p1_ai, p2_ai, game_idx, ply,
+                               player, agent, free, edge, unsafe, value, move_value, loss
+  out/solver_agent_errors.csv  per (grid, agent): graded moves, error rate, mean / max loss,
+                               and the error rate of moves flagged unsafe vs not
+
+Usage:
+  python solver.py ../benchmark2_trace.bin --max-free 14 --games-per-matchup 20
+  python solver.py out/sim_trace.bin --max-free 18 --tt-mb 1024
+"""
+
+import argparse
+import sys
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset import DEFAULT_OUT
+from simulator import geometry
+from traces import iter_chunks, open_trace
+
+MAX_FREE = 14
+GAMES_PER_MATCHUP = 20
+TT_MB = 256
+TT_ENTRY_BYTES = 220        # OrderedDict slot + int key + (value, flag, move) tuple, measured
+ZOBRIST_SEED = 20240601
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+def symmetries(size):
+    """(8, E) edge permutations for the symmetries of the square board."""
+    g, n = geometry(size), size
+    maps = [lambda x, y: (x, y), lambda x, y: (n - x, y), lambda x, y: (x, n - y),
+            lambda x, y: (n - x, n - y), lambda x, y: (y, x), lambda x, y: (n - y, x),
+            lambda x, y: (y, n - x), lambda x, y: (n - y, n - x)]
+    c = g.coords.astype(np.int64)
+    perms = []
+    for f in maps:
+        x1, y1 = f(c[:, 0], c[:, 1])
+        x2, y2 = f(c[:, 2], c[:, 3])
+        perms.append(g.edge_ids(np.stack([x1, y1, x2, y2], axis=1)))
+    return np.array(perms)
+
+
+class Solver:
+    """Exact negamax values of positions on an n×n grid, with a shared transposition table."""
+
+    def __init__(self, size, tt_mb=TT_MB):
+        g = self.geo = geometry(size)
+        self.n_edges, self.n_boxes = g.n_edges, g.n_boxes
+        self.full = (1 << g.n_edges) - 1
+        self.box_masks = [sum(1 << int(e) for e in g.box_edges[b]) for b in range(g.n_boxes)]
+        # per edge: masks of its one or two boxes
+        self.adjacent = [[self.box_masks[b] for b in g.edge_boxes[e] if b < g.n_boxes]
+                         for e in range(g.n_edges)]
+        z = np.random.default_rng(ZOBRIST_SEED).integers(0, 2**63, size=g.n_edges, dtype=np.int64)
+        perms = symmetries(size)
+        self.zobrist = [tuple(int(z[perms[s, e]]) for s in range(8)) for e in range(g.n_edges)]
+        self.tt = OrderedDict()
+        self.tt_cap = max(1, int(tt_mb * 2**20 / TT_ENTRY_BYTES))
+        self.nodes = 0
+        self.tt_hits = 0
+
+    # ---------- positions ----------
+
+    def mask_of(self, edges):
+        m = 0
+        for e in edges:
+            m |= 1 << int(e)
+        return m
+
+    def hashes(self, mask):
+        hs = [0] * 8
+        for e in range(self.n_edges):
+            if mask >> e & 1:
+                hs = [h ^ z for h, z in zip(hs, self.zobrist[e])]
+        return tuple(hs)
+
+    def boxes_left(self, mask):
+        return sum((mask & bm) != bm for bm in self.box_masks)
+
+    def gain(self, mask, e):
+        """Boxes completed by drawing free edge e on mask."""
+        after = mask | 1 << e
+        return sum((after & bm) == bm for bm in self.adjacent[e])
+
+    # ---------- search ----------
+
+    def _moves(self, mask, first):
+        """Free edges with their gains, best-first."""
+        free = self.full ^ mask
+        caps, safe, rest = [], [], []
+        while free:
+            low = free & -free
+            e = low.bit_length() - 1
+            free ^= low
+            after = mask | low
+            k = 0
+            opens = False
+            for bm in self.adjacent[e]:
+                c = (after & bm).bit_count()
+                k += c == 4
+                opens |= c == 3
+            (caps if k else rest if opens else safe).append((e, k))
+        moves = caps + safe + rest
+        if first is not None:
+            for i, (e, k) in enumerate(moves):
+                if e == first:
+                    moves.insert(0, moves.pop(i))
+                    break
+        return moves
+
+    def _search(self, mask, hs, left, alpha, beta):
+        self.nodes += 1
+        if left == 0:
+            return 0
+        if alpha >= left:
+            return left
+        if beta <= -left:
+            return -left
+        alpha, beta = max(alpha, -left), min(beta, left)
+        key = min(hs)
+        entry = self.tt.get(key)
+        first = None
+        if entry is not None:
+            self.tt.move_to_end(key)
+            self.tt_hits += 1
+            v, flag, first = entry
+            if flag == EXACT:
+                return v
+            if flag == LOWER and v >= beta:
+                return v
+            if flag == UPPER and v <= alpha:
+                return v
+        alpha0 = alpha
+        best, best_e = -left - 1, None
+        for e, k in self._moves(mask, first):
+            child = tuple(h ^ z for h, z in zip(hs, self.zobrist[e]))
+            if k:
+                v = k + self._search(mask | 1 << e, child, left - k, alpha - k, beta - k)
+            else:
+                v = -self._search(mask | 1 << e, child, left, -beta, -alpha)
+            if v > best:
+                best, best_e = v, e
+                if v > alpha:
+                    alpha = v
+                    if alpha >= beta:
+                        break
+        flag = UPPER if best <= alpha0 else LOWER if best >= beta else EXACT
+        self.tt[key] = (best, flag, best_e)
+        self.tt.move_to_end(key)
+        if len(self.tt) > self.tt_cap:
+            self.tt.popitem(last=False)
+        return best
+
+    def value(self, mask):
+        """Exact margin (remaining boxes) for the player to move."""
+        left = self.boxes_left(mask)
+        return self._search(mask, self.hashes(mask), left, -left, left)
+
+    def move_values(self, mask):
+        """{edge: exact margin for the mover after drawing it} for every free edge."""
+        hs, left = self.hashes(mask), self.boxes_left(mask)
+        out = {}
+        for e, k in self._moves(mask, None):
+            child = tuple(h ^ z for h, z in zip(hs, self.zobrist[e]))
+            v = self._search(mask | 1 << e, child, left - k, -(left - k), left - k)
+            out[e] = k + v if k else -v
+        return out
+
+
+# ---------- grading ----------
+
+
+def grade_game(solver, edges, players, max_free):
+    """(ply, free, value, move_value, loss) for the moves of one full game with ≤ max_free free edges."""
+    E = solver.n_edges
+    start = max(0, E - max_free)
+    mask = solver.mask_of(edges[:start])
+    masks = [mask]
+    for e in edges[start:]:
+        mask |= 1 << int(e)
+        masks.append(mask)
+    values = [0] * len(masks)
+    for i in range(len(masks) - 2, -1, -1):   # from the end: each search reuses the later entries
+        values[i] = solver.value(masks[i])
+    rows = []
+    for i, e in enumerate(edges[start:]):
+        k = solver.gain(masks[i], int(e))
+        q = k + values[i + 1] if k else -values[i + 1]
+        rows.append((start + i, E - start - i, values[i], q, values[i] - q))
+    return rows
+
+
+def _selected_records(records, games, per_matchup):
+    """Records of the first `per_matchup` games of every (grid, p1_ai, p2_ai), sorted by (game, ply)."""
+    pick = games.sort_values("game").groupby(["grid", "p1_ai", "p2_ai"]).head(per_matchup)
+    ids = np.sort(pick["game"].to_numpy())
+    parts = [np.array(part[np.isin(part["game"], ids)]) for part in iter_chunks(records)]
+    rec = np.concatenate(parts) if parts else records[:0]
+    return rec[np.lexsort((rec["ply"], rec["game"]))], pick
+
+
+def grade_trace(path, max_free=MAX_FREE, per_matchup=GAMES_PER_MATCHUP, tt_mb=TT_MB):
+    records, games = open_trace(path)
+    rec, pick = _selected_records(records, games, per_matchup)
+    info = pick.set_index("game")
+    bounds = np.flatnonzero(np.diff(rec["game"].astype(np.int64))) + 1
+    solvers, rows = {}, []
+    for part in np.split(rec, bounds):
+        if len(part) == 0:
+            continue
+        gid = int(part["game"][0])
+        g = info.loc[gid]
+        grid = int(g["grid"])
+        if len(part) != geometry(grid).n_edges:
+            continue    # incomplete game
+        solver = solvers.setdefault(grid, Solver(grid, tt_mb))
+        for ply, free, v, q, loss in grade_game(solver, part["edge"], part["player"], max_free):
+            player = int(part["player"][ply])
+            rows.append((gid, grid, g["p1_ai"], g["p2_ai"], int(g["game_idx"]), ply, player,
+                         g["p1_ai"] if player == 0 else g["p2_ai"], free, int(part["edge"][ply]),
+                         int(part["unsafe"][ply]), v, q, loss))
+    cols = ["game", "grid", "p1_ai", "p2_ai", "game_idx", "ply", "player", "agent", "free", "edge",
+            "unsafe", "value", "move_value", "loss"]
+    return pd.DataFrame(rows, columns=cols), solvers
+
+
+def agent_errors(grades):
+    """Per (grid, agent): error rate and loss, overall and split by the unsafe flag."""
+    g = grades.assign(error=grades["loss"] > 0)
+    out = g.groupby(["grid", "agent"]).agg(moves=("loss", "size"), errors=("error", "sum"),
+                                           mean_loss=("loss", "mean"), max_loss=("loss", "max"),
+                                           unsafe_moves=("unsafe", "sum")).reset_index()
+    out["error_rate"] = out["errors"] / out["moves"]
+    lost = g[g["error"]].groupby(["grid", "agent"])["loss"].mean().rename("mean_loss_if_error")
+    out = out.merge(lost.reset_index(), on=["grid", "agent"], how="left")
+    for flag, name in ((1, "error_rate_unsafe"), (0, "error_rate_safe")):
+        r = g[g["unsafe"] == flag].groupby(["grid", "agent"])["error"].mean().rename(name)
+        out = out.merge(r.reset_index(), on=["grid", "agent"], how="left")
+    return out[["grid", "agent", "moves", "errors", "error_rate", "mean_loss", "mean_loss_if_error",
+                "max_loss", "unsafe_moves", "error_rate_unsafe", "error_rate_safe"]]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Grade logged moves with an exact endgame solver.")
+    ap.add_argument("trace", type=Path, help="move trace (.bin, with .games.csv beside it)")
+    ap.add_argument("--max-free", type=int, default=MAX_FREE,
+                    help="grade positions with at most this many undrawn edges")
+    ap.add_argument("--games-per-matchup", type=int, default=GAMES_PER_MATCHUP,
+                    help="games graded per (grid, p1_ai, p2_ai)")
+    ap.add_argument("--tt-mb", type=float, default=TT_MB, help="transposition table cap per grid (MB)")
+    ap.add_argument("--out", type=Path, default=DEFAULT_OUT, help="Output directory")
+    args = ap.parse_args()
+
+    if not args.trace.exists():
+        print(f"ERROR: trace not found at: {args.trace}"); sys.exit(1)
+    try:
+        grades, solvers = grade_trace(args.trace, args.max_free, args.games_per_matchup, args.tt_mb)
+    except ValueError as e:
+        print(f"ERROR: {e}"); sys.exit(1)
+    if grades.empty:
+        print("ERROR: no complete games to grade"); sys.exit(1)
+
+    errors = agent_errors(grades)
+    args.out.mkdir(parents=True, exist_ok=True)
+    grades.to_csv(args.out / "solver_move_grades.csv", index=False)
+    errors.to_csv(args.out / "solver_agent_errors.csv", index=False)
+
+    for grid, s in sorted(solvers.items()):
+        print(f"{grid}x{grid}: {s.nodes} nodes searched, {s.tt_hits} table hits, {len(s.tt)} entries kept")
+    print(f"\nGraded {len(grades)} moves (≤ {args.max_free} free edges) in {grades['game'].nunique()} games:")
+    print(errors.round(3).to_string(index=False))
+    print("\nWrote:" + "".join(f"\n - {args.out / n}" for n in
+                               ("solver_move_grades.csv", "solver_agent_errors.csv")))
+
+
+if __name__ == "__main__":
+    main()
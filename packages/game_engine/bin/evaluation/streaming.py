@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Chunked, bounded-memory ingest of the per-game benchmark CSV.
+
+The per-game file grows with grids × agents² × gamesPerPair, so overnight runs
+no longer fit in memory as one DataFrame. This module reads it in chunks with
+narrow dtypes and folds every chunk into a GamesAccumulator keyed by the ordered
+matchup (grid, p1_ai, p2_ai). The accumulator only holds counts, sums, sums of
+squares and small value histograms, so its size depends on the number of
+matchups, not on the number of games. Two accumulators built from different
+files (or different chunks) can be merged with `merge`.
+
+With `sketches=True` the accumulator also keeps a t-digest per matchup and
+timing column (sketches.SketchSet), so timing quantiles survive merging too.
+
+Derived tables mirror the in-memory analyses in analyze_all.py / make_figures.py
+so callers can switch with `--chunksize N`.
+"""
+
+import numpy as np
+import pandas as pd
+from sketches import SketchSet
+
+DEFAULT_CHUNKSIZE = 250_000
+
+# Narrow dtypes for benchmark2_games.csv. Scores/turns/streaks are bounded by the
+# edge count 2·n·(n+1), which stays well inside int16 for any playable grid.
+GAMES_DTYPES = {
+    "grid": "int8",
+    "p1_ai": "category", "p2_ai": "category",
+    "game_idx": "int32",
+    "p1_score": "int16", "p2_score": "int16",
+    "p1_unsafe_moves": "int16", "p2_unsafe_moves": "int16",
+    "p1_unsafe": "int16", "p2_unsafe": "int16",
+    "p1_turns": "int16", "p2_turns": "int16",
+    "p1_longest_streak": "int16", "p2_longest_streak": "int16",
+}
+TIMING_METRICS = ["ai_mean", "ai_p50", "ai_p95", "apply_mean", "apply_p50", "apply_p95"]
+for _r in ("p1", "p2"):
+    for _t in TIMING_METRICS:
+        GAMES_DTYPES[f"{_r}_{_t}_ms"] = "float32"
+
+# Per-game timing quantiles: the summary pools all moves of a matchup, so its
+# p50/p95 can only be bounded by the per-game values, not recomputed from them.
+TIMING_QUANTILE_METRICS = [t for t in TIMING_METRICS if not t.endswith("_mean")]
+
+KEY = ["grid", "p1_ai", "p2_ai"]
+ROLES = ("p1", "p2")
+# Integer per-role metrics -> column suffix in the per-game CSV ("unsafe" is resolved per file).
+ROLE_METRICS = {"score": "score", "unsafe": None, "turns": "turns", "streak": "longest_streak"}
+# Per-role metrics we keep value histograms for (small integer ranges; used for boxplots
+# and the exact quantiles of agent_metrics).
+HIST_METRICS = ("unsafe", "streak", "score", "turns")
+STAT_QUANTILES = (0.25, 0.5, 0.75, 0.95)
+
+
+def read_header(path):
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def detect_unsafe_suffix(columns):
+    """Return the per-game unsafe column suffix ('unsafe_moves' or legacy 'unsafe')."""
+    cols = set(columns)
+    if {"p1_unsafe_moves", "p2_unsafe_moves"}.issubset(cols):
+        return "unsafe_moves"
+    if {"p1_unsafe", "p2_unsafe"}.issubset(cols):
+        return "unsafe"
+    raise KeyError(
+        "Per-game CSV missing unsafe columns. "
+        "Expected p1_unsafe_moves/p2_unsafe_moves or p1_unsafe/p2_unsafe. "
+        f"Found: {list(columns)}"
+    )
+
+
+def iter_games(path, chunksize=DEFAULT_CHUNKSIZE, usecols=None, dtype=None):
+    """Yield DataFrame chunks of the per-game CSV with GAMES_DTYPES (or `dtype`) applied."""
+    kw = {}
+    if usecols is not None:
+        wanted = set(usecols)
+        kw["usecols"] = lambda c: c in wanted
+    yield from pd.read_csv(path, chunksize=chunksize,
+                           dtype=GAMES_DTYPES if dtype is None else dtype, **kw)
+
+
+def _plain_index(df):
+    """Replace categorical/int8 key levels with plain str/int64 so partials align."""
+    df = df.reset_index()
+    df["grid"] = df["grid"].astype(np.int64)
+    for c in KEY[1:]:
+        if c in df.columns:
+            df[c] = df[c].astype(str)
+    return df
+
+
+def _var_from_sums(n, s1, s2):
+    """Sample variance (ddof=1) from count / sum / sum of squares.
+    Integer inputs are combined exactly (Python ints) before the final division."""
+    out = np.full(len(n), np.nan)
+    for i, (k, a, b) in enumerate(zip(n, s1, s2)):
+        if k > 1:
+            if float(a).is_integer() and float(b).is_integer():
+                k, a, b = int(k), int(a), int(b)
+                out[i] = (k*b - a*a) / (k*(k - 1))
+            else:
+                out[i] = max(0.0, (b - a*a/k) / (k - 1))
+    return out
+
+
+def encode_pairs(p1, p2):
+    """
+    Canonical unordered matchup key (A vs B == B vs A) for two agent-name columns.
+
+    Agents get integer codes in sorted-name order (hash factorize, then rank the
+    few uniques), so np.minimum / np.maximum of the two codes give the
+    alphabetically first / second agent. Returns (agents, a, b, swapped):
+    agents[a] / agents[b] are agent_A / agent_B per row and `swapped` marks the
+    rows where p1 is agent_B (the reversed order).
+    """
+    p1 = np.asarray(p1, dtype=object)
+    codes, uniques = pd.factorize(np.concatenate([p1, np.asarray(p2, dtype=object)]))
+    uniques = np.asarray(uniques, dtype=object)
+    order = np.argsort(uniques, kind="stable")
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order), dtype=np.int32)
+    c1, c2 = rank[codes[:len(p1)]], rank[codes[len(p1):]]
+    return uniques[order], np.minimum(c1, c2), np.maximum(c1, c2), c1 > c2
+
+
+def flip_roles(swapped, x1, x2):
+    """(x_A, x_B) from per-role arrays: swap the p1/p2 values on reversed rows."""
+    x1, x2 = np.asarray(x1), np.asarray(x2)
+    return np.where(swapped, x2, x1), np.where(swapped, x1, x2)
+
+
+def _merge_extrema(a, b):
+    """Combine two *_min / *_max frames indexed by KEY."""
+    both = pd.concat([a, b])
+    return both.groupby(level=list(range(both.index.nlevels))).agg({c: c[-3:] for c in both.columns})
+
+
+class GamesAccumulator:
+    """Mergeable per-(grid, p1_ai, p2_ai) aggregates of the per-game CSV."""
+
+    def __init__(self, unsafe_suffix="unsafe_moves", sketches=False):
+        self.unsafe_suffix = unsafe_suffix
+        self.state = None   # DataFrame indexed by KEY
+        self.extrema = None # DataFrame indexed by KEY: per-game timing quantile min/max
+        self.hist = None    # Series indexed by (grid, agent, metric, value) -> count
+        self.sketches = SketchSet() if sketches else None   # per-game timing digests
+
+    # ---------- ingest ----------
+
+    def _col(self, role, metric):
+        suffix = ROLE_METRICS[metric] or self.unsafe_suffix
+        return f"{role}_{suffix}"
+
+    def update(self, chunk):
+        """Fold one per-game chunk into the running state."""
+        if chunk.empty:
+            return self
+        diff = chunk["p1_score"].astype(np.int64) - chunk["p2_score"].astype(np.int64)
+        cols = {
+            "n": np.ones(len(chunk), dtype=np.int64),
+            "p1_wins": (diff > 0).astype(np.int64),
+            "p2_wins": (diff < 0).astype(np.int64),
+            "ties": (diff == 0).astype(np.int64),
+        }
+        for metric in ROLE_METRICS:
+            for r in ROLES:
+                c = self._col(r, metric)
+                if c not in chunk.columns:  # column-projected reads may drop turns/streaks
+                    continue
+                v = chunk[c].astype(np.int64)
+                cols[f"{r}_{metric}_sum"] = v
+                cols[f"{r}_{metric}_sumsq"] = v * v
+        has_turns = {"p1_turns", "p2_turns"}.issubset(chunk.columns)
+        if has_turns:
+            tt = chunk["p1_turns"].astype(np.int64) + chunk["p2_turns"].astype(np.int64)
+            cols["turns_total_sum"] = tt
+            cols["turns_total_sumsq"] = tt * tt
+        ext = {}
+        for r in ROLES:
+            for t in TIMING_METRICS:
+                c = f"{r}_{t}_ms"
+                if c in chunk.columns:
+                    v = chunk[c].astype(np.float64)
+                    cols[f"{r}_{t}_sum"] = v
+                    cols[f"{r}_{t}_sumsq"] = v * v
+                    if t.endswith("_mean") and has_turns:
+                        # per-move mean over the matchup = sum(mean·turns) / sum(turns)
+                        cols[f"{r}_{t}_wsum"] = v * chunk[f"{r}_turns"].astype(np.int64)
+                    elif t in TIMING_QUANTILE_METRICS:
+                        ext[f"{r}_{t}_min"] = ext[f"{r}_{t}_max"] = v
+        frame = pd.DataFrame(cols, index=chunk.index)
+        for k in KEY:
+            frame[k] = chunk[k]
+        part = _plain_index(frame.groupby(KEY, observed=True, sort=False).sum()).set_index(KEY)
+        self.state = part if self.state is None else self.state.add(part, fill_value=0)
+
+        if ext:
+            e = pd.DataFrame(ext, index=chunk.index)
+            for k in KEY:
+                e[k] = chunk[k]
+            e = _plain_index(e.groupby(KEY, observed=True, sort=False)
+                               .agg({c: c[-3:] for c in ext})).set_index(KEY)
+            self.extrema = e if self.extrema is None else _merge_extrema(self.extrema, e)
+        if self.sketches is not None:
+            self.sketches.update(chunk, [f"{r}_{t}_ms" for r in ROLES for t in TIMING_METRICS])
+
+        hists = []
+        for metric in HIST_METRICS:
+            for r in ROLES:
+                if self._col(r, metric) not in chunk.columns:
+                    continue
+                h = (pd.DataFrame({"grid": chunk["grid"].astype(np.int64),
+                                   "agent": chunk[f"{r}_ai"].astype(str),
+                                   "value": chunk[self._col(r, metric)].astype(np.int64)})
+                       .value_counts())
+                h = h.reset_index()
+                h["metric"] = metric
+                hists.append(h)
+        if hists:
+            h = (pd.concat(hists, ignore_index=True)
+                   .groupby(["grid", "agent", "metric", "value"])["count"].sum())
+            self.hist = h if self.hist is None else self.hist.add(h, fill_value=0)
+        return self
+
+    def merge(self, other):
+        """Combine with another accumulator (e.g. another shard or file)."""
+        if other.state is None:
+            return self
+        if other.sketches is not None:
+            if self.sketches is None:
+                self.sketches = SketchSet()
+            self.sketches.merge(other.sketches)
+        if self.state is None:
+            self.state = other.state.copy()
+            self.extrema = None if other.extrema is None else other.extrema.copy()
+            self.hist = None if other.hist is None else other.hist.copy()
+            return self
+        self.state = self.state.add(other.state, fill_value=0)
+        if other.extrema is not None:
+            self.extrema = (other.extrema.copy() if self.extrema is None
+                            else _merge_extrema(self.extrema, other.extrema))
+        if other.hist is not None:
+            self.hist = other.hist.copy() if self.hist is None else self.hist.add(other.hist, fill_value=0)
+        return self
+
+    @classmethod
+    def from_csv(cls, path, chunksize=DEFAULT_CHUNKSIZE, sketches=False):
+        acc = cls(unsafe_suffix=detect_unsafe_suffix(read_header(path)), sketches=sketches)
+        for chunk in iter_games(path, chunksize=chunksize):
+            acc.update(chunk)
+        return acc
+
+    # ---------- derived tables ----------
+
+    def ordered(self):
+        """Per ordered matchup sums, as a flat DataFrame sorted by KEY."""
+        if self.state is None:
+            return pd.DataFrame(columns=KEY)
+        out = self.state
+        if self.extrema is not None:
+            out = out.join(self.extrema)
+        out = out.reset_index().sort_values(KEY).reset_index(drop=True)
+        int_cols = [c for c in out.columns if c not in KEY and "_ai_" not in c and "_apply_" not in c]
+        out[int_cols] = out[int_cols].astype(np.int64)
+        return out
+
+    def by_agent(self, metric):
+        """Role-combined count / sum / sumsq of a per-role metric per (grid, agent)."""
+        o = self.ordered()
+        parts = [pd.DataFrame({"grid": o["grid"], "agent": o[f"{r}_ai"], "count": o["n"],
+                               "sum": o[f"{r}_{metric}_sum"], "sumsq": o[f"{r}_{metric}_sumsq"]})
+                 for r in ROLES]
+        return (pd.concat(parts, ignore_index=True)
+                  .groupby(["grid", "agent"], as_index=False)[["count", "sum", "sumsq"]].sum()
+                  .sort_values(["grid", "agent"]).reset_index(drop=True))
+
+    def agent_mean_std(self, metric):
+        a = self.by_agent(metric)
+        a["mean"] = a["sum"] / a["count"]
+        a["std"] = np.sqrt(_var_from_sums(a["count"].to_numpy(), a["sum"].to_numpy(), a["sumsq"].to_numpy()))
+        return a
+
+    def unsafe_by_agent_games(self):
+        a = self.agent_mean_std("unsafe")
+        return a[["grid", "agent"]].assign(unsafe_mean_games=a["mean"])
+
+    def streaks_by_agent(self):
+        a = self.agent_mean_std("streak")
+        return a[["grid", "agent"]].assign(longest_streak_mean=a["mean"])
+
+    def game_length_by_grid(self):
+        """Same columns as analyze_all.game_length_by_grid (unordered pairs)."""
+        o = self.ordered()
+        agents, a, b, _ = encode_pairs(o["p1_ai"], o["p2_ai"])
+        g = (o.assign(agent_A=agents[a], agent_B=agents[b])
+               .groupby(["grid", "agent_A", "agent_B"], as_index=False)
+               [["n", "turns_total_sum", "turns_total_sumsq"]].sum())
+        n = g["n"].to_numpy()
+        out = pd.DataFrame({
+            "grid": g["grid"],
+            "turns_mean": g["turns_total_sum"] / n,
+            "turns_std": np.sqrt(_var_from_sums(n, g["turns_total_sum"].to_numpy(),
+                                                g["turns_total_sumsq"].to_numpy())),
+            "n": n,
+            "agent_A": g["agent_A"],
+            "agent_B": g["agent_B"],
+        })
+        return out.sort_values(["grid", "agent_A", "agent_B"]).reset_index(drop=True)
+
+    def p1_winrates(self):
+        """Same shape as make_figures.p1_winrate_from_games."""
+        o = self.ordered()
+        return o[KEY].assign(p1_winrate_pct=o["p1_wins"] / o["n"] * 100.0)
+
+    def matchup_unsafe_both(self, grid):
+        """Mean of (p1_unsafe + p2_unsafe) / 2 per ordered matchup on one grid."""
+        o = self.ordered()
+        o = o[o["grid"] == grid]
+        return (o[["p1_ai", "p2_ai"]]
+                .assign(avg_unsafe_both=(o["p1_unsafe_sum"] + o["p2_unsafe_sum"]) / 2.0 / o["n"])
+                .reset_index(drop=True))
+
+    def agent_metrics(self, quantiles=STAT_QUANTILES):
+        """
+        analyze_all.agent_metrics from the aggregates. Integer metrics come from
+        the value histograms and are exact. Timing metrics need sketches=True:
+        count / mean / std are exact, min / quantiles / max come from the t-digests.
+        """
+        qcols = [f"q{int(round(q*100)):02d}" for q in quantiles]
+        rows = []
+        if self.hist is not None:
+            h = self.hist.reset_index()
+            for (grid, agent, metric), s in h.groupby(["grid", "agent", "metric"], sort=False):
+                s = s.sort_values("value")
+                v, c = s["value"].to_numpy(dtype=float), s["count"].to_numpy().astype(np.int64)
+                n = int(c.sum())
+                mean = float((v * c).sum() / n)
+                std = float(np.sqrt((c * (v - mean) ** 2).sum() / (n - 1))) if n > 1 else np.nan
+                rows.append([grid, agent, metric, n, mean, std, v[0],
+                             *[hist_quantile(v, c, q) for q in quantiles], v[-1]])
+        if self.sketches is not None and self.state is not None:
+            o = self.ordered()
+            sums = {}
+            for t in TIMING_METRICS:
+                for r in ROLES:
+                    if f"{r}_{t}_sum" not in o.columns:
+                        continue
+                    for grid, agent, s1, s2 in zip(o["grid"], o[f"{r}_ai"], o[f"{r}_{t}_sum"], o[f"{r}_{t}_sumsq"]):
+                        acc = sums.setdefault((int(grid), agent, t), [0.0, 0.0])
+                        acc[0] += s1
+                        acc[1] += s2
+            for (grid, agent, t), d in self.sketches.rollup("agent").items():
+                if (grid, agent, t) not in sums or d.count == 0:
+                    continue
+                n, (s1, s2) = int(d.count), sums[(grid, agent, t)]
+                std = float(np.sqrt(max(0.0, (s2 - s1 * s1 / n) / (n - 1)))) if n > 1 else np.nan
+                rows.append([grid, agent, f"{t}_ms", n, s1 / n, std, d.min,
+                             *d.quantile(list(quantiles)).tolist(), d.max])
+        first = ["grid", "agent", "metric"]
+        out = pd.DataFrame(rows, columns=first + ["count", "mean", "std", "min", *qcols, "max"])
+        return out.sort_values(first, kind="stable").reset_index(drop=True)
+
+    def histogram(self, grid, metric):
+        """dict[agent] -> (values, counts) for one grid and histogrammed metric."""
+        if self.hist is None:
+            return {}
+        h = self.hist.reset_index()
+        h = h[(h["grid"] == grid) & (h["metric"] == metric)].sort_values(["agent", "value"])
+        return {a: (s["value"].to_numpy(), s["count"].to_numpy().astype(np.int64))
+                for a, s in h.groupby("agent")}
+
+
+def hist_quantile(values, counts, q):
+    """np.percentile(linear) of the expanded sample, computed from a value histogram."""
+    cum = np.cumsum(counts)
+    n = cum[-1]
+    h = (n - 1) * q
+    lo = int(np.floor(h))
+    hi = min(lo + 1, n - 1)
+    v_lo = values[np.searchsorted(cum, lo, side="right")]
+    v_hi = values[np.searchsorted(cum, hi, side="right")]
+    return v_lo + (h - lo) * (v_hi - v_lo)
+
+
+def hist_boxplot_stats(values, counts, label, whis=1.5):
+    """matplotlib.cbook.boxplot_stats equivalent for histogrammed data (for Axes.bxp)."""
+    values = np.asarray(values, dtype=float)
+    counts = np.asarray(counts)
+    n = counts.sum()
+    q1, med, q3 = (hist_quantile(values, counts, q) for q in (0.25, 0.5, 0.75))
+    iqr = q3 - q1
+    lo_lim, hi_lim = q1 - whis * iqr, q3 + whis * iqr
+    below = values[values <= hi_lim]
+    above = values[values >= lo_lim]
+    return {
+        "label": label,
+        "mean": float((values * counts).sum() / n),
+        "med": med, "q1": q1, "q3": q3, "iqr": iqr,
+        "cilo": med - 1.57 * iqr / np.sqrt(n), "cihi": med + 1.57 * iqr / np.sqrt(n),
+        "whislo": above.min() if above.size and above.min() <= q1 else q1,
+        "whishi": below.max() if below.size and below.max() >= q3 else q3,
+        # one marker per distinct outlier value; repeats would overplot anyway
+        "fliers": values[(values < lo_lim) | (values > hi_lim)],
+    }
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+latency.py end to end on the checked-in run, once per documented --metric.
+
+Apply times sit below MIN_FIT_MS on every grid, so the apply metrics exercise
+the empty scaling figure.
+
+Usage:
+  python -m pytest -q test_latency.py
+"""
+
+import sys
+
+import matplotlib
+matplotlib.use("Agg")  # before latency imports pyplot
+
+import pytest
+
+import latency
+from dataset import DEFAULT_GAMES, DEFAULT_SUMMARY
+
+METRICS = [f"{k}_{s}" for k in latency.KINDS for s in ("mean", "p50", "p95")]
+
+
+@pytest.mark.parametrize("metric", METRICS)
+def test_every_documented_metric(metric, tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["latency.py", "--summary", str(DEFAULT_SUMMARY), "--games", str(DEFAULT_GAMES),
+                                      "--out", str(tmp_path), "--figs", str(tmp_path), "--metric", metric])
+    latency.main()
+    for name in ("latency_by_agent.csv", "latency_scaling.csv", "latency_drift.csv",
+                 f"latency_heatmap_{metric}.png", f"latency_scaling_{metric}.png"):
+        assert (tmp_path / name).stat().st_size > 0, name
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+simulator.py against a scalar port of lib/src/game.dart and lib/src/ai.dart.
+
+The port follows the Dart code line by line (dot coordinates, clone-and-play
+probes), so it is slow but obviously faithful. Replays must reproduce the
+per-game columns benchmark.dart records, and the vectorised unsafe test and
+Deep2 move values must equal givesBoxToOpponent and deep2Move's scores.
+
+Usage:
+  python -m pytest -q test_simulator.py
+"""
+
+import numpy as np
+import pytest
+
+from simulator import GAME_COLUMNS, Boards, deep2_values, geometry, replay, unsafe_mask
+
+
+# ---------- scalar port ----------
+
+class Game:
+    """game.dart for two players (player 0 / 1; box owner 0 = none)."""
+
+    def __init__(self, size):
+        self.size = size
+        self.h = [[False] * size for _ in range(size + 1)]
+        self.v = [[False] * (size + 1) for _ in range(size)]
+        self.boxes = [[0] * size for _ in range(size)]
+        self.player = 0
+
+    def clone(self):
+        g = Game(self.size)
+        g.h, g.v = [r[:] for r in self.h], [r[:] for r in self.v]
+        g.boxes, g.player = [r[:] for r in self.boxes], self.player
+        return g
+
+    def play_edge(self, x1, y1, x2, y2):
+        if abs(x1 - x2) + abs(y1 - y2) != 1:
+            return False
+        n, h, v, boxes = self.size, self.h, self.v, self.boxes
+        horiz = y1 == y2
+        if horiz:
+            row, col = y1, min(x1, x2)
+            if h[row][col]:
+                return False
+            h[row][col] = True
+            cands = [(row - 1, col)] if row > 0 else []
+            cands += [(row, col)] if row < n else []
+        else:
+            row, col = min(y1, y2), x1
+            if v[row][col]:
+                return False
+            v[row][col] = True
+            cands = [(row, col - 1)] if col > 0 else []
+            cands += [(row, col)] if col < n else []
+        completed = 0
+        for r, c in cands:
+            if h[r][c] and h[r + 1][c] and v[r][c] and v[r][c + 1] and boxes[r][c] == 0:
+                boxes[r][c] = self.player + 1
+                completed += 1
+        if completed == 0:
+            self.player = 1 - self.player
+        return True
+
+    def score(self, player):
+        return sum(row.count(player + 1) for row in self.boxes)
+
+    def available_edges(self):
+        n = self.size
+        moves = [[x, y, x + 1, y] for y in range(n + 1) for x in range(n) if not self.h[y][x]]
+        moves += [[x, y, x, y + 1] for y in range(n) for x in range(n + 1) if not self.v[y][x]]
+        return moves
+
+
+def gives_box_to_opponent(g, m):
+    sim = g.clone()
+    sim.play_edge(*m)
+    opp = sim.player
+    before = sim.score(opp)
+    for r in sim.available_edges():
+        sim2 = sim.clone()
+        sim2.play_edge(*r)
+        if sim2.score(opp) > before:
+            return True
+    return False
+
+
+def deep2_value(g, m):
+    """deep2Move's score of move m: my immediate gain − the opponent's best immediate gain."""
+    me, you = g.player, 1 - g.player
+    base_me, base_you = g.score(me), g.score(you)
+    sim1 = g.clone()
+    sim1.play_edge(*m)
+    worst = 0
+    for r in sim1.available_edges():
+        sim2 = sim1.clone()
+        sim2.play_edge(*r)
+        worst = max(worst, sim2.score(you) - base_you)
+    return sim1.score(me) - base_me - worst
+
+
+def benchmark_game(size, moves):
+    """playOneGame's per-game columns (benchmark.dart) for a logged stream of dot coordinates."""
+    g = Game(size)
+    unsafe, turns, longest, doubles = [0, 0], [0, 0], [0, 0], [0, 0]
+    last, streak = -1, 0
+    for m in moves:
+        mover = g.player
+        if mover != last:
+            streak, last = 0, mover
+        streak += 1
+        unsafe[mover] += gives_box_to_opponent(g, m)
+        before = g.score(mover)
+        assert g.play_edge(*m)
+        gained = g.score(mover) - before
+        turns[mover] += 1
+        doubles[mover] += gained == 2
+        if gained == 0:
+            longest[mover] = max(longest[mover], streak)
+    longest[last] = max(longest[last], streak)
+    return [g.score(0), g.score(1), *unsafe, *turns, *longest, *doubles]
+
+
+# ---------- checks ----------
+
+@pytest.mark.parametrize("size", [1, 2, 3, 4, 5])
+def test_replay_matches_scalar_port(size):
+    geo = geometry(size)
+    rng = np.random.default_rng(size)
+    moves = np.array([rng.permutation(geo.n_edges) for _ in range(12)])
+    got = replay(size, moves)[GAME_COLUMNS].to_numpy()
+    want = [benchmark_game(size, geo.coords[row].tolist()) for row in moves]
+    np.testing.assert_array_equal(got, want)
+
+
+def test_replay_accepts_dot_coordinates_in_either_order():
+    geo = geometry(3)
+    moves = np.random.default_rng(0).permutation(geo.n_edges)[None, :]
+    coords = geo.coords[moves]
+    flipped = coords[..., [2, 3, 0, 1]]
+    by_id = replay(3, moves)
+    assert by_id.equals(replay(3, coords))
+    assert by_id.equals(replay(3, flipped))
+
+
+def test_replay_rejects_a_repeated_edge():
+    geo = geometry(2)
+    moves = np.arange(geo.n_edges)[None, :].copy()
+    moves[0, -1] = 0
+    with pytest.raises(ValueError):
+        replay(2, moves)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 4, 5])
+def test_unsafe_and_deep2_values_match_ai_dart(size):
+    geo = geometry(size)
+    rng = np.random.default_rng(100 + size)
+    for _ in range(6):
+        order = rng.permutation(geo.n_edges)
+        played = order[:rng.integers(0, geo.n_edges)]
+        boards, g = Boards(size, 1), Game(size)
+        for e in played:
+            boards.play(np.array([e]))
+            g.play_edge(*geo.coords[e].tolist())
+        free = boards.free()
+        unsafe = unsafe_mask(geo, boards.sides, boards.three)[0]
+        values = deep2_values(geo, boards.sides, boards.three, free)[0]
+        for e in np.flatnonzero(free[0]):
+            m = geo.coords[e].tolist()
+            assert unsafe[e] == gives_box_to_opponent(g, m), (played.tolist(), e)
+            assert values[e] == deep2_value(g, m), (played.tolist(), e)
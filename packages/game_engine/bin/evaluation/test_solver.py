@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+solver.py against a plain memoised minimax.
+
+The reference has no pruning, ordering or symmetry: V(mask) is the max over
+free edges of k + V(mask | e) (k boxes completed) or −V(mask | e). The
+alpha-beta search must return the same values on 2×2 and late 3×3 positions,
+for all 8 symmetric images, and with a transposition table so small that every
+store evicts.
+
+Usage:
+  python -m pytest -q test_solver.py
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pytest
+
+from solver import Solver, symmetries
+
+
+def minimax(solver):
+    @lru_cache(maxsize=None)
+    def value(mask):
+        free = [e for e in range(solver.n_edges) if not mask >> e & 1]
+        if not free:
+            return 0
+        best = None
+        for e in free:
+            k = solver.gain(mask, e)
+            v = k + value(mask | 1 << e) if k else -value(mask | 1 << e)
+            best = v if best is None else max(best, v)
+        return best
+    return value
+
+
+def reference_move_values(solver, ref, mask):
+    out = {}
+    for e in range(solver.n_edges):
+        if not mask >> e & 1:
+            k = solver.gain(mask, e)
+            out[e] = k + ref(mask | 1 << e) if k else -ref(mask | 1 << e)
+    return out
+
+
+def random_masks(size, max_free, count, seed):
+    solver = Solver(size)
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        order = rng.permutation(solver.n_edges)
+        free = rng.integers(1, max_free + 1)
+        yield solver.mask_of(order[:solver.n_edges - free])
+
+
+def test_2x2_from_the_empty_board():
+    solver = Solver(2)
+    ref = minimax(solver)
+    assert solver.value(0) == ref(0)
+    assert solver.move_values(0) == reference_move_values(solver, ref, 0)
+
+
+@pytest.mark.parametrize("size, max_free", [(2, 12), (3, 12)])
+def test_values_match_minimax(size, max_free):
+    solver = Solver(size)
+    ref = minimax(solver)
+    for mask in random_masks(size, max_free, 40, seed=size):
+        assert solver.value(mask) == ref(mask), bin(mask)
+
+
+@pytest.mark.parametrize("size", [2, 3])
+def test_symmetric_images_share_the_value(size):
+    perms = symmetries(size)
+    solver = Solver(size)
+    ref = minimax(solver)
+    for mask in random_masks(size, 10, 10, seed=10 + size):
+        edges = [e for e in range(solver.n_edges) if mask >> e & 1]
+        want = ref(mask)
+        for p in perms:
+            image = solver.mask_of(p[edges])
+            assert ref(image) == want
+            assert solver.value(image) == want
+
+
+def test_exact_under_forced_lru_eviction():
+    solver = Solver(3, tt_mb=0)     # a one-entry table: every store evicts the previous one
+    assert solver.tt_cap == 1
+    ref = minimax(solver)
+    for mask in random_masks(3, 11, 25, seed=7):
+        assert solver.value(mask) == ref(mask), bin(mask)
+        assert len(solver.tt) <= 1
+        assert solver.move_values(mask) == reference_move_values(solver, ref, mask)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Move-level traces: a compact binary record per move, plus per-ply analytics.
+
+The per-game CSV only has per-game reductions (p50/p95 timings, counts), so
+questions like "at which ply does Deep2's think time spike" or "where in the
+game do unsafe moves cluster" need the moves themselves. A trace is an
+append-only file:
+
+  header   16 bytes: magic b"DBXTRACE", version (<u2), record size (<u2), 4 reserved
+  records  TRACE_DTYPE, 20 bytes each, little-endian:
+             game      <u4  id into the games table
+             ply       <u2  0-based move number within the game
+             edge      <u2  edge id in Game.availableEdges() order
+             ai_us     <u4  move selection time (µs)
+             apply_us  <u4  Game.playEdge time (µs)
+             player    u1   0 = P1, 1 = P2
+             boxes     u1   boxes completed by the move (0, 1, 2)
+             unsafe    u1   1 if givesBoxToOpponent was true for the move
+             pad       u1
+
+The games table is a CSV beside the trace (<trace>.games.csv: game, grid,
+p1_ai, p2_ai, game_idx), appended alongside the records. benchmark.dart
+writes benchmark2_trace.bin, and simulator.py --trace writes simulated games
+(with zero timings).
+
+open_trace() memory-maps the records as a NumPy structured array. A partially
+written last record is ignored. PlyProfile folds the records in fixed-size
+chunks with np.bincount into per-(grid, agent, ply) counts, sums and
+log-spaced timing histograms, so hundreds of millions of moves are
+aggregated without creating a Python object per move. Timing quantiles come
+from the histograms (bins 2^(1/8) wide: within ~4.4%).
+
+Writes:
+  out/trace_ply_profile.csv  grid, agent, ply, moves, ai_mean_us, ai_p50_us, ai_p95_us,
+                             apply_mean_us, apply_p95_us, unsafe_rate, boxes_per_move
+
+Usage:
+  python traces.py ../benchmark2_trace.bin
+  python traces.py run1/benchmark2_trace.bin run2/benchmark2_trace.bin --chunk 4000000
+"""
+
+import argparse
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset import DEFAULT_OUT
+
+TRACE_MAGIC = b"DBXTRACE"
+TRACE_VERSION = 1
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u2"), ("record_size", "<u2"), ("reserved", "<u4")])
+TRACE_DTYPE = np.dtype([("game", "<u4"), ("ply", "<u2"), ("edge", "<u2"),
+                        ("ai_us", "<u4"), ("apply_us", "<u4"),
+                        ("player", "u1"), ("boxes", "u1"), ("unsafe", "u1"), ("pad", "u1")])
+GAMES_COLUMNS = ["game", "grid", "p1_ai", "p2_ai", "game_idx"]
+CHUNK_RECORDS = 1 << 22
+BINS_PER_OCTAVE = 8
+N_BINS = 1 + 32 * BINS_PER_OCTAVE    # bin 0 holds 0 µs; uint32 µs cover 32 octaves
+
+
+def games_path(path):
+    """The games table beside a trace: run/benchmark2_trace.bin -> run/benchmark2_trace.games.csv."""
+    return Path(path).with_suffix(".games.csv")
+
+
+def _header():
+    h = np.zeros(1, dtype=HEADER_DTYPE)
+    h["magic"], h["version"], h["record_size"] = TRACE_MAGIC, TRACE_VERSION, TRACE_DTYPE.itemsize
+    return h
+
+
+def _check_header(path):
+    h = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(h) == 0 or h["magic"][0] != TRACE_MAGIC:
+        raise ValueError(f"{path} is not a move trace")
+    if h["version"][0] != TRACE_VERSION or h["record_size"][0] != TRACE_DTYPE.itemsize:
+        raise ValueError(f"{path}: trace version {h['version'][0]} / record size {h['record_size'][0]}, "
+                         f"expected {TRACE_VERSION} / {TRACE_DTYPE.itemsize}")
+
+
+# ---------- writing ----------
+
+
+class TraceWriter:
+    """Append records and their games to a trace (created with a header if missing)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.games_path = games_path(self.path)
+        if self.path.exists() and self.path.stat().st_size > 0:
+            _check_header(self.path)
+            self.next_game = (int(pd.read_csv(self.games_path, usecols=["game"])["game"].max()) + 1
+                              if self.games_path.exists() else 0)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "wb") as f:
+                _header().tofile(f)
+            pd.DataFrame(columns=GAMES_COLUMNS).to_csv(self.games_path, index=False)
+            self.next_game = 0
+
+    def append(self, records, games):
+        """Append a TRACE_DTYPE array and the games (GAMES_COLUMNS) its `game` ids refer to."""
+        records = np.asarray(records, dtype=TRACE_DTYPE)
+        with open(self.path, "ab") as f:
+            records.tofile(f)
+        games[GAMES_COLUMNS].to_csv(self.games_path, mode="a", header=False, index=False)
+        if len(games):
+            self.next_game = max(self.next_game, int(games["game"].max()) + 1)
+
+
+def game_records(game, edges, players, boxes, unsafe, ai_us=0, apply_us=0):
+    """TRACE_DTYPE records for (games × plies) arrays of full games, game-major."""
+    edges = np.asarray(edges)
+    out = np.zeros(edges.shape, dtype=TRACE_DTYPE)
+    out["game"] = np.asarray(game)[:, None]
+    out["ply"] = np.arange(edges.shape[1])
+    out["edge"], out["player"], out["boxes"], out["unsafe"] = edges, players, boxes, unsafe
+    out["ai_us"], out["apply_us"] = ai_us, apply_us
+    return out.ravel()
+
+
+# ---------- reading ----------
+
+
+def open_trace(path):
+    """(records, games): a read-only memmap of the records and the games table."""
+    path = Path(path)
+    _check_header(path)
+    size = path.stat().st_size - HEADER_DTYPE.itemsize
+    n, tail = divmod(size, TRACE_DTYPE.itemsize)
+    if tail:
+        warnings.warn(f"{path}: ignoring a partial last record ({tail} bytes)")
+    records = (np.memmap(path, dtype=TRACE_DTYPE, mode="r", offset=HEADER_DTYPE.itemsize, shape=(n,))
+               if n else np.zeros(0, dtype=TRACE_DTYPE))
+    gp = games_path(path)
+    games = pd.read_csv(gp) if gp.exists() else pd.DataFrame(columns=GAMES_COLUMNS)
+    return records, games
+
+
+def iter_chunks(records, chunk=CHUNK_RECORDS):
+    """Consecutive slices of at most `chunk` records (pages are read as they are touched)."""
+    for i in range(0, len(records), chunk):
+        yield records[i:i + chunk]
+
+
+def log_bin(us):
+    """Histogram bin of µs values: 0 for 0, else 1 + ⌊8·log2(us)⌋."""
+    us = np.asarray(us, dtype=np.float64)
+    with np.errstate(divide="ignore"):
+        b = 1 + np.floor(BINS_PER_OCTAVE * np.log2(np.maximum(us, 1)))
+    return np.where(us > 0, b, 0).astype(np.intp)
+
+
+def bin_value(b):
+    """Geometric midpoint (µs) of log_bin bins."""
+    b = np.asarray(b, dtype=np.float64)
+    return np.where(b > 0, 2.0 ** ((b - 0.5) / BINS_PER_OCTAVE), 0.0)
+
+
+def hist_quantiles(hist, q):
+    """Quantile q of every histogram row (last axis = bins); NaN for empty rows."""
+    cum = np.cumsum(hist, axis=-1)
+    total = cum[..., -1:]
+    idx = np.argmax(cum >= np.maximum(q * total, 1e-12), axis=-1)
+    return np.where(total[..., 0] > 0, bin_value(idx), np.nan)
+
+
+class PlyProfile:
+    """Per-(grid, agent, ply) move counts, sums and timing histograms, folded chunk by chunk."""
+
+    def __init__(self, games):
+        g = games.sort_values("game")
+        self.grids = np.sort(g["grid"].unique()).astype(np.int64)
+        self.agents = np.array(sorted(set(g["p1_ai"].astype(str)) | set(g["p2_ai"].astype(str))))
+        n_ids = int(g["game"].max()) + 1 if len(g) else 0
+        # game id -> grid code / seat agent codes (-1 for ids without a games row)
+        self.game_grid = np.full(n_ids, -1, dtype=np.intp)
+        self.game_agent = np.full((n_ids, 2), -1, dtype=np.intp)
+        ids = g["game"].to_numpy(dtype=np.intp)
+        self.game_grid[ids] = np.searchsorted(self.grids, g["grid"].to_numpy())
+        for seat, col in enumerate(("p1_ai", "p2_ai")):
+            self.game_agent[ids, seat] = np.searchsorted(self.agents, g[col].astype(str).to_numpy())
+        self.plies = int(2 * self.grids.max() * (self.grids.max() + 1)) if len(self.grids) else 0
+        shape = (len(self.grids), len(self.agents), self.plies)
+        self.moves = np.zeros(shape, dtype=np.int64)
+        self.sums = {c: np.zeros(shape) for c in ("ai_us", "apply_us", "unsafe", "boxes")}
+        self.hist = {c: np.zeros(shape + (N_BINS,), dtype=np.int64) for c in ("ai_us", "apply_us")}
+        self.unknown = 0    # records whose game id has no games row
+
+    def update(self, chunk):
+        game = chunk["game"].astype(np.intp)
+        known = game < len(self.game_grid)
+        known[known] = self.game_grid[game[known]] >= 0
+        if not known.all():
+            self.unknown += int((~known).sum())
+            chunk, game = chunk[known], game[known]
+        grid = self.game_grid[game]
+        agent = self.game_agent[game, chunk["player"].astype(np.intp)]
+        cell = (grid * len(self.agents) + agent) * self.plies + chunk["ply"].astype(np.intp)
+        size = self.moves.size
+        self.moves += np.bincount(cell, minlength=size).reshape(self.moves.shape)
+        for c, s in self.sums.items():
+            s += np.bincount(cell, weights=chunk[c], minlength=size).reshape(s.shape)
+        for c, h in self.hist.items():
+            h += np.bincount(cell * N_BINS + log_bin(chunk[c]), minlength=size * N_BINS).reshape(h.shape)
+        return self
+
+    def merge(self, other):
+        """Add another profile with the same grids, agents and plies."""
+        self.moves += other.moves
+        for c in self.sums:
+            self.sums[c] += other.sums[c]
+            if c in self.hist:
+                self.hist[c] += other.hist[c]
+        self.unknown += other.unknown
+        return self
+
+    def table(self):
+        """Flat DataFrame of the (grid, agent, ply) cells with at least one move."""
+        g, a, p = np.nonzero(self.moves)
+        n = self.moves[g, a, p]
+        out = pd.DataFrame({"grid": self.grids[g], "agent": self.agents[a], "ply": p, "moves": n})
+        out["ai_mean_us"] = self.sums["ai_us"][g, a, p] / n
+        out["ai_p50_us"] = hist_quantiles(self.hist["ai_us"][g, a, p], 0.50)
+        out["ai_p95_us"] = hist_quantiles(self.hist["ai_us"][g, a, p], 0.95)
+        out["apply_mean_us"] = self.sums["apply_us"][g, a, p] / n
+        out["apply_p95_us"] = hist_quantiles(self.hist["apply_us"][g, a, p], 0.95)
+        out["unsafe_rate"] = self.sums["unsafe"][g, a, p] / n
+        out["boxes_per_move"] = self.sums["boxes"][g, a, p] / n
+        return out
+
+
+def ply_profile(records, games, chunk=CHUNK_RECORDS):
+    prof = PlyProfile(games)
+    for part in iter_chunks(records, chunk):
+        prof.update(part)
+    return prof
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-ply analytics over binary move traces.")
+    ap.add_argument("traces", type=Path, nargs="+", help="trace files (.bin, with .games.csv beside them)")
+    ap.add_argument("--chunk", type=int, default=CHUNK_RECORDS, help="records per aggregation chunk")
+    ap.add_argument("--out", type=Path, default=DEFAULT_OUT, help="Output directory")
+    args = ap.parse_args()
+
+    opened = []
+    for path in args.traces:
+        if not path.exists():
+            print(f"ERROR: trace not found at: {path}"); sys.exit(1)
+        try:
+            opened.append(open_trace(path))
+        except ValueError as e:
+            print(f"ERROR: {e}"); sys.exit(1)
+
+    # one profile over all traces: offset game ids so every file keeps its own games
+    offset, games, parts = 0, [], []
+    for records, g in opened:
+        g = g.copy()
+        g["game"] += offset
+        games.append(g)
+        parts.append((records, offset))
+        offset = int(g["game"].max()) + 1 if len(g) else offset
+    prof = PlyProfile(pd.concat(games, ignore_index=True))
+    moves = 0
+    for records, off in parts:
+        for part in iter_chunks(records, args.chunk):
+            if off:
+                part = np.array(part)
+                part["game"] += off
+            prof.update(part)
+            moves += len(part)
+    if prof.unknown:
+        print(f"WARNING: {prof.unknown} records refer to games missing from the games table")
+
+    table = prof.table()
+    args.out.mkdir(parents=True, exist_ok=True)
+    table.to_csv(args.out / "trace_ply_profile.csv", index=False)
+
+    print(f"{moves} moves in {sum(len(g) for g in games)} games")
+    for (grid, agent), sub in table.groupby(["grid", "agent"]):
+        peak = sub.loc[sub["ai_mean_us"].idxmax()]
+        risky = sub.loc[sub["unsafe_rate"].idxmax()]
+        print(f"  {grid}x{grid} {agent:12s} think time peaks at ply {int(peak['ply'])} "
+              f"({peak['ai_mean_us']:.0f} µs mean, p95 {peak['ai_p95_us']:.0f} µs); "
+              f"unsafe rate peaks at ply {int(risky['ply'])} ({100 * risky['unsafe_rate']:.0f}%)")
+    print(f"\nWrote:\n - {args.out / 'trace_ply_profile.csv'}")
+
+
+if __name__ == "__main__":
+    main()
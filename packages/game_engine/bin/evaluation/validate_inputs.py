@@ -83,19 +83,126 @@
 # D:\Project\dots_and_boxes_ws\packages\game_engine\bin\evaluation\validate_inputs.py
 import pandas as pd
 import numpy as np
-from pathlib import Path
-import argparse
 import sys
+from streaming import GamesAccumulator, KEY, ROLES, TIMING_METRICS, TIMING_QUANTILE_METRICS, detect_unsafe_suffix
+from columnar_cache import read_games, read_summary
+from evaluation import validate_parser
+
+GAMES_COLUMNS = ['grid','p1_ai','p2_ai','p1_score','p2_score',
+                 'p1_unsafe_moves','p2_unsafe_moves','p1_unsafe','p2_unsafe',
+                 'p1_turns','p2_turns'] + [f"{r}_{t}_ms" for r in ROLES for t in TIMING_METRICS]
+
+# Both CSVs round timings to 0.001 ms, so a recomputed mean can be off by up to
+# two rounding steps.
+TIMING_TOL = 2e-3
+
+def _fmt_key(grid, p1, p2):
+    return f"[grid={grid}, {p1} vs {p2}]"
+
+def check_against_aggregates(summary, agg, tol=1e-3, timing_tol=TIMING_TOL):
+    """
+    Compare summary rows with per-(grid, p1_ai, p2_ai) per-game aggregates
+    (GamesAccumulator.ordered() layout) via one left join on the ordered key.
+    Checks wins/ties/games, role-aligned unsafe averages and, when both sides have
+    them, timings: per-move means (turn-weighted per-game means) and p50/p95 (must
+    lie within the per-game range, as a pooled quantile always does). Also reports
+    summary rows without games and matchups with games but no summary row.
+    Returns a list of error strings.
+    """
+    s = summary.reset_index(drop=True)
+    s = s.assign(grid=s['grid'].astype(int), p1_ai=s['p1_ai'].astype(str), p2_ai=s['p2_ai'].astype(str))
+    g = agg.assign(grid=agg['grid'].astype(int), p1_ai=agg['p1_ai'].astype(str), p2_ai=agg['p2_ai'].astype(str))
+    g = g.rename(columns={c: f"g_{c}" for c in g.columns if c not in KEY})
+    m = s.merge(g, on=KEY, how='left', indicator=True)   # left join keeps summary order
+    found = (m['_merge'] == 'both').to_numpy()
+    keys = [_fmt_key(*k) for k in m[KEY].itertuples(index=False)]
+    errs = []
+
+    # ---- 1) wins/ties/games per ordered summary row ----
+    cnt = {c: m[f"g_{c}"].fillna(0).astype(int).to_numpy() for c in ['p1_wins','p2_wins','ties','n']}
+    bad = ~found.copy()
+    for c, sc in [('p1_wins','p1_wins'), ('p2_wins','p2_wins'), ('ties','ties'), ('n','games')]:
+        bad |= found & (cnt[c] != m[sc].astype(int).to_numpy())
+    for i in np.flatnonzero(bad):
+        if not found[i]:
+            errs.append(f"{keys[i]} no per-game rows found")
+            continue
+        r = m.iloc[i]
+        errs.append(
+            f"{keys[i]} "
+            f"summary p1/p2/ties/games=({r['p1_wins']},{r['p2_wins']},{r['ties']},{r['games']}) "
+            f"!= per-game ({cnt['p1_wins'][i]},{cnt['p2_wins'][i]},{cnt['ties'][i]},{cnt['n'][i]})"
+        )
+
+    n = m['g_n'].to_numpy(dtype=float)
+
+    # ---- 2) role-aligned unsafe averages ----
+    for i, rows in _mismatches(m, found, [(f"{r}_unsafe_avg", m[f"g_{r}_unsafe_sum"] / n) for r in ROLES
+                                          if f"{r}_unsafe_avg" in m.columns], tol):
+        for col, games_v, summ_v in rows:
+            errs.append(f"{keys[i]} {col} mismatch: games={games_v:.3f}, summary={summ_v:.3f}")
+
+    # ---- 3) timings ----
+    means = [(f"{r}_{t}_ms", m[f"g_{r}_{t}_wsum"] / m[f"g_{r}_turns_sum"])
+             for r in ROLES for t in TIMING_METRICS
+             if f"{r}_{t}_ms" in m.columns and f"g_{r}_{t}_wsum" in m.columns]
+    for i, rows in _mismatches(m, found, means, timing_tol):
+        for col, games_v, summ_v in rows:
+            errs.append(f"{keys[i]} {col} mismatch: games={games_v:.3f}, summary={summ_v:.3f}")
+
+    quants = [f"{r}_{t}_ms" for r in ROLES for t in TIMING_QUANTILE_METRICS
+              if f"{r}_{t}_ms" in m.columns and f"g_{r}_{t}_min" in m.columns]
+    out_of_range = {}
+    for col in quants:
+        v = m[col].to_numpy(dtype=float)
+        lo = m[f"g_{col[:-3]}_min"].to_numpy(dtype=float)
+        hi = m[f"g_{col[:-3]}_max"].to_numpy(dtype=float)
+        for i in np.flatnonzero(found & ((v < lo - timing_tol) | (v > hi + timing_tol))):
+            out_of_range.setdefault(i, []).append(
+                f"{keys[i]} {col} outside per-game range: summary={v[i]:.3f}, games=[{lo[i]:.3f}, {hi[i]:.3f}]")
+    for i in sorted(out_of_range):
+        errs.extend(out_of_range[i])
+
+    # ---- 4) per-game matchups with no summary row ----
+    orphans = g[KEY + ['g_n']].merge(s[KEY].drop_duplicates(), on=KEY, how='left', indicator=True)
+    for r in orphans[orphans['_merge'] == 'left_only'].itertuples(index=False):
+        errs.append(f"{_fmt_key(r.grid, r.p1_ai, r.p2_ai)} {int(r.g_n)} per-game rows have no summary row")
+    return errs
+
+def _mismatches(m, found, checks, tol):
+    """
+    Rows (in summary order) where |games - summary| > tol for any (summary column,
+    per-game values) pair in `checks`. Yields (row, [(column, games, summary), ...]).
+    """
+    hits = {}
+    for col, games_v in checks:
+        gv = np.asarray(games_v, dtype=float)
+        sv = m[col].to_numpy(dtype=float)
+        for i in np.flatnonzero(found & (np.abs(gv - sv) > tol)):
+            hits.setdefault(i, []).append((col, gv[i], sv[i]))
+    for i in sorted(hits):
+        yield i, hits[i]
+
+def check_games(summary, games):
+    """
+    Cross-check ordered summary rows against in-memory per-game rows: the games are
+    folded into per-matchup aggregates with one groupby, then compared as in
+    check_against_aggregates. Raises KeyError when the per-game unsafe columns are
+    missing.
+    """
+    acc = GamesAccumulator(unsafe_suffix=detect_unsafe_suffix(games.columns))
+    return check_against_aggregates(summary, acc.update(games).ordered())
+
+def report(errs):
+    if errs:
+        print("VALIDATION FAILURES:")
+        for e in errs: print(" -", e)
+        sys.exit(1)
+
+    print("All summary↔games (order-preserving) cross-checks PASSED.")
 
 def main():
-    default_summary = r"D:\Project\dots_and_boxes_ws\packages\game_engine\bin\benchmark2_summary.csv"
-    default_games   = r"D:\Project\dots_and_boxes_ws\packages\game_engine\bin\benchmark2_games.csv"
-
-    ap = argparse.ArgumentParser(description="Cross-check summary vs per-game CSVs (order-preserving)")
-    ap.add_argument("--summary", type=Path, default=default_summary,
-                    help="Path to benchmark2_summary.csv")
-    ap.add_argument("--games", type=Path, default=default_games,
-                    help="Path to benchmark2_games.csv")
+    ap = validate_parser()
     args = ap.parse_args()
 
     if not args.summary.exists():
@@ -103,74 +210,28 @@ def main():
     if not args.games.exists():
         print(f"ERROR: games CSV not found at: {args.games}"); sys.exit(1)
 
-    summary = pd.read_csv(args.summary)
-    games   = pd.read_csv(args.games)
-
+    summary = read_summary(args.summary) if args.cache else pd.read_csv(args.summary)
     summary['grid'] = summary['grid'].astype(int)
+
+    if args.chunksize:
+        try:
+            acc = GamesAccumulator.from_csv(args.games, chunksize=args.chunksize)
+        except KeyError as e:
+            print(f"ERROR: {e.args[0]}"); sys.exit(1)
+        report(check_against_aggregates(summary, acc.ordered()))
+        return
+
+    games   = read_games(args.games, columns=GAMES_COLUMNS) if args.cache else pd.read_csv(args.games)
     games['grid']   = games['grid'].astype(int)
 
-    # detect per-game unsafe column names
-    if {'p1_unsafe_moves','p2_unsafe_moves'}.issubset(games.columns):
-        G_UNSAFE_P1, G_UNSAFE_P2 = 'p1_unsafe_moves', 'p2_unsafe_moves'
-    elif {'p1_unsafe','p2_unsafe'}.issubset(games.columns):
-        G_UNSAFE_P1, G_UNSAFE_P2 = 'p1_unsafe', 'p2_unsafe'
-    else:
+    try:
+        errs = check_games(summary, games)
+    except KeyError:
         print("ERROR: per-game CSV missing unsafe columns "
               "(need p1_unsafe_moves/p2_unsafe_moves or p1_unsafe/p2_unsafe).")
         print("Columns present:", list(games.columns)); sys.exit(1)
 
-    # per-game winners (order-preserving)
-    games['winner'] = np.where(games['p1_score'] > games['p2_score'], 'p1',
-                        np.where(games['p2_score'] > games['p1_score'], 'p2', 'tie'))
-
-    errs = []
-
-    # ---- 1) Validate wins/ties/games per *ordered* summary row ----
-    for _, r in summary.iterrows():
-        grid = int(r['grid'])
-        p1, p2 = r['p1_ai'], r['p2_ai']
-        gdf = games[(games['grid']==grid) & (games['p1_ai']==p1) & (games['p2_ai']==p2)]
-        if gdf.empty:
-            errs.append(f"[grid={grid}, {p1} vs {p2}] no per-game rows found")
-            continue
-
-        p1_wins_g = (gdf['winner']=='p1').sum()
-        p2_wins_g = (gdf['winner']=='p2').sum()
-        ties_g    = (gdf['winner']=='tie').sum()
-        n_g       = len(gdf)
-
-        if (p1_wins_g != int(r['p1_wins']) or
-            p2_wins_g != int(r['p2_wins']) or
-            ties_g    != int(r['ties'])     or
-            n_g       != int(r['games'])):
-            errs.append(
-                f"[grid={grid}, {p1} vs {p2}] "
-                f"summary p1/p2/ties/games=({r['p1_wins']},{r['p2_wins']},{r['ties']},{r['games']}) "
-                f"!= per-game ({p1_wins_g},{p2_wins_g},{ties_g},{n_g})"
-            )
-
-    # ---- 2) Role-aligned unsafe averages per ordered row ----
-    tol = 1e-3
-    for _, r in summary.iterrows():
-        grid = int(r['grid']); p1, p2 = r['p1_ai'], r['p2_ai']
-        gdf = games[(games['grid']==grid) & (games['p1_ai']==p1) & (games['p2_ai']==p2)]
-        if gdf.empty:  # already reported above
-            continue
-        p1_mean = gdf[G_UNSAFE_P1].mean()
-        p2_mean = gdf[G_UNSAFE_P2].mean()
-        if abs(p1_mean - float(r['p1_unsafe_avg'])) > tol:
-            errs.append(f"[grid={grid}, {p1} vs {p2}] p1_unsafe_avg mismatch: "
-                        f"games={p1_mean:.3f}, summary={float(r['p1_unsafe_avg']):.3f}")
-        if abs(p2_mean - float(r['p2_unsafe_avg'])) > tol:
-            errs.append(f"[grid={grid}, {p1} vs {p2}] p2_unsafe_avg mismatch: "
-                        f"games={p2_mean:.3f}, summary={float(r['p2_unsafe_avg']):.3f}")
-
-    if errs:
-        print("VALIDATION FAILURES:")
-        for e in errs: print(" -", e)
-        sys.exit(1)
-
-    print("All summary↔games (order-preserving) cross-checks PASSED.")
+    report(errs)
 
 if __name__ == "__main__":
     main()
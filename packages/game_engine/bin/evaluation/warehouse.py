@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Local SQLite warehouse of benchmark runs, for ad-hoc SQL over many runs.
+
+`ingest` bulk-loads one run's per-game and summary CSVs under a new run id,
+streaming the games CSV in chunks. Each chunk is a batched executemany, and the
+whole run is one transaction. Tables:
+
+  runs      run_id, label (unique), source paths, games CSV sha1, row counts, ingested_at
+  games     run_id + the runner's per-game columns (p1_unsafe is stored as p1_unsafe_moves)
+  summary   run_id + the runner's summary columns
+  matchups  per (run_id, grid, p1_ai, p2_ai): games, wins, ties and the per-role
+            sums the views need, filled from `games` in the same transaction
+
+games, summary and matchups have composite indexes on (grid, p1_ai, p2_ai, run_id).
+The analysis outputs are views over `summary` and `matchups` (a few dozen rows
+per run), so point queries stay in the milliseconds however many games there are:
+
+  wins_unordered                    = analyze_all.wins_unordered (summary rows)
+  unsafe_by_agent_games             = analyze_all.unsafe_by_agent_games
+  unsafe_by_agent_summary           = analyze_all.unsafe_by_agent_summary
+  unsafe_by_agent_summary_vs_games  = both, outer-joined on (run_id, grid, agent)
+  game_length_by_grid               = analyze_all.game_length_by_grid
+  longest_streak_by_agent           = analyze_all.streaks_by_agent
+  order_summary / order_summary_half = analysis.py's order summary, ties excluded
+                                      (with Wilson CI) / counted as half a win
+
+Every view has a run_id column; join `runs` for labels. An ingest creates or
+upgrades the schema and views when the file's user_version is older than
+SCHEMA_VERSION. `runs` and `query` open the file read-only and never write to it
+(query --write allows statements that modify it).
+
+Usage:
+  python warehouse.py ingest --games ../benchmark2_games.csv --summary ../benchmark2_summary.csv --run baseline
+  python warehouse.py ingest --games runs/after/benchmark2_games.csv --run after --replace
+  python warehouse.py runs
+  python warehouse.py query "SELECT r.label, w.* FROM wins_unordered w JOIN runs r USING (run_id)
+                             WHERE grid = 6 AND agent_A = 'Deep2' AND agent_B = 'Random'"
+"""
+
+import argparse
+import math
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_DB = HERE / "out" / "results.sqlite"
+SCHEMA_VERSION = 1
+INSERT_BATCH = 50_000   # rows per executemany
+
+ROLES = ("p1", "p2")
+TIMING_COLS = [f"{r}_{kind}_{t}_ms" for kind in ("ai", "apply") for r in ROLES for t in ("mean", "p50", "p95")]
+GAMES_INT_COLS = ["game_idx", "p1_score", "p2_score", "p1_unsafe_moves", "p2_unsafe_moves",
+                  "p1_turns", "p2_turns", "p1_longest_streak", "p2_longest_streak"]
+GAMES_COLS = ["grid", "p1_ai", "p2_ai"] + GAMES_INT_COLS + TIMING_COLS
+SUMMARY_INT_COLS = ["games", "p1_wins", "p2_wins", "ties", "total_boxes"]
+SUMMARY_COLS = ["grid", "games", "p1_ai", "p2_ai", "p1_wins", "p2_wins", "ties", "p1_avg", "p2_avg",
+                "total_boxes", "p1_unsafe_avg", "p2_unsafe_avg", "p1_turns_avg", "p2_turns_avg",
+                "p1_streak_avg", "p2_streak_avg"] + TIMING_COLS
+
+
+def _coldefs(cols, ints):
+    text = {"p1_ai", "p2_ai"}
+    return ",\n    ".join(f"{c} {'TEXT NOT NULL' if c in text else 'INTEGER' if c in ints or c == 'grid' else 'REAL'}"
+                          for c in cols)
+
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT NOT NULL UNIQUE,
+    games_path TEXT,
+    summary_path TEXT,
+    games_sha1 TEXT,
+    n_games INTEGER,
+    n_summary INTEGER,
+    ingested_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+    run_id INTEGER NOT NULL,
+    {_coldefs(GAMES_COLS, GAMES_INT_COLS)}
+);
+CREATE INDEX IF NOT EXISTS games_matchup ON games (grid, p1_ai, p2_ai, run_id);
+CREATE INDEX IF NOT EXISTS games_run ON games (run_id);
+CREATE TABLE IF NOT EXISTS summary (
+    run_id INTEGER NOT NULL,
+    {_coldefs(SUMMARY_COLS, SUMMARY_INT_COLS)}
+);
+CREATE INDEX IF NOT EXISTS summary_matchup ON summary (grid, p1_ai, p2_ai, run_id);
+CREATE TABLE IF NOT EXISTS matchups (
+    run_id INTEGER NOT NULL,
+    grid INTEGER NOT NULL,
+    p1_ai TEXT NOT NULL,
+    p2_ai TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    p1_wins INTEGER NOT NULL,
+    p2_wins INTEGER NOT NULL,
+    ties INTEGER NOT NULL,
+    p1_unsafe_sum INTEGER,
+    p2_unsafe_sum INTEGER,
+    p1_streak_sum INTEGER,
+    p2_streak_sum INTEGER,
+    turns_sum INTEGER,
+    turns_sumsq INTEGER,
+    PRIMARY KEY (grid, p1_ai, p2_ai, run_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS matchups_run ON matchups (run_id);
+"""
+
+FILL_MATCHUPS = """
+INSERT INTO matchups
+SELECT run_id, grid, p1_ai, p2_ai, COUNT(*),
+       SUM(p1_score > p2_score), SUM(p1_score < p2_score), SUM(p1_score = p2_score),
+       SUM(p1_unsafe_moves), SUM(p2_unsafe_moves),
+       SUM(p1_longest_streak), SUM(p2_longest_streak),
+       SUM(p1_turns + p2_turns), SUM((p1_turns + p2_turns) * (p1_turns + p2_turns))
+FROM games WHERE run_id = ?
+GROUP BY run_id, grid, p1_ai, p2_ai
+"""
+
+
+# ---------- views ----------
+
+def _wilson(k, n, z=1.96):
+    """SQL for the clamped Wilson interval (intervals.wilson_ci) of k successes in n; NULL when n = 0."""
+    p, zz = f"(1.0 * {k} / {n})", z * z
+    center = f"(({p} + {zz / 2} / {n}) / (1 + {zz} / {n}))"
+    half = f"({z} * sqrt(({p} * (1 - {p}) + {zz / 4} / {n}) / {n}) / (1 + {zz} / {n}))"
+    return (f"CASE WHEN {n} > 0 THEN max(0.0, {center} - {half}) END",
+            f"CASE WHEN {n} > 0 THEN min(1.0, {center} + {half}) END")
+
+
+def _order_summary_view(name, tie):
+    """analysis.order_summary_from_counts for every run: all grids × ordered pairs of distinct agents."""
+    cols = []
+    for side, (w, t, l) in (("A_to_B", ("w1", "t1", "l1")), ("B_to_A", ("w2", "t2", "l2"))):
+        if tie == "exclude":
+            n = f"({w} + {l})"
+            lo, hi = _wilson(w, n)
+            cols += [f"CASE WHEN {n} > 0 THEN 1.0 * {w} / {n} END AS p_{side}", f"{lo} AS p_{side}_lo",
+                     f"{hi} AS p_{side}_hi"]
+        else:
+            n = f"({w} + {t} + {l})"
+            cols += [f"CASE WHEN {n} > 0 THEN ({w} + 0.5 * {t}) / {n} END AS p_{side}",
+                     f"NULL AS p_{side}_lo", f"NULL AS p_{side}_hi"]
+        cols.append(f"{w} + {t} + {l} AS n_{side[0]}{side[-1]}")
+    return f"""
+CREATE VIEW {name} AS
+WITH agents AS (SELECT run_id, p1_ai AS agent FROM matchups UNION SELECT run_id, p2_ai FROM matchups),
+grids AS (SELECT DISTINCT run_id, grid FROM matchups),
+counts AS (
+    SELECT g.run_id, g.grid, a.agent AS agent_A, b.agent AS agent_B,
+           coalesce(ab.p1_wins, 0) AS w1, coalesce(ab.ties, 0) AS t1, coalesce(ab.p2_wins, 0) AS l1,
+           coalesce(ba.p1_wins, 0) AS w2, coalesce(ba.ties, 0) AS t2, coalesce(ba.p2_wins, 0) AS l2
+    FROM grids g
+    JOIN agents a ON a.run_id = g.run_id
+    JOIN agents b ON b.run_id = g.run_id AND b.agent <> a.agent
+    LEFT JOIN matchups ab ON (ab.grid, ab.p1_ai, ab.p2_ai, ab.run_id) = (g.grid, a.agent, b.agent, g.run_id)
+    LEFT JOIN matchups ba ON (ba.grid, ba.p1_ai, ba.p2_ai, ba.run_id) = (g.grid, b.agent, a.agent, g.run_id)
+),
+rates AS (SELECT run_id, grid, agent_A, agent_B, {", ".join(cols)} FROM counts)
+SELECT *, 0.5 * (p_A_to_B + (1 - p_B_to_A)) AS s, p_A_to_B - (1 - p_B_to_A) AS Delta FROM rates
+"""
+
+
+VIEWS = {
+    "wins_unordered": """
+CREATE VIEW wins_unordered AS
+SELECT run_id, grid, agent_A, agent_B,
+       SUM(A_wins) AS A_wins, SUM(B_wins) AS B_wins, SUM(ties) AS ties, SUM(games) AS games,
+       CASE WHEN SUM(games) > 0 THEN 1.0 * SUM(A_wins) / SUM(games) END AS A_win_rate,
+       CASE WHEN SUM(games) > 0 THEN 1.0 * SUM(B_wins) / SUM(games) END AS B_win_rate,
+       CASE WHEN SUM(games) > 0 THEN 1.0 * SUM(ties) / SUM(games) END AS tie_rate
+FROM (SELECT run_id, grid, ties, games,
+             CASE WHEN p1_ai <= p2_ai THEN p1_ai ELSE p2_ai END AS agent_A,
+             CASE WHEN p1_ai <= p2_ai THEN p2_ai ELSE p1_ai END AS agent_B,
+             CASE WHEN p1_ai <= p2_ai THEN p1_wins ELSE p2_wins END AS A_wins,
+             CASE WHEN p1_ai <= p2_ai THEN p2_wins ELSE p1_wins END AS B_wins
+      FROM summary)
+GROUP BY run_id, grid, agent_A, agent_B
+""",
+    "agent_roles": """
+CREATE VIEW agent_roles AS
+SELECT run_id, grid, p1_ai AS agent, n, p1_unsafe_sum AS unsafe_sum, p1_streak_sum AS streak_sum FROM matchups
+UNION ALL
+SELECT run_id, grid, p2_ai, n, p2_unsafe_sum, p2_streak_sum FROM matchups
+""",
+    "unsafe_by_agent_games": """
+CREATE VIEW unsafe_by_agent_games AS
+SELECT run_id, grid, agent, 1.0 * SUM(unsafe_sum) / SUM(n) AS unsafe_mean_games
+FROM agent_roles GROUP BY run_id, grid, agent
+""",
+    "unsafe_by_agent_summary": """
+CREATE VIEW unsafe_by_agent_summary AS
+SELECT run_id, grid, agent, AVG(v) AS unsafe_mean_summary
+FROM (SELECT run_id, grid, p1_ai AS agent, p1_unsafe_avg AS v FROM summary
+      UNION ALL
+      SELECT run_id, grid, p2_ai, p2_unsafe_avg FROM summary)
+GROUP BY run_id, grid, agent
+""",
+    "unsafe_by_agent_summary_vs_games": """
+CREATE VIEW unsafe_by_agent_summary_vs_games AS
+SELECT k.run_id, k.grid, k.agent, s.unsafe_mean_summary, g.unsafe_mean_games
+FROM (SELECT run_id, grid, agent FROM unsafe_by_agent_summary
+      UNION
+      SELECT run_id, grid, agent FROM unsafe_by_agent_games) k
+LEFT JOIN unsafe_by_agent_summary s ON (s.run_id, s.grid, s.agent) = (k.run_id, k.grid, k.agent)
+LEFT JOIN unsafe_by_agent_games g ON (g.run_id, g.grid, g.agent) = (k.run_id, k.grid, k.agent)
+""",
+    "game_length_by_grid": """
+CREATE VIEW game_length_by_grid AS
+SELECT run_id, grid, 1.0 * SUM(turns_sum) / SUM(n) AS turns_mean,
+       CASE WHEN SUM(n) > 1
+            THEN sqrt((1.0 * SUM(n) * SUM(turns_sumsq) - 1.0 * SUM(turns_sum) * SUM(turns_sum))
+                      / (1.0 * SUM(n) * (SUM(n) - 1))) END AS turns_std,
+       SUM(n) AS n, agent_A, agent_B
+FROM (SELECT *, CASE WHEN p1_ai <= p2_ai THEN p1_ai ELSE p2_ai END AS agent_A,
+                CASE WHEN p1_ai <= p2_ai THEN p2_ai ELSE p1_ai END AS agent_B
+      FROM matchups)
+GROUP BY run_id, grid, agent_A, agent_B
+""",
+    "longest_streak_by_agent": """
+CREATE VIEW longest_streak_by_agent AS
+SELECT run_id, grid, agent, 1.0 * SUM(streak_sum) / SUM(n) AS longest_streak_mean
+FROM agent_roles GROUP BY run_id, grid, agent
+""",
+    "order_summary": _order_summary_view("order_summary", "exclude"),
+    "order_summary_half": _order_summary_view("order_summary_half", "half"),
+}
+
+
+def connect(path=DEFAULT_DB, readonly=False):
+    """
+    Open the warehouse. A writable open creates the tables, and (re)creates the
+    views only when user_version is missing or older than SCHEMA_VERSION (bump
+    it whenever a view changes), so opening an up-to-date file writes nothing.
+    A read-only open never writes and needs an up-to-date file.
+    """
+    path = Path(path)
+    if readonly:
+        if not path.exists():
+            raise ValueError(f"warehouse not found at: {path}")
+        conn = sqlite3.connect(f"file:{path.resolve()}?mode=ro", uri=True)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path)
+    try:
+        conn.execute("SELECT sqrt(4.0)")
+    except sqlite3.OperationalError:   # SQLite built without the math functions
+        conn.create_function("sqrt", 1, math.sqrt, deterministic=True)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == SCHEMA_VERSION:
+        return conn
+    conn.close()
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"{path} has warehouse schema {version}, this script writes {SCHEMA_VERSION}")
+    if readonly:
+        raise ValueError(f"{path} has warehouse schema {version}, expected {SCHEMA_VERSION} "
+                         "(the next ingest upgrades it)" if version else f"{path} is not a results warehouse")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript(SCHEMA)
+        for name, sql in VIEWS.items():
+            conn.execute(f"DROP VIEW IF EXISTS {name}")
+            conn.execute(sql)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return connect(path)
+
+
+# ---------- ingest ----------
+
+def _rows(frame, cols, run_id):
+    """Tuples (run_id, *cols) with Python scalars; missing columns and NaN become NULL."""
+    import numpy as np
+    arrays = []
+    for c in cols:
+        if c not in frame.columns:
+            arrays.append([None] * len(frame))
+            continue
+        v = frame[c]
+        if v.dtype.kind == "f":
+            a = v.to_numpy(dtype=object)
+            a[np.isnan(v.to_numpy())] = None
+            arrays.append(a.tolist())
+        else:
+            arrays.append(v.astype(object).tolist() if v.dtype.kind in "OUSb" or str(v.dtype) == "category"
+                          else v.to_numpy().tolist())
+    return list(zip([run_id] * len(frame), *arrays))
+
+
+def ingest(conn, games_path, summary_path=None, label=None, replace=False, chunksize=INSERT_BATCH):
+    """Load one run in a single transaction. Returns (run_id, games rows, summary rows)."""
+    import pandas as pd
+    from columnar_cache import file_sha1
+    from streaming import GAMES_DTYPES, detect_unsafe_suffix, iter_games, read_header
+
+    label = label or Path(games_path).resolve().parent.name
+    header = read_header(games_path)
+    rename = {f"{r}_{detect_unsafe_suffix(header)}": f"{r}_unsafe_moves" for r in ROLES}
+    games_sql = f"INSERT INTO games (run_id, {', '.join(GAMES_COLS)}) VALUES ({', '.join('?' * (len(GAMES_COLS) + 1))})"
+    summary_sql = (f"INSERT INTO summary (run_id, {', '.join(SUMMARY_COLS)}) "
+                   f"VALUES ({', '.join('?' * (len(SUMMARY_COLS) + 1))})")
+    with conn:   # one transaction: a failed ingest leaves the warehouse unchanged
+        old = conn.execute("SELECT run_id FROM runs WHERE label = ?", (label,)).fetchone()
+        if old and not replace:
+            raise ValueError(f"run {label!r} is already in the warehouse (pass --replace to reload it)")
+        if old:
+            for table in ("games", "summary", "matchups", "runs"):
+                conn.execute(f"DELETE FROM {table} WHERE run_id = ?", old)
+        run_id = conn.execute(
+            "INSERT INTO runs (label, games_path, summary_path, games_sha1, ingested_at) VALUES (?, ?, ?, ?, ?)",
+            (label, str(games_path), str(summary_path) if summary_path else None, file_sha1(games_path),
+             datetime.now(timezone.utc).isoformat(timespec="seconds"))).lastrowid
+        n_games = 0
+        usecols = [c for c in header if c in GAMES_COLS or c in rename]
+        dtype = {c: "float64" if t == "float32" else t for c, t in GAMES_DTYPES.items()}   # keep the CSV's 0.123
+        for chunk in iter_games(games_path, chunksize=chunksize, usecols=usecols, dtype=dtype):
+            conn.executemany(games_sql, _rows(chunk.rename(columns=rename), GAMES_COLS, run_id))
+            n_games += len(chunk)
+        conn.execute(FILL_MATCHUPS, (run_id,))
+        n_summary = 0
+        if summary_path is not None:
+            summary = pd.read_csv(summary_path)
+            conn.executemany(summary_sql, _rows(summary, SUMMARY_COLS, run_id))
+            n_summary = len(summary)
+        conn.execute("UPDATE runs SET n_games = ?, n_summary = ? WHERE run_id = ?", (n_games, n_summary, run_id))
+    return run_id, n_games, n_summary
+
+
+# ---------- output ----------
+
+def print_rows(cursor, limit=None):
+    cols = [d[0] for d in cursor.description]
+    rows = cursor.fetchall() if limit is None else cursor.fetchmany(limit)
+    cells = [[("" if v is None else f"{v:.6g}" if isinstance(v, float) else str(v)) for v in r] for r in rows]
+    widths = [max([len(c)] + [len(r[i]) for r in cells]) for i, c in enumerate(cols)]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+    return len(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load benchmark runs into a local SQLite warehouse and query it.")
+    ap.add_argument("--db", type=Path, default=DEFAULT_DB, help="warehouse file (default: out/results.sqlite)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    ing = sub.add_parser("ingest", help="load one run's per-game (and summary) CSV under a new run id")
+    ing.add_argument("--games", type=Path, required=True, help="Path to benchmark2_games.csv")
+    ing.add_argument("--summary", type=Path, default=None, help="Path to benchmark2_summary.csv")
+    ing.add_argument("--run", default=None, help="run label (default: the games CSV's directory name)")
+    ing.add_argument("--replace", action="store_true", help="reload a run whose label already exists")
+    ing.add_argument("--chunksize", type=int, default=INSERT_BATCH, help="rows per batched insert")
+    sub.add_parser("runs", help="list the ingested runs")
+    q = sub.add_parser("query", help="run one SQL statement and print the rows")
+    q.add_argument("sql", help="SQL text (tables: runs, games, summary, matchups; views: see --help)")
+    q.add_argument("--limit", type=int, default=None, help="print at most N rows")
+    q.add_argument("--write", action="store_true", help="open read-write (for statements that modify the file)")
+    args = ap.parse_args()
+
+    if args.command == "ingest":
+        for name, p in (("games", args.games), ("summary", args.summary)):
+            if p is not None and not p.exists():
+                print(f"ERROR: {name} CSV not found at: {p}"); sys.exit(1)
+    try:
+        conn = connect(args.db, readonly=args.command == "runs" or (args.command == "query" and not args.write))
+    except (ValueError, sqlite3.Error) as e:
+        print(f"ERROR: {e.args[0]}"); sys.exit(1)
+
+    if args.command == "ingest":
+        t0 = time.perf_counter()
+        try:
+            run_id, n_games, n_summary = ingest(conn, args.games, args.summary, args.run, args.replace,
+                                                args.chunksize)
+        except ValueError as e:
+            print(f"ERROR: {e.args[0]}"); sys.exit(1)
+        print(f"run {run_id}: {n_games} games, {n_summary} summary rows in {time.perf_counter() - t0:.1f}s"
+              f" -> {args.db}")
+    elif args.command == "runs":
+        print_rows(conn.execute("SELECT * FROM runs ORDER BY run_id"))
+    else:
+        t0 = time.perf_counter()
+        try:
+            cur = conn.execute(args.sql)
+        except sqlite3.Error as e:
+            print(f"ERROR: {e}"); sys.exit(1)
+        if cur.description is None:
+            conn.commit()
+            print(f"{cur.rowcount} rows affected")
+            return
+        n = print_rows(cur, args.limit)
+        print(f"({n} rows, {(time.perf_counter() - t0) * 1e3:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()